@@ -0,0 +1,62 @@
+"""
+Benchmark de latencia de inferencia: ``model.predict`` de scikit-learn frente
+a la versión compilada de ``smartrental.compiled``.
+
+Mide la mediana y el p99 por llamada para lotes de 1, 100 y 100.000 inmuebles
+(los lotes grandes se delegan en el modelo original, así que ahí ambos
+tiempos deben coincidir) y comprueba que las predicciones son idénticas.
+
+Uso:
+    python -m benchmarks.bench_inference --repeticiones 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.stub_model import load_or_train_model, synthetic_features
+from smartrental.compiled import check_parity, compile_model
+
+TAMANOS_LOTE = (1, 100, 100_000)
+
+
+def medir(funcion, X, repeticiones):
+    """Tiempos por llamada en ms (tras una llamada de calentamiento)."""
+    funcion(X)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(X)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return np.percentile(tiempos, [50, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=200,
+                        help="Llamadas por tamaño de lote (se reducen en los lotes grandes)")
+    args = parser.parse_args()
+
+    model, origen = load_or_train_model()
+    compiled = compile_model(model)
+    print(f"Modelo: {type(model).__name__} ({origen})")
+    if compiled is None:
+        print("El modelo no es un conjunto de árboles soportado; no hay versión compilada")
+        return
+    print(f"Árboles: {compiled.n_arboles}, profundidad máxima: {compiled.profundidad}, "
+          f"nodos: {len(compiled.left):,}")
+    print(f"Paridad (conjunto de referencia): máx. diferencia {check_parity(model, compiled):.2e}")
+
+    print(f"{'lote':>8} | {'sklearn p50':>11} {'p99':>9} | {'compilado p50':>13} {'p99':>9} | {'mejora':>7}")
+    for tamano in TAMANOS_LOTE:
+        X = synthetic_features(tamano, seed=tamano)
+        repeticiones = max(3, min(args.repeticiones, args.repeticiones * 100 // tamano))
+        base = medir(model.predict, X, repeticiones)
+        rapido = medir(compiled.predict, X, repeticiones)
+        diferencia = np.max(np.abs(model.predict(X) - compiled.predict(X)))
+        print(f"{tamano:>8,} | {base[0]:>9.3f}ms {base[1]:>7.3f}ms | {rapido[0]:>11.3f}ms {rapido[1]:>7.3f}ms "
+              f"| {base[0] / rapido[0]:>6.1f}x  (máx. diferencia {diferencia:.1e})")
+
+
+if __name__ == "__main__":
+    main()
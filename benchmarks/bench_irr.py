@@ -0,0 +1,85 @@
+"""
+Benchmark de la vía rápida de TIR frente a ``calculate_irr``.
+
+Genera escenarios sintéticos con la misma forma de flujos que la aplicación
+(inversión inicial, flujo neto anual constante y valor del inmueble al final)
+y compara:
+
+- ``calculate_irr`` original: ``scipy.optimize.newton`` sobre ``npv_function``,
+  un escenario cada vez. Se mide sobre una muestra y se extrapola.
+- ``irr_batch``: Newton vectorizado genérico sobre la matriz de flujos.
+- ``solve_irr``: selección automática de la vía de renta constante.
+
+Uso:
+    python -m benchmarks.bench_irr --escenarios 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.optimize import newton
+
+from smartrental.irr import irr_batch, npv_function, solve_irr
+
+
+def generar_escenarios(n, horizonte=10, seed=0):
+    """Matriz n x (horizonte + 1) de flujos con valores plausibles."""
+    rng = np.random.default_rng(seed)
+    inversion_inmueble = rng.uniform(80_000, 600_000, n)
+    inversion_amueblar = rng.uniform(5_000, 50_000, n)
+    precio_noche = rng.uniform(50, 400, n)
+    ocupacion = rng.uniform(0.3, 0.95, n)
+    costos = rng.uniform(2_000, 15_000, n)
+
+    flujo_anual = precio_noche * 365 * ocupacion - costos
+    flujos = np.empty((n, horizonte + 1))
+    flujos[:, 0] = -(inversion_inmueble + inversion_amueblar)
+    flujos[:, 1:-1] = flujo_anual[:, np.newaxis]
+    flujos[:, -1] = inversion_inmueble
+    return flujos
+
+
+def legacy_irr(flujos):
+    """Equivalente a ``calculate_irr`` antes del motor vectorizado."""
+    try:
+        return newton(lambda r: npv_function(r, flujos), 0.10)
+    except (RuntimeError, ZeroDivisionError):
+        return np.nan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--escenarios", type=int, default=1_000_000)
+    parser.add_argument("--muestra-legacy", type=int, default=5_000,
+                        help="Escenarios resueltos con el método original (se extrapola al total)")
+    args = parser.parse_args()
+
+    flujos = generar_escenarios(args.escenarios)
+    print(f"Escenarios: {args.escenarios:,}")
+
+    muestra = flujos[:args.muestra_legacy]
+    inicio = time.perf_counter()
+    legacy = np.array([legacy_irr(list(fila)) for fila in muestra])
+    t_legacy = (time.perf_counter() - inicio) * args.escenarios / len(muestra)
+    print(f"calculate_irr (extrapolado): {t_legacy:10.3f} s")
+
+    inicio = time.perf_counter()
+    irr_gen, ok_gen = irr_batch(flujos)
+    t_gen = time.perf_counter() - inicio
+    print(f"irr_batch:                   {t_gen:10.3f} s  ({t_legacy / t_gen:,.0f}x)")
+
+    inicio = time.perf_counter()
+    irr_rapida, ok_rapida = solve_irr(flujos)
+    t_rapida = time.perf_counter() - inicio
+    print(f"solve_irr (renta constante): {t_rapida:10.3f} s  ({t_legacy / t_rapida:,.0f}x)")
+
+    ambos = ok_gen & ok_rapida
+    print(f"Convergencia: irr_batch {ok_gen.mean():.4%}, solve_irr {ok_rapida.mean():.4%}")
+    print(f"Máx. diferencia vs irr_batch: {np.max(np.abs(irr_gen[ambos] - irr_rapida[ambos])):.2e}")
+    validos = ~np.isnan(legacy)
+    print(f"Máx. diferencia vs calculate_irr: "
+          f"{np.nanmax(np.abs(legacy[validos] - irr_rapida[:len(muestra)][validos])):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark del tiempo de re-ejecución del script de Streamlit.
+
+Cada interacción con un widget vuelve a ejecutar ``streamlit_app.py`` de
+principio a fin. Este script lo ejecuta con ``AppTest`` (sin navegador) y mide
+el tiempo de cada re-ejecución tras la primera.
+
+Uso:
+    python -m benchmarks.bench_rerun --reruns 50
+    # Comparar con otra versión del script:
+    git show <commit>:streamlit_app.py > /tmp/app_antes.py
+    python -m benchmarks.bench_rerun --script /tmp/app_antes.py
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def medir_reruns(script, reruns):
+    """Ejecuta el script una vez para calentar y devuelve los tiempos de ``reruns`` ejecuciones."""
+    at = AppTest.from_file(script, default_timeout=60)
+    at.run()
+    tiempos = []
+    for _ in range(reruns):
+        inicio = time.perf_counter()
+        at.run()
+        tiempos.append(time.perf_counter() - inicio)
+    if at.exception:
+        raise RuntimeError(f"El script falló: {at.exception[0].message}")
+    return np.array(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de re-ejecución del script de Streamlit")
+    parser.add_argument("--script", default=os.path.join(RAIZ_PROYECTO, "streamlit_app.py"))
+    parser.add_argument("--reruns", type=int, default=50)
+    args = parser.parse_args()
+
+    # AppTest resuelve rutas relativas (imágenes, modelo) desde el directorio
+    # de trabajo; se copia el script a la raíz del proyecto si viene de fuera.
+    os.chdir(RAIZ_PROYECTO)
+    sys.path.insert(0, RAIZ_PROYECTO)
+    script = os.path.abspath(args.script)
+    temporal = None
+    if os.path.dirname(script) != RAIZ_PROYECTO:
+        temporal = tempfile.NamedTemporaryFile(suffix=".py", dir=RAIZ_PROYECTO, delete=False)
+        temporal.close()
+        shutil.copy(script, temporal.name)
+        script = temporal.name
+
+    try:
+        tiempos = medir_reruns(script, args.reruns) * 1000
+    finally:
+        if temporal is not None:
+            os.unlink(temporal.name)
+
+    p50, p95 = np.percentile(tiempos, [50, 95])
+    print(f"Script: {args.script}")
+    print(f"Re-ejecuciones: {args.reruns} · media {tiempos.mean():.2f} ms · p50 {p50:.2f} ms · p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
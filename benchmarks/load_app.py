@@ -0,0 +1,273 @@
+"""
+Prueba de carga local de la aplicación de Streamlit con varias sesiones.
+
+Cada usuario simulado es un ``AppTest`` (sin navegador) que recorre el flujo
+real del script: abrir la página, elegir ciudad, marcar la ubicación, elegir
+amenidades y calcular, esperando a que termine el trabajo en segundo plano.
+Después repite el cálculo con otras ocupaciones, que no están en la caché.
+Los usuarios corren en hilos del mismo proceso, igual que las sesiones de un
+servidor, así que comparten el modelo, el pool de trabajos y la caché de
+escenarios.
+
+Muestra la latencia p50/p95/p99 de cada interacción, el rendimiento global y
+el CPU y la memoria por sesión:
+
+    python -m benchmarks.load_app --usuarios 8 --sesiones 40
+    python -m benchmarks.load_app --usuarios 8 --sesiones 40 --salida resultados/carga.json
+    python -m benchmarks.load_app --usuarios 8 --sesiones 40 --comparar resultados/carga.json
+
+El clic en el mapa se simula con los campos de latitud y longitud, que
+actualizan la ubicación por la misma vía que el callback del mapa. Sin
+``price_model.pkl`` se usa el modelo sintético de ``benchmarks.stub_model``.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTERACCIONES = ("carga", "ciudad", "ubicacion", "amenidades", "calcular", "recalcular")
+
+# Espera entre sondeos mientras el cálculo sigue en segundo plano, como el fragmento de la página
+INTERVALO_SONDEO = 0.1
+
+TIEMPO_MAXIMO_CALCULO = 60.0
+
+
+def preparar_modelo():
+    """
+    Usa ``price_model.pkl`` si existe; si no, guarda el modelo sintético en un
+    fichero temporal y apunta la aplicación a él. Devuelve la descripción.
+    """
+    import pickle
+
+    from benchmarks.stub_model import train_stub_model
+    from smartrental import model as modulo_modelo
+
+    if os.path.exists(modulo_modelo.resolve_model_path()):
+        return modulo_modelo.MODEL_PATH
+    ruta = os.path.join(tempfile.mkdtemp(prefix="smartrental-carga-"), "price_model.pkl")
+    with open(ruta, "wb") as f:
+        pickle.dump(train_stub_model(), f)
+    # El script lee MODEL_PATH del módulo en cada ejecución
+    modulo_modelo.MODEL_PATH = ruta
+    return "modelo sintético, no se encontró price_model.pkl"
+
+
+def _widget(lista, etiqueta):
+    return next(w for w in lista if w.label == etiqueta)
+
+
+def _hay_resultado(at):
+    return any("Precio promedio por noche estimado" in m.value for m in at.markdown)
+
+
+def _esperar_resultado(at):
+    """Re-ejecuta la página, como el fragmento de sondeo, hasta que se muestra el resultado."""
+    limite = time.perf_counter() + TIEMPO_MAXIMO_CALCULO
+    while not _hay_resultado(at):
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        if at.error:
+            raise RuntimeError(at.error[0].value)
+        if time.perf_counter() > limite:
+            raise TimeoutError("El cálculo no terminó a tiempo")
+        time.sleep(INTERVALO_SONDEO)
+        at.run()
+
+
+class Sesion:
+    """Un usuario simulado que recorre el flujo de la aplicación."""
+
+    def __init__(self, script, seed, recalculos):
+        self.script = script
+        self.rng = np.random.default_rng(seed)
+        self.recalculos = recalculos
+        self.at = None
+        self.tiempos = {nombre: [] for nombre in INTERACCIONES}
+        self.errores = {}
+
+    def _medir(self, nombre, accion):
+        inicio = time.perf_counter()
+        try:
+            accion()
+            if self.at.exception:
+                raise RuntimeError(self.at.exception[0].message)
+        except Exception as e:
+            self.errores[nombre] = f"{type(e).__name__}: {e}"
+            return False
+        self.tiempos[nombre].append(time.perf_counter() - inicio)
+        return True
+
+    def ejecutar(self):
+        from streamlit.testing.v1 import AppTest
+
+        from smartrental.amenities import amenities_por_categoria
+        from smartrental.cities import CENTROS_CIUDADES, CIUDADES_DISPONIBLES, resolve_city
+
+        ciudad = str(self.rng.choice(CIUDADES_DISPONIBLES))
+        lat, lon, radio = CENTROS_CIUDADES[resolve_city(ciudad).slug]
+        # Un punto dentro del área de la ciudad
+        desplazamiento = self.rng.uniform(-0.3, 0.3, 2) * min(radio, 20) / 111
+
+        def cargar():
+            self.at = AppTest.from_file(self.script, default_timeout=TIEMPO_MAXIMO_CALCULO)
+            self.at.run()
+
+        def elegir_ciudad():
+            _widget(self.at.multiselect, "Ubicación (ciudad):").set_value([ciudad]).run()
+
+        def marcar_ubicacion():
+            self.at.number_input(key="lat_input").set_value(round(lat + desplazamiento[0], 6)).run()
+            self.at.number_input(key="lng_input").set_value(round(lon + desplazamiento[1], 6)).run()
+
+        def elegir_amenidades():
+            # Primero se marcan las categorías, que muestran sus listas de amenidades
+            categorias = list(amenities_por_categoria)
+            elegidas = [str(c) for c in self.rng.choice(categorias, int(self.rng.integers(1, 4)), replace=False)]
+            for categoria in elegidas:
+                self.at.checkbox(key=f"cat_{categoria}").check()
+            self.at.run()
+            for categoria in elegidas:
+                opciones = amenities_por_categoria[categoria]
+                k = int(self.rng.integers(1, min(len(opciones), 4) + 1))
+                seleccion = [str(o) for o in self.rng.choice(opciones, k, replace=False)]
+                self.at.multiselect(key=f"amenities_{categoria}").set_value(seleccion)
+            self.at.run()
+
+        def calcular():
+            _widget(self.at.button, "Calcular precio y rentabilidad 🚀").click().run()
+            _esperar_resultado(self.at)
+
+        def recalcular():
+            # Otra ocupación: escenario nuevo, el resultado se calcula de nuevo
+            ocupacion = round(float(self.rng.uniform(0.3, 0.95)), 2)
+            self.at.number_input(key="ocupacion_anual_porcentaje").set_value(ocupacion).run()
+            calcular()
+
+        pasos = [("carga", cargar), ("ciudad", elegir_ciudad), ("ubicacion", marcar_ubicacion),
+                 ("amenidades", elegir_amenidades), ("calcular", calcular)]
+        pasos += [("recalcular", recalcular)] * self.recalculos
+        for nombre, accion in pasos:
+            if not self._medir(nombre, accion):
+                break
+        return self
+
+
+def rss_mb():
+    from smartrental.model import rss_mb as rss
+    return rss()
+
+
+def ejecutar_carga(script, usuarios, sesiones, recalculos, seed=0):
+    """
+    Ejecuta ``sesiones`` usuarios simulados con ``usuarios`` a la vez. Las
+    sesiones terminadas se mantienen vivas hasta el final para medir la
+    memoria, como las de un servidor con pestañas abiertas.
+    """
+    # Sesión de calentamiento: carga del modelo, compilación e imports
+    calentamiento = Sesion(script, seed + sesiones, 0).ejecutar()
+    if calentamiento.errores:
+        raise RuntimeError(f"La sesión de calentamiento falló: {calentamiento.errores}")
+    rss_inicial = rss_mb()
+    cpu_inicial = time.process_time()
+    inicio = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=usuarios, thread_name_prefix="usuario") as executor:
+        terminadas = list(executor.map(lambda i: Sesion(script, seed + i, recalculos).ejecutar(), range(sesiones)))
+
+    segundos = time.perf_counter() - inicio
+    cpu = time.process_time() - cpu_inicial
+    rss_final = rss_mb()
+
+    resultados = {}
+    for nombre in INTERACCIONES:
+        tiempos = np.array([t for sesion in terminadas for t in sesion.tiempos[nombre]])
+        if tiempos.size == 0:
+            continue
+        resultados[nombre] = {
+            "llamadas": int(tiempos.size),
+            "p50_us": float(np.percentile(tiempos, 50)) * 1e6,
+            "p95_us": float(np.percentile(tiempos, 95)) * 1e6,
+            "p99_us": float(np.percentile(tiempos, 99)) * 1e6,
+            "media_us": float(tiempos.mean()) * 1e6,
+        }
+    interacciones = sum(r["llamadas"] for r in resultados.values())
+    errores = [(i, nombre, error) for i, sesion in enumerate(terminadas) for nombre, error in sesion.errores.items()]
+    resumen = {
+        "usuarios": usuarios,
+        "sesiones": sesiones,
+        "segundos": segundos,
+        "sesiones_por_s": sesiones / segundos,
+        "interacciones_por_s": interacciones / segundos,
+        "cpu_por_sesion_s": cpu / sesiones,
+        "memoria_por_sesion_mb": (rss_final - rss_inicial) / sesiones,
+        "rss_final_mb": rss_final,
+        "errores": len(errores),
+    }
+    return resultados, resumen, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la aplicación de Streamlit")
+    parser.add_argument("--usuarios", type=int, default=4, help="Sesiones simultáneas")
+    parser.add_argument("--sesiones", type=int, default=20, help="Sesiones en total")
+    parser.add_argument("--recalculos", type=int, default=2, help="Cálculos adicionales por sesión")
+    parser.add_argument("--script", default=os.path.join(RAIZ_PROYECTO, "streamlit_app.py"))
+    parser.add_argument("--salida", help="Fichero JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con el que comparar las medianas")
+    parser.add_argument("--umbral", type=float, default=1.25,
+                        help="Relación de medianas a partir de la cual una interacción se considera más lenta")
+    args = parser.parse_args()
+
+    # AppTest resuelve rutas relativas (imágenes, modelo) desde el directorio de trabajo
+    os.chdir(RAIZ_PROYECTO)
+    sys.path.insert(0, RAIZ_PROYECTO)
+    origen = preparar_modelo()
+    # La aplicación no usa "magic"; transformar el AST en varios hilos a la vez falla en Python 3.11
+    from streamlit import config
+    config.set_option("runner.magicEnabled", False)
+    print(f"Modelo: {origen}")
+    print(f"{args.sesiones} sesiones, {args.usuarios} a la vez, {os.cpu_count()} CPU\n")
+
+    resultados, resumen, errores = ejecutar_carga(os.path.abspath(args.script), args.usuarios,
+                                                  args.sesiones, args.recalculos)
+
+    print(f"{'interacción':<12} {'n':>5} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<12} {r['llamadas']:>5} {r['p50_us'] / 1000:>8.0f}ms {r['p95_us'] / 1000:>8.0f}ms "
+              f"{r['p99_us'] / 1000:>8.0f}ms")
+    print(f"\nRendimiento: {resumen['sesiones_por_s']:.2f} sesiones/s · "
+          f"{resumen['interacciones_por_s']:.1f} interacciones/s")
+    print(f"Por sesión: {resumen['cpu_por_sesion_s']:.2f} s de CPU · "
+          f"{resumen['memoria_por_sesion_mb']:.1f} MB de memoria (RSS final {resumen['rss_final_mb']:.0f} MB)")
+    for i, nombre, error in errores[:10]:
+        print(f"⚠️ Sesión {i}, {nombre}: {error}")
+
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, "w") as f:
+            json.dump({"meta": {"fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "modelo": origen,
+                                "cpus": os.cpu_count(), **resumen},
+                       "resultados": resultados}, f, indent=2)
+        print(f"\n✅ Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        from benchmarks.suite import comparar
+
+        with open(args.comparar) as f:
+            regresiones = comparar({"resultados": resultados}, json.load(f), args.umbral)
+        if regresiones:
+            raise SystemExit(f"Interacciones más lentas que la referencia: {', '.join(regresiones)}")
+    if errores:
+        raise SystemExit(f"{len(errores)} sesiones con errores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Prueba de carga local del servicio HTTP de valoración.
+
+Lanza peticiones concurrentes contra ``smartrental.service`` y muestra la
+latencia p50/p99 y el rendimiento, tanto para peticiones de un inmueble como
+para lotes.
+
+Uso (con el servicio arrancado en otra terminal):
+    python -m smartrental.service --workers 4
+    python -m benchmarks.load_service --peticiones 2000 --concurrencia 16 --lote 1
+    python -m benchmarks.load_service --peticiones 200 --concurrencia 4 --lote 1000
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from smartrental.cities import CIUDADES_DISPONIBLES
+
+
+def inmueble_aleatorio(rng):
+    """Inmueble sintético con valores dentro de los rangos del formulario."""
+    return {
+        "ciudad": rng.choice(CIUDADES_DISPONIBLES),
+        "latitude": rng.uniform(-40, 60),
+        "longitude": rng.uniform(-120, 150),
+        "room_type": rng.choice(["Piso entero", "Habitación privada"]),
+        "accommodates": rng.randint(1, 10),
+        "bathrooms": rng.choice([1.0, 1.5, 2.0, 3.0]),
+        "bedrooms": rng.randint(1, 5),
+        "beds": rng.randint(1, 8),
+        "inversion_inmueble": rng.uniform(80_000, 600_000),
+        "ocupacion_anual_porcentaje": rng.uniform(0.3, 0.95),
+    }
+
+
+def enviar(url, cuerpo):
+    peticion = urllib.request.Request(url, data=cuerpo, headers={"Content-Type": "application/json"})
+    inicio = time.perf_counter()
+    with urllib.request.urlopen(peticion) as respuesta:
+        respuesta.read()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de valoración")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/score")
+    parser.add_argument("--peticiones", type=int, default=1000)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--lote", type=int, default=1, help="Inmuebles por petición (1 = petición simple)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cuerpos = []
+    for _ in range(args.peticiones):
+        inmuebles = [inmueble_aleatorio(rng) for _ in range(args.lote)]
+        cuerpos.append(json.dumps(inmuebles if args.lote > 1 else inmuebles[0]).encode("utf-8"))
+
+    enviar(args.url, cuerpos[0])  # calentamiento
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        latencias = np.array(list(pool.map(lambda cuerpo: enviar(args.url, cuerpo), cuerpos)))
+    total = time.perf_counter() - inicio
+
+    p50, p99 = np.percentile(latencias, [50, 99]) * 1000
+    print(f"Peticiones: {args.peticiones} · concurrencia {args.concurrencia} · lote {args.lote}")
+    print(f"Latencia p50: {p50:8.2f} ms   p99: {p99:8.2f} ms")
+    print(f"Rendimiento: {args.peticiones / total:8.1f} peticiones/s · "
+          f"{args.peticiones * args.lote / total:10.1f} inmuebles/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Modelo de referencia para los benchmarks.
+
+``price_model.pkl`` no se distribuye con el repositorio. Si no existe, se
+entrena un ``RandomForestRegressor`` sobre inmuebles sintéticos con las mismas
+variables (``price_model_features.pkl``), de modo que los benchmarks miden el
+mismo tipo de modelo aunque los tiempos absolutos difieran del real.
+"""
+import numpy as np
+import pandas as pd
+
+from smartrental.amenity_bits import N_AMENIDADES, amenity_columns, amenity_feature_names, category_counts
+from smartrental.cities import CIUDADES_DISPONIBLES
+from smartrental.features import CATEGORIAS_AMENIDADES
+from smartrental.model import MODEL_PATH, load_model_file
+from smartrental.pricing import load_feature_names
+
+
+def synthetic_amenity_bits(n, seed=0):
+    """Matriz de bits de amenidades sintética: cada amenidad con su propia frecuencia."""
+    rng = np.random.default_rng(seed)
+    frecuencia = rng.uniform(0.05, 0.6, N_AMENIDADES)
+    return np.packbits(rng.random((n, N_AMENIDADES)) < frecuencia, axis=1, bitorder="little")
+
+
+def synthetic_features(n, seed=0, por_amenidad=False):
+    """
+    DataFrame de ``n`` inmuebles sintéticos con las columnas del modelo.
+    Con ``por_amenidad`` incluye además las variables ``amenity_*``.
+    """
+    rng = np.random.default_rng(seed)
+    bedrooms = rng.integers(0, 5, n)
+    privada = rng.random(n) < 0.3
+    columnas = {
+        "latitude": rng.uniform(36.0, 43.5, n),
+        "longitude": rng.uniform(-9.0, 3.5, n),
+        "accommodates": bedrooms * 2 + rng.integers(1, 3, n),
+        "bathrooms": rng.integers(1, 4, n) * 0.5 + 0.5,
+        "bedrooms": bedrooms,
+        "beds": bedrooms + rng.integers(0, 3, n),
+        "minimum_nights": rng.integers(1, 30, n),
+        "maximum_nights": rng.integers(30, 1125, n),
+    }
+    bits = synthetic_amenity_bits(n, seed)
+    conteos = category_counts(bits)
+    for categoria, columna in CATEGORIAS_AMENIDADES.items():
+        columnas[columna] = conteos[categoria]
+    columnas["total_amenities_count"] = sum(columnas[c] for c in CATEGORIAS_AMENIDADES.values())
+    columnas["city_label"] = rng.integers(1, len(CIUDADES_DISPONIBLES) + 1, n)
+    columnas["room_type_entire home/apt"] = (~privada).astype(int)
+    columnas["room_type_hotel room"] = np.zeros(n, dtype=int)
+    columnas["room_type_private room"] = privada.astype(int)
+    columnas["room_type_shared room"] = np.zeros(n, dtype=int)
+    nombres = list(load_feature_names())
+    if por_amenidad:
+        columnas.update(amenity_columns(bits))
+        nombres = amenity_feature_names(nombres)
+    return pd.DataFrame(columnas)[nombres]
+
+
+def train_stub_model(n=20_000, n_estimators=100, max_depth=12, seed=0, por_amenidad=False):
+    """
+    Bosque aleatorio entrenado sobre precios sintéticos. Con ``por_amenidad``
+    se entrena además con una variable por amenidad, donde algunas (piscina,
+    jacuzzi, aire acondicionado) valen más que otras.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    X = synthetic_features(n, seed, por_amenidad)
+    rng = np.random.default_rng(seed + 1)
+    precio = (40 + 25 * X["accommodates"] + 15 * X["bathrooms"] + 2 * X["total_amenities_count"]
+              - 30 * X["room_type_private room"] + rng.normal(0, 15, n))
+    if por_amenidad:
+        precio += 30 * X["amenity_pool"] + 20 * X["amenity_hot_tub"] + 10 * X["amenity_air_conditioning"]
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                  random_state=seed, n_jobs=1)
+    return model.fit(X, precio)
+
+
+def load_or_train_model(model_path=MODEL_PATH):
+    """Devuelve ``(modelo, descripción)``: el modelo real si existe o uno sintético."""
+    try:
+        return load_model_file(model_path), model_path
+    except FileNotFoundError:
+        return train_stub_model(), "modelo sintético, no se encontró price_model.pkl"
@@ -0,0 +1,335 @@
+"""
+Suite de referencia de las rutas críticas de la aplicación.
+
+Mide latencia por llamada (una entrada) y rendimiento por lotes de:
+
+- ``normalize_city_name`` sobre nombres de ``CIUDADES_DISPONIBLES``.
+- ``resolve_city`` (nombres exactos, alias y con errores tipográficos, sin la
+  caché) y ``nearest_city`` sobre coordenadas aleatorias.
+- ``build_features`` con amenidades aleatorias de cada categoría.
+- Conteos de amenidades por categoría: con listas de Python, con el bitset
+  de ``smartrental.amenity_bits`` y analizando listas de texto (carteras).
+- Valores de equilibrio (precio, ocupación y precio de compra con los que la
+  TIR iguala la tasa objetivo) en forma cerrada, uno a uno y por lotes.
+- Recomendador de amenidades: ranking de todas las candidatas y búsqueda voraz.
+- ``get_price``: un inmueble por llamada (como la app) y cartera por lotes.
+- ``npv_function`` y ``calculate_irr`` (``solve_irr``), uno a uno y vectorizado.
+- Modelo mensual (``monthly_cash_flows`` + ``monthly_returns``) con hipoteca,
+  impuestos y estacionalidad, uno a uno y por lotes.
+- Construcción y serialización del mapa de folium con el marcador.
+
+Funciona sin conexión: si no existe ``price_model.pkl`` usa el modelo
+sintético de ``benchmarks.stub_model``. Los resultados se guardan en JSON
+para compararlos entre versiones:
+
+    python -m benchmarks.suite --salida resultados/v1.json
+    python -m benchmarks.suite --salida resultados/v2.json --comparar resultados/v1.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.stub_model import load_or_train_model
+from smartrental.amenities import amenities_por_categoria
+from smartrental.amenity_bits import category_counts, encode_amenity_matrix, parse_amenity_lists
+from smartrental.cashflows import HORIZONTE_ANALISIS_ANOS, build_cash_flows
+from smartrental.cities import (ALIAS_CIUDADES, CIUDADES_DISPONIBLES, nearest_city, normalize_city_name,
+                                resolve_city)
+from smartrental.compiled import optimize_model
+from smartrental.features import CATEGORIAS_AMENIDADES, TIPOS_ALOJAMIENTO, build_features
+from smartrental.irr import npv_function, solve_irr
+from smartrental.monthly import monthly_cash_flows, monthly_returns
+from smartrental.pricing import predict_prices
+from smartrental.recommender import recommend_amenities
+from smartrental.sensitivity import break_even_targets
+
+# Tiempo mínimo de medición por caso, en segundos
+TIEMPO_MINIMO = 0.5
+
+TAMANO_LOTE = 10_000
+
+# Un caso es más lento que la referencia si su mediana empeora más que esto
+UMBRAL_REGRESION = 1.25
+
+
+def generar_inmuebles(n, seed=0):
+    """Argumentos sintéticos de ``build_features`` (ciudad como texto sin normalizar)."""
+    rng = np.random.default_rng(seed)
+    categorias = list(amenities_por_categoria)
+    inmuebles = []
+    for _ in range(n):
+        amenities = {}
+        for categoria in categorias:
+            opciones = amenities_por_categoria[categoria]
+            k = int(rng.integers(0, len(opciones) + 1))
+            amenities[categoria] = list(rng.choice(opciones, k, replace=False))
+        dormitorios = int(rng.integers(0, 5))
+        inmuebles.append({
+            "ciudad": str(rng.choice(CIUDADES_DISPONIBLES)),
+            "latitude": float(rng.uniform(36.0, 43.5)),
+            "longitude": float(rng.uniform(-9.0, 3.5)),
+            "room_type": str(rng.choice(TIPOS_ALOJAMIENTO)),
+            "accommodates": dormitorios * 2 + 1,
+            "bathrooms": float(rng.integers(1, 4)),
+            "bedrooms": dormitorios,
+            "beds": dormitorios + 1,
+            "minimum_nights": int(rng.integers(1, 30)),
+            "maximum_nights": int(rng.integers(30, 365)),
+            "amenities": amenities,
+        })
+    return inmuebles
+
+
+def features_de(inmueble):
+    """Diccionario ``data`` del inmueble, igual que en la aplicación."""
+    return build_features(
+        inmueble["latitude"], inmueble["longitude"],
+        resolve_city(inmueble["ciudad"]).city_label, inmueble["room_type"],
+        inmueble["accommodates"], inmueble["bathrooms"], inmueble["bedrooms"], inmueble["beds"],
+        inmueble["minimum_nights"], inmueble["maximum_nights"], inmueble["amenities"]
+    )
+
+
+def generar_nombres(n, seed=0):
+    """Nombres de ciudad como los escribiría un usuario: exactos, alias y con una errata."""
+    rng = np.random.default_rng(seed)
+    alias = list(ALIAS_CIUDADES)
+    nombres = []
+    for _ in range(n):
+        tipo = rng.integers(3)
+        if tipo == 0:
+            nombres.append(str(rng.choice(CIUDADES_DISPONIBLES)).upper())
+        elif tipo == 1:
+            nombres.append(str(rng.choice(alias)))
+        else:
+            nombre = str(rng.choice(CIUDADES_DISPONIBLES))
+            i = int(rng.integers(len(nombre)))
+            nombres.append(nombre[:i] + nombre[i + 1:])
+    return nombres
+
+
+def generar_flujos(n, seed=0):
+    """Listas de flujos con la forma de la aplicación."""
+    rng = np.random.default_rng(seed)
+    return [
+        build_cash_flows(rng.uniform(50, 400), rng.uniform(0.3, 0.95), rng.uniform(2_000, 15_000),
+                         rng.uniform(80_000, 600_000), rng.uniform(5_000, 50_000), HORIZONTE_ANALISIS_ANOS)
+        for _ in range(n)
+    ]
+
+
+def construir_mapa(lat, lng):
+    """Mapa base con el marcador de la propiedad, serializado como lo envía st_folium."""
+    import folium
+
+    mapa = folium.Map(location=[lat, lng], zoom_start=12, width="100%", height=400)
+    grupo = folium.FeatureGroup(name="Propiedad")
+    folium.Marker([lat, lng], popup="📍 Tu propiedad", tooltip="Ubicación seleccionada",
+                  icon=folium.Icon(color="red", icon="home")).add_to(grupo)
+    grupo.add_to(mapa)
+    return mapa.get_root().render()
+
+
+def medir(funcion, elementos=1, tiempo_minimo=TIEMPO_MINIMO):
+    """
+    Ejecuta ``funcion`` repetidamente durante al menos ``tiempo_minimo``
+    segundos (y al menos 5 veces) tras una llamada de calentamiento.
+
+    elementos: Entradas que procesa cada llamada, para el rendimiento por lotes.
+    """
+    funcion()
+    tiempos = []
+    inicio = time.perf_counter()
+    while len(tiempos) < 5 or time.perf_counter() - inicio < tiempo_minimo:
+        t = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t)
+    tiempos = np.array(tiempos)
+    mediana = float(np.median(tiempos))
+    return {
+        "llamadas": len(tiempos),
+        "elementos_por_llamada": elementos,
+        "p50_us": mediana * 1e6,
+        "p99_us": float(np.percentile(tiempos, 99)) * 1e6,
+        "media_us": float(tiempos.mean()) * 1e6,
+        "elementos_por_s": elementos / mediana,
+    }
+
+
+def casos(model, tamano_lote):
+    """Diccionario nombre -> (función, elementos por llamada)."""
+    inmuebles = generar_inmuebles(tamano_lote)
+    uno = inmuebles[0]
+    nombres = [inmueble["ciudad"] for inmueble in inmuebles]
+    data = features_de(uno)
+    cartera = pd.DataFrame([features_de(inmueble) for inmueble in inmuebles])
+    nombres_usuario = generar_nombres(tamano_lote)
+    coordenadas = np.random.default_rng(0).uniform((-45, -125), (60, 155), (tamano_lote, 2)).tolist()
+    flujos = generar_flujos(tamano_lote)
+    matriz_flujos = np.array(flujos)
+
+    def normalizar_lote():
+        for nombre in nombres:
+            normalize_city_name(nombre)
+
+    # Sin la caché de resolve_city, para medir el índice y no el diccionario de la caché
+    resolver = resolve_city.__wrapped__
+
+    def resolver_lote():
+        for nombre in nombres_usuario:
+            resolver(nombre)
+
+    def coordenadas_lote():
+        for lat, lon in coordenadas:
+            nearest_city(lat, lon)
+
+    rng = np.random.default_rng(0)
+    estacionalidad = 1 + 0.4 * np.sin(np.linspace(0, 2 * np.pi, 12, endpoint=False))
+    financiacion = {"costos_operacion_porcentaje": 0.3, "estacionalidad": estacionalidad,
+                    "porcentaje_financiado": 0.7, "tipo_hipoteca": 0.035, "tipo_impositivo": 0.19,
+                    "tipo_plusvalias": 0.21, "revalorizacion_anual": 0.02, "costes_salida_porcentaje": 0.05}
+    entradas_mensuales = (rng.uniform(50, 400, tamano_lote), rng.uniform(0.3, 0.95, tamano_lote),
+                          rng.uniform(2_000, 15_000, tamano_lote), rng.uniform(80_000, 600_000, tamano_lote),
+                          rng.uniform(5_000, 50_000, tamano_lote))
+
+    # Mismo orden que annual_net_cash_flow y build_cash_flows: precio, ocupación, costes, compra, amueblar
+    precios, ocupaciones, costos, compras, amueblar = entradas_mensuales
+
+    def equilibrio_uno():
+        return break_even_targets(0.10, precios[0], ocupaciones[0], compras[0], amueblar[0], costos[0],
+                                  HORIZONTE_ANALISIS_ANOS)
+
+    def equilibrio_lote():
+        return break_even_targets(0.10, precios, ocupaciones, compras, amueblar, costos, HORIZONTE_ANALISIS_ANOS)
+
+    def mensual_uno():
+        return monthly_returns(monthly_cash_flows(*(x[0] for x in entradas_mensuales), **financiacion))
+
+    def mensual_lote():
+        return monthly_returns(monthly_cash_flows(*entradas_mensuales, **financiacion))
+
+    def features_lote():
+        for inmueble in inmuebles:
+            features_de(inmueble)
+
+    selecciones = [inmueble["amenities"] for inmueble in inmuebles]
+    bits = encode_amenity_matrix(selecciones)
+    textos = [", ".join(a for amenidades in seleccion.values() for a in amenidades) for seleccion in selecciones]
+
+    def conteos_listas():
+        for seleccion in selecciones:
+            {categoria: len(seleccion.get(categoria, [])) for categoria in CATEGORIAS_AMENIDADES}
+
+    return {
+        "normalize_city_name/uno": (lambda: normalize_city_name(uno["ciudad"]), 1),
+        "normalize_city_name/lote": (normalizar_lote, tamano_lote),
+        "resolve_city/exacto": (lambda: resolver("Washington DC"), 1),
+        "resolve_city/aproximado": (lambda: resolver("San Fransisco"), 1),
+        "resolve_city/lote": (resolver_lote, tamano_lote),
+        "nearest_city/uno": (lambda: nearest_city(uno["latitude"], uno["longitude"]), 1),
+        "nearest_city/lote": (coordenadas_lote, tamano_lote),
+        "build_features/uno": (lambda: features_de(uno), 1),
+        "build_features/lote": (features_lote, tamano_lote),
+        "amenidades/conteos_listas": (conteos_listas, tamano_lote),
+        "amenidades/conteos_bits": (lambda: category_counts(bits), tamano_lote),
+        "amenidades/texto_a_bits": (lambda: parse_amenity_lists(textos), tamano_lote),
+        "recomendador/amenidades": (lambda: recommend_amenities(model, data, uno["amenities"], 150_000, 20_000,
+                                                                5_000, 0.7), 1),
+        "get_price/uno": (lambda: predict_prices(model, pd.DataFrame([data]))[0], 1),
+        "get_price/lote": (lambda: predict_prices(model, cartera), tamano_lote),
+        "npv_function/uno": (lambda: npv_function(0.10, flujos[0]), 1),
+        "calculate_irr/uno": (lambda: solve_irr(flujos[0]), 1),
+        "calculate_irr/lote": (lambda: solve_irr(matriz_flujos), tamano_lote),
+        "equilibrio/uno": (equilibrio_uno, 1),
+        "equilibrio/lote": (equilibrio_lote, tamano_lote),
+        "modelo_mensual/uno": (mensual_uno, 1),
+        "modelo_mensual/lote": (mensual_lote, tamano_lote),
+        "mapa/construccion": (lambda: construir_mapa(uno["latitude"], uno["longitude"]), 1),
+    }
+
+
+def metadatos(origen_modelo, model):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "modelo": origen_modelo,
+        "tipo_modelo": type(model).__name__,
+    }
+
+
+def comparar(actual, referencia, umbral=UMBRAL_REGRESION):
+    """Imprime la relación de medianas con la referencia; devuelve los casos más lentos."""
+    regresiones = []
+    print(f"\n{'caso':<28} {'referencia p50':>15} {'actual p50':>12} {'relación':>9}")
+    for nombre, resultado in actual["resultados"].items():
+        anterior = referencia["resultados"].get(nombre)
+        if anterior is None:
+            print(f"{nombre:<28} {'—':>15} {resultado['p50_us']:>10.1f}us")
+            continue
+        relacion = resultado["p50_us"] / anterior["p50_us"]
+        marca = "  ⚠️" if relacion > umbral else ""
+        print(f"{nombre:<28} {anterior['p50_us']:>13.1f}us {resultado['p50_us']:>10.1f}us "
+              f"{relacion:>8.2f}x{marca}")
+        if relacion > umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--salida", help="Fichero JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_REGRESION,
+                        help="Relación de medianas a partir de la cual un caso se considera más lento")
+    parser.add_argument("--filtro", default="", help="Ejecutar solo los casos que contengan este texto")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Entradas por llamada en los casos por lotes")
+    parser.add_argument("--tiempo-minimo", type=float, default=TIEMPO_MINIMO,
+                        help="Segundos de medición por caso")
+    args = parser.parse_args()
+
+    model, origen = load_or_train_model()
+    # Igual que la aplicación al arrancar
+    model = optimize_model(model)
+    resultado = {"meta": metadatos(origen, model), "resultados": {}}
+    print(f"Modelo: {resultado['meta']['tipo_modelo']} ({origen})")
+
+    print(f"{'caso':<28} {'p50':>12} {'p99':>12} {'entradas/s':>14}")
+    for nombre, (funcion, elementos) in casos(model, args.lote).items():
+        if args.filtro not in nombre:
+            continue
+        medida = medir(funcion, elementos, args.tiempo_minimo)
+        resultado["resultados"][nombre] = medida
+        print(f"{nombre:<28} {medida['p50_us']:>10.1f}us {medida['p99_us']:>10.1f}us "
+              f"{medida['elementos_por_s']:>14,.0f}")
+
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"\n✅ Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            regresiones = comparar(resultado, json.load(f), args.umbral)
+        if regresiones:
+            raise SystemExit(f"Casos más lentos que la referencia: {', '.join(regresiones)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Lógica de dominio de SmartRental, independiente de la interfaz de Streamlit.
+
+Los módulos de este paquete no importan ``streamlit`` y pueden usarse desde
+scripts, servicios o cuadernos para valorar inmuebles de forma masiva.
+"""
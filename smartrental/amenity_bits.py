@@ -0,0 +1,147 @@
+"""
+Codificación de las amenidades como conjunto de bits.
+
+Cada amenidad del catálogo (``amenities_por_categoria``) ocupa una posición
+fija, en el orden del catálogo, y la selección de un inmueble se guarda como
+una fila de ``BYTES_AMENIDADES`` bytes (``np.packbits`` con orden de bits
+"little"). Una cartera es una matriz ``uint8`` de N x ``BYTES_AMENIDADES``,
+unos 10 bytes por inmueble en lugar de una lista de cadenas.
+
+Los conteos por categoría que usa el modelo actual se obtienen de la matriz
+con una máscara por categoría y ``np.bitwise_count``, sin recorrer listas en
+Python. Un modelo reentrenado con una variable por amenidad (``amenity_wifi``,
+``amenity_tv``...) recibe la matriz desempaquetada con ``amenity_columns``.
+
+Las posiciones forman parte del formato: las amenidades nuevas se añaden al
+final del catálogo para no invalidar los bitsets guardados ni los modelos
+entrenados con ellos.
+"""
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from smartrental.amenities import amenities_por_categoria, amenity_traducciones
+
+AMENIDADES = tuple(amenidad for amenidades in amenities_por_categoria.values() for amenidad in amenidades)
+
+N_AMENIDADES = len(AMENIDADES)
+
+BYTES_AMENIDADES = (N_AMENIDADES + 7) // 8
+
+PREFIJO_COLUMNA = "amenity_"
+
+# Variables del modelo reentrenado, en el orden de los bits
+COLUMNAS_AMENIDADES = tuple(PREFIJO_COLUMNA + amenidad for amenidad in AMENIDADES)
+
+POSICION_AMENIDAD = MappingProxyType({amenidad: i for i, amenidad in enumerate(AMENIDADES)})
+
+# Nombre de amenidad (clave o traducción, en minúsculas) -> posición
+_POSICION_POR_NOMBRE = {}
+for _amenidad, _posicion in POSICION_AMENIDAD.items():
+    _POSICION_POR_NOMBRE[_amenidad.lower()] = _posicion
+    _POSICION_POR_NOMBRE[amenity_traducciones.get(_amenidad, _amenidad).lower()] = _posicion
+
+# Punto y coma y barra se tratan como comas
+_SEPARADORES_AMENIDADES = str.maketrans(";|", ",,")
+
+
+def _mascara(posiciones):
+    bits = np.zeros(N_AMENIDADES, dtype=np.uint8)
+    bits[list(posiciones)] = 1
+    return np.packbits(bits, bitorder="little")
+
+
+# Categoría -> fila de bytes con los bits de sus amenidades
+MASCARAS_CATEGORIAS = MappingProxyType({
+    categoria: _mascara(POSICION_AMENIDAD[amenidad] for amenidad in amenidades)
+    for categoria, amenidades in amenities_por_categoria.items()
+})
+
+# Cada categoría ocupa pocos bytes contiguos: solo se cuentan esos
+_BYTES_CATEGORIAS = MappingProxyType({
+    categoria: (np.flatnonzero(mascara), mascara[np.flatnonzero(mascara)])
+    for categoria, mascara in MASCARAS_CATEGORIAS.items()
+})
+
+
+def encode_amenities(seleccion):
+    """
+    Fila de ``BYTES_AMENIDADES`` bytes con las amenidades elegidas.
+
+    seleccion: Diccionario categoría -> lista de amenidades (como
+    ``amenities_seleccionadas``) o cualquier iterable de claves. Las
+    amenidades que no están en el catálogo se ignoran.
+    """
+    if isinstance(seleccion, dict):
+        seleccion = [amenidad for amenidades in seleccion.values() for amenidad in amenidades]
+    posiciones = [POSICION_AMENIDAD[a] for a in seleccion if a in POSICION_AMENIDAD]
+    return _mascara(posiciones)
+
+
+def encode_amenity_matrix(selecciones):
+    """Matriz N x ``BYTES_AMENIDADES`` a partir de una selección por inmueble."""
+    filas = [encode_amenities(seleccion) for seleccion in selecciones]
+    if not filas:
+        return np.zeros((0, BYTES_AMENIDADES), dtype=np.uint8)
+    return np.stack(filas)
+
+
+def parse_amenity_lists(textos):
+    """
+    Matriz de bits a partir de listas de texto (separadas por comas, punto y
+    coma o barras), con claves o nombres en español. Cada texto distinto se
+    analiza una sola vez: las listas se repiten mucho en una cartera.
+    """
+    codigos, listas = pd.factorize(pd.Series(textos, dtype=object).fillna("").astype(str))
+    filas, posiciones = [], []
+    for i, lista in enumerate(listas):
+        for amenidad in lista.lower().translate(_SEPARADORES_AMENIDADES).split(","):
+            posicion = _POSICION_POR_NOMBRE.get(amenidad.strip())
+            if posicion is not None:
+                filas.append(i)
+                posiciones.append(posicion)
+    por_lista = np.zeros((len(listas) + 1, N_AMENIDADES), dtype=np.uint8)
+    por_lista[filas, posiciones] = 1
+    # El código -1 (valor ausente) apunta a la última fila, de ceros
+    return np.packbits(por_lista, axis=1, bitorder="little")[codigos]
+
+
+def decode_amenities(fila):
+    """Diccionario categoría -> lista de amenidades de una fila de bits."""
+    bits = np.unpackbits(np.asarray(fila, dtype=np.uint8), count=N_AMENIDADES, bitorder="little")
+    return {
+        categoria: [amenidad for amenidad in amenidades if bits[POSICION_AMENIDAD[amenidad]]]
+        for categoria, amenidades in amenities_por_categoria.items()
+    }
+
+
+def category_counts(bits):
+    """Número de amenidades por categoría de cada fila: diccionario categoría -> array (N,)."""
+    bits = np.atleast_2d(np.asarray(bits, dtype=np.uint8))
+    return {
+        categoria: np.bitwise_count(bits[:, columnas] & mascara).sum(axis=1, dtype=np.int64)
+        for categoria, (columnas, mascara) in _BYTES_CATEGORIAS.items()
+    }
+
+
+def total_counts(bits):
+    """Número total de amenidades de cada fila."""
+    return np.bitwise_count(np.atleast_2d(np.asarray(bits, dtype=np.uint8))).sum(axis=1, dtype=np.int64)
+
+
+def amenity_columns(bits):
+    """Variables ``amenity_*`` (0 o 1) de cada fila, para un modelo entrenado por amenidad."""
+    bits = np.atleast_2d(np.asarray(bits, dtype=np.uint8))
+    matriz = np.unpackbits(bits, axis=1, count=N_AMENIDADES, bitorder="little")
+    return {columna: matriz[:, i] for i, columna in enumerate(COLUMNAS_AMENIDADES)}
+
+
+def amenity_feature_names(feature_names):
+    """Variables para reentrenar el modelo: las actuales más una por amenidad."""
+    return list(feature_names) + [columna for columna in COLUMNAS_AMENIDADES if columna not in feature_names]
+
+
+def uses_amenity_columns(feature_names):
+    """Si el modelo se entrenó con las variables ``amenity_*``."""
+    return any(nombre.startswith(PREFIJO_COLUMNA) for nombre in feature_names)
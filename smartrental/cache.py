@@ -0,0 +1,148 @@
+"""
+Caché de escenarios ya calculados.
+
+Los usuarios suelen alternar entre dos o tres inmuebles con los mismos datos,
+así que se guarda el resultado (precio, flujos y TIR) de cada escenario bajo
+una clave canónica del diccionario ``data`` y de los datos financieros. La
+caché vive en memoria con tamaño máximo (LRU) y caducidad (TTL), y puede
+compartirse opcionalmente en disco entre procesos.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+TAMANO_MAXIMO = 512
+TTL_SEGUNDOS = 3600
+
+
+def _canonical(valor):
+    """Convierte tipos de NumPy y similares a tipos JSON estables."""
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if hasattr(valor, "item"):
+        return valor.item()
+    if isinstance(valor, (list, tuple)):
+        return [_canonical(v) for v in valor]
+    if isinstance(valor, dict):
+        return {str(k): _canonical(v) for k, v in valor.items()}
+    return valor
+
+
+def scenario_key(*partes):
+    """
+    Clave hash canónica de un escenario: el mismo contenido produce la misma
+    clave con independencia del orden de las claves o del tipo numérico.
+    """
+    canonico = json.dumps([_canonical(parte) for parte in partes], sort_keys=True,
+                          separators=(",", ":"), default=repr)
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+class ScenarioCache:
+    """
+    Caché LRU con caducidad, segura entre hilos (sesiones de Streamlit).
+
+    maxsize: Número máximo de escenarios en memoria.
+    ttl: Segundos que un escenario se considera válido.
+    cache_dir: Directorio opcional donde compartir los resultados en disco.
+    """
+
+    def __init__(self, maxsize=TAMANO_MAXIMO, ttl=TTL_SEGUNDOS, cache_dir=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ruta(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _leer_disco(self, key):
+        ruta = self._ruta(key)
+        try:
+            if time.time() - os.path.getmtime(ruta) > self.ttl:
+                return None
+            with open(ruta, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _escribir_disco(self, key, value):
+        # Escritura atómica para que otro proceso nunca lea un fichero a medias
+        fd, temporal = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f)
+            os.replace(temporal, self._ruta(key))
+        except OSError:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+
+    def _guardar_en_memoria(self, key, value):
+        self._datos[key] = (time.monotonic() + self.ttl, value)
+        self._datos.move_to_end(key)
+        while len(self._datos) > self.maxsize:
+            self._datos.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Devuelve el resultado guardado o ``None`` si no existe o caducó."""
+        with self._lock:
+            entrada = self._datos.get(key)
+            if entrada is not None:
+                expira, value = entrada
+                if time.monotonic() < expira:
+                    self._datos.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._datos[key]
+
+        if self.cache_dir:
+            value = self._leer_disco(key)
+            if value is not None:
+                with self._lock:
+                    self._guardar_en_memoria(key, value)
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Guarda el resultado de un escenario."""
+        with self._lock:
+            self._guardar_en_memoria(key, value)
+        if self.cache_dir:
+            self._escribir_disco(key, value)
+
+    def clear(self):
+        """Vacía la memoria (los ficheros en disco caducan por TTL)."""
+        with self._lock:
+            self._datos.clear()
+
+    def stats(self):
+        """Contadores de aciertos y fallos para el panel de depuración."""
+        with self._lock:
+            consultas = self.hits + self.disk_hits + self.misses
+            return {
+                "aciertos": self.hits,
+                "aciertos_disco": self.disk_hits,
+                "fallos": self.misses,
+                "expulsados": self.evictions,
+                "tamano": len(self._datos),
+                "tasa_aciertos": (self.hits + self.disk_hits) / consultas if consultas else 0.0,
+            }
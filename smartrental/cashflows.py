@@ -0,0 +1,38 @@
+"""
+Flujos de caja del análisis de rentabilidad.
+"""
+
+TASA_DESCUENTO_OBJETIVO = .10
+
+HORIZONTE_ANALISIS_ANOS = 10
+
+
+def annual_net_cash_flow(precio_noche, ocupacion, costos_operacion_anuales):
+    """
+    Flujo de caja neto anual: ingresos por noches ocupadas menos costes.
+    Admite escalares o arrays de NumPy.
+    """
+    dias_ocupados_anuales = 365 * ocupacion
+    ingresos_brutos_anuales = precio_noche * dias_ocupados_anuales
+    return ingresos_brutos_anuales - costos_operacion_anuales
+
+
+def build_cash_flows(precio_noche, ocupacion, costos_operacion_anuales,
+                     inversion_inmueble, inversion_amueblar, horizonte):
+    """
+    Crea los flujos de caja para la TIR:
+    - El primer flujo es la inversión inicial (negativa).
+    - Luego, ``horizonte - 1`` flujos de caja anuales netos.
+    - Al final se recupera el valor del inmueble.
+    """
+    flujo_caja_anual_neto = annual_net_cash_flow(precio_noche, ocupacion, costos_operacion_anuales)
+
+    inversion_total_inicial = inversion_inmueble + inversion_amueblar
+    flujos_caja = [-inversion_total_inicial]
+
+    for _ in range(horizonte - 1):
+        flujos_caja.append(flujo_caja_anual_neto)
+
+    flujos_caja.append(inversion_inmueble)
+
+    return flujos_caja
@@ -0,0 +1,533 @@
+"""
+Ciudades disponibles y su codificación para el modelo de precios.
+
+Las tablas son inmutables (tupla y ``MappingProxyType``) y las expresiones
+regulares se compilan una sola vez al importar el módulo. Los índices de
+``resolve_city`` (nombres, alias y trigramas) y de ``nearest_city`` (rejilla
+de cajas envolventes) también se construyen al importar.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+CIUDADES_DISPONIBLES = (
+    "Seattle",
+    "Sicily", 
+    "South Aegean",
+    "Barwon South West Vic",
+    "Madrid",
+    "Pacific Grove",
+    "Belize",
+    "San Mateo County",
+    "Northern Rivers",
+    "Mid North Coast",
+    "Columbus",
+    "Quebec City",
+    "Greater Manchester",
+    "Sunshine Coast",
+    "Salem Or",
+    "Ghent",
+    "Mornington Peninsula",
+    "Barossa Valley",
+    "New Brunswick",
+    "Victoria",
+    "Broward County",
+    "Rhode Island",
+    "Montreal",
+    "Toronto",
+    "Vancouver",
+    "Ottawa",
+    "Winnipeg",
+    "Albany",
+    "Asheville",
+    "Austin",
+    "Boston",
+    "Bozeman",
+    "Cambridge",
+    "Chicago",
+    "Clark County Nv",
+    "Dallas",
+    "Denver",
+    "Fort Worth",
+    "Hawaii",
+    "Jersey City",
+    "Los Angeles",
+    "Nashville",
+    "New Orleans",
+    "New York City",
+    "Newark",
+    "Oakland",
+    "Portland",
+    "Vienna",
+    "Antwerp",
+    "Brussels",
+    "Copenhagen",
+    "Bordeaux",
+    "Athens",
+    "Crete",
+    "Thessaloniki",
+    "Bologna",
+    "Florence",
+    "Naples",
+    "Venice",
+    "Lisbon",
+    "Stockholm",
+    "Vaud",
+    "Edinburgh",
+    "Western Australia",
+    "Singapore",
+    "Twin Cities Msa",
+    "Washington Dc",
+    "Rome",
+    "Rochester",
+    "San Diego",
+    "San Francisco",
+    "Santa Clara County",
+    "Santa Cruz County",
+    "Lyon",
+    "Paris",
+    "Pays Basque",
+    "Berlin",
+    "Munich",
+    "Dublin",
+    "Bergamo",
+    "Milan",
+    "Puglia",
+    "Trentino",
+    "Riga",
+    "Oslo",
+    "Porto",
+    "Barcelona",
+    "Euskadi",
+    "Girona",
+    "Malaga",
+    "Mallorca",
+    "Menorca",
+    "Sevilla",
+    "Valencia",
+    "Geneva",
+    "Zurich",
+    "Bristol",
+    "London",
+    "Cape Town",
+    "Brisbane",
+    "Melbourne",
+    "Sydney",
+    "Tasmania",
+    "Hong Kong",
+    "Tokyo",
+    "Bangkok",
+    "Buenos Aires",
+    "Rio De Janeiro",
+    "Santiago",
+    "Mexico City",
+    "Budapest"
+)
+
+city_mapping = MappingProxyType({
+    "seattle": 1,
+    "sicily": 2,
+    "south-aegean": 3,
+    "barwon-south-west-vic": 4,
+    "madrid": 5,
+    "pacific-grove": 6,
+    "belize": 7,
+    "san-mateo-county": 8,
+    "northern-rivers": 9,
+    "mid-north-coast": 10,
+    "columbus": 11,
+    "quebec-city": 12,
+    "greater-manchester": 13,
+    "sunshine-coast": 14,
+    "salem-or": 15,
+    "ghent": 16,
+    "mornington-peninsula": 17,
+    "barossa-valley": 18,
+    "new-brunswick": 19,
+    "victoria": 20,
+    "broward-county": 21,
+    "rhode-island": 22,
+    "montreal": 23,
+    "toronto": 24,
+    "vancouver": 25,
+    "ottawa": 26,
+    "winnipeg": 27,
+    "albany": 28,
+    "asheville": 29,
+    "austin": 30,
+    "boston": 31,
+    "bozeman": 32,
+    "cambridge": 33,
+    "chicago": 34,
+    "clark-county-nv": 35,
+    "dallas": 36,
+    "denver": 37,
+    "fort-worth": 38,
+    "hawaii": 39,
+    "jersey-city": 40,
+    "los-angeles": 41,
+    "nashville": 42,
+    "new-orleans": 43,
+    "new-york-city": 44,
+    "newark": 45,
+    "oakland": 46,
+    "portland": 47,
+    "vienna": 48,
+    "antwerp": 49,
+    "brussels": 50,
+    "copenhagen": 51,
+    "bordeaux": 52,
+    "athens": 53,
+    "crete": 54,
+    "thessaloniki": 55,
+    "bologna": 56,
+    "florence": 57,
+    "naples": 58,
+    "venice": 59,
+    "lisbon": 60,
+    "stockholm": 61,
+    "vaud": 62,
+    "edinburgh": 63,
+    "western-australia": 64,
+    "singapore": 65,
+    "twin-cities-msa": 66,
+    "washington-dc": 67,
+    "rome": 68,
+    "rochester": 69,
+    "san-diego": 70,
+    "san-francisco": 71,
+    "santa-clara-county": 72,
+    "santa-cruz-county": 73,
+    "lyon": 74,
+    "paris": 75,
+    "pays-basque": 76,
+    "berlin": 77,
+    "munich": 78,
+    "dublin": 79,
+    "bergamo": 80,
+    "milan": 81,
+    "puglia": 82,
+    "trentino": 83,
+    "riga": 84,
+    "oslo": 85,
+    "porto": 86,
+    "barcelona": 87,
+    "euskadi": 88,
+    "girona": 89,
+    "malaga": 90,
+    "mallorca": 91,
+    "menorca": 92,
+    "sevilla": 93,
+    "valencia": 94,
+    "geneva": 95,
+    "zurich": 96,
+    "bristol": 97,
+    "london": 98,
+    "cape-town": 99,
+    "brisbane": 100,
+    "melbourne": 101,
+    "sydney": 102,
+    "tasmania": 103,
+    "hong-kong": 104,
+    "tokyo": 105,
+    "bangkok": 106,
+    "buenos-aires": 107,
+    "rio-de-janeiro": 108,
+    "santiago": 109,
+    "mexico-city": 110,
+    "budapest": 111
+})
+
+_SEPARADORES = re.compile(r'[\s\-_]+')
+_CARACTERES_ESPECIALES = re.compile(r'[^\w\-]')
+_GUIONES_MULTIPLES = re.compile(r'-+')
+
+
+def normalize_city_name(city_name):
+    """
+    Normaliza el nombre de la ciudad para hacer coincidencias.
+    Convierte a minúsculas, reemplaza espacios por guiones, y elimina caracteres especiales.
+    """
+    if not city_name:
+        return ""
+
+    # Convertir a minúsculas
+    normalized = city_name.lower()
+
+    # Reemplazar espacios y caracteres especiales por guiones
+    normalized = _SEPARADORES.sub('-', normalized)
+
+    # Eliminar caracteres especiales excepto guiones
+    normalized = _CARACTERES_ESPECIALES.sub('', normalized)
+
+    # Eliminar guiones múltiples
+    normalized = _GUIONES_MULTIPLES.sub('-', normalized)
+
+    # Eliminar guiones al inicio y final
+    normalized = normalized.strip('-')
+
+    return normalized
+
+
+# --- Resolución aproximada de ciudades ---
+
+# Nombres alternativos (en cualquier forma; se normalizan al importar) -> ciudad
+ALIAS_CIUDADES = MappingProxyType({
+    "nyc": "new-york-city", "new york": "new-york-city", "nueva york": "new-york-city",
+    "manhattan": "new-york-city", "brooklyn": "new-york-city",
+    "washington": "washington-dc", "dc": "washington-dc", "washington d.c.": "washington-dc",
+    "la": "los-angeles", "los ángeles": "los-angeles",
+    "sf": "san-francisco", "san fran": "san-francisco",
+    "las vegas": "clark-county-nv", "vegas": "clark-county-nv",
+    "minneapolis": "twin-cities-msa", "saint paul": "twin-cities-msa", "st paul": "twin-cities-msa",
+    "san jose": "santa-clara-county", "palo alto": "santa-clara-county",
+    "fort lauderdale": "broward-county", "providence": "rhode-island", "salem": "salem-or",
+    "honolulu": "hawaii", "maui": "hawaii", "nueva orleans": "new-orleans",
+    "québec": "quebec-city", "quebec": "quebec-city",
+    "manchester": "greater-manchester", "edimburgo": "edinburgh", "londres": "london",
+    "geelong": "barwon-south-west-vic", "byron bay": "northern-rivers",
+    "port macquarie": "mid-north-coast", "coffs harbour": "mid-north-coast",
+    "perth": "western-australia", "hobart": "tasmania", "sídney": "sydney",
+    "wien": "vienna", "viena": "vienna",
+    "bruxelles": "brussels", "brussel": "brussels", "bruselas": "brussels",
+    "antwerpen": "antwerp", "amberes": "antwerp", "gent": "ghent", "gante": "ghent",
+    "københavn": "copenhagen", "kobenhavn": "copenhagen", "copenhague": "copenhagen",
+    "atenas": "athens", "athina": "athens", "creta": "crete", "heraklion": "crete", "chania": "crete",
+    "tesalónica": "thessaloniki", "salónica": "thessaloniki",
+    "mykonos": "south-aegean", "santorini": "south-aegean", "rodas": "south-aegean", "rhodes": "south-aegean",
+    "sicilia": "sicily", "palermo": "sicily", "catania": "sicily",
+    "firenze": "florence", "florencia": "florence", "napoli": "naples", "nápoles": "naples",
+    "venezia": "venice", "venecia": "venice", "roma": "rome", "milano": "milan", "milán": "milan",
+    "bari": "puglia", "lecce": "puglia", "apulia": "puglia", "trento": "trentino",
+    "lisboa": "lisbon", "oporto": "porto", "estocolmo": "stockholm",
+    "lausanne": "vaud", "lausana": "vaud",
+    "genève": "geneva", "genf": "geneva", "ginebra": "geneva", "zürich": "zurich",
+    "münchen": "munich", "muenchen": "munich", "múnich": "munich", "berlín": "berlin",
+    "dublín": "dublin", "parís": "paris",
+    "biarritz": "pays-basque", "bayonne": "pays-basque",
+    "país vasco": "euskadi", "pais vasco": "euskadi", "basque country": "euskadi",
+    "bilbao": "euskadi", "san sebastián": "euskadi", "donostia": "euskadi", "vitoria": "euskadi",
+    "gerona": "girona", "palma": "mallorca", "palma de mallorca": "mallorca", "majorca": "mallorca",
+    "minorca": "menorca", "seville": "sevilla", "valència": "valencia",
+    "ciudad del cabo": "cape-town", "tokio": "tokyo", "singapur": "singapore",
+    "ciudad de méxico": "mexico-city", "cdmx": "mexico-city", "méxico df": "mexico-city",
+    "río de janeiro": "rio-de-janeiro", "rio": "rio-de-janeiro", "santiago de chile": "santiago",
+})
+
+# Centro aproximado (lat, lon) y radio en km de cada ciudad o región, para
+# asignar unas coordenadas a la ciudad soportada más cercana
+CENTROS_CIUDADES = MappingProxyType({
+    "seattle": (47.61, -122.33, 30), "sicily": (37.6, 14.0, 150), "south-aegean": (36.9, 25.4, 200),
+    "barwon-south-west-vic": (-38.3, 143.2, 150), "madrid": (40.42, -3.70, 40),
+    "pacific-grove": (36.62, -121.92, 10), "belize": (17.2, -88.5, 150),
+    "san-mateo-county": (37.50, -122.33, 30), "northern-rivers": (-28.8, 153.3, 80),
+    "mid-north-coast": (-31.4, 152.7, 120), "columbus": (39.96, -83.00, 30),
+    "quebec-city": (46.81, -71.21, 30), "greater-manchester": (53.48, -2.24, 30),
+    "sunshine-coast": (-26.65, 153.07, 50), "salem-or": (44.94, -123.04, 25), "ghent": (51.05, 3.72, 20),
+    "mornington-peninsula": (-38.37, 145.03, 30), "barossa-valley": (-34.53, 138.95, 30),
+    "new-brunswick": (46.5, -66.2, 200), "victoria": (48.43, -123.37, 30),
+    "broward-county": (26.19, -80.37, 40), "rhode-island": (41.70, -71.55, 60),
+    "montreal": (45.50, -73.57, 30), "toronto": (43.65, -79.38, 35), "vancouver": (49.28, -123.12, 25),
+    "ottawa": (45.42, -75.70, 30), "winnipeg": (49.90, -97.14, 25), "albany": (42.65, -73.75, 25),
+    "asheville": (35.60, -82.55, 25), "austin": (30.27, -97.74, 30), "boston": (42.36, -71.06, 20),
+    "bozeman": (45.68, -111.04, 30), "cambridge": (42.37, -71.11, 8), "chicago": (41.88, -87.63, 35),
+    "clark-county-nv": (36.17, -115.14, 60), "dallas": (32.78, -96.80, 35), "denver": (39.74, -104.99, 30),
+    "fort-worth": (32.76, -97.33, 30), "hawaii": (20.8, -156.3, 350), "jersey-city": (40.73, -74.08, 8),
+    "los-angeles": (34.05, -118.24, 60), "nashville": (36.16, -86.78, 30),
+    "new-orleans": (29.95, -90.07, 25), "new-york-city": (40.71, -74.01, 35), "newark": (40.74, -74.17, 10),
+    "oakland": (37.80, -122.27, 15), "portland": (45.52, -122.68, 30), "vienna": (48.21, 16.37, 25),
+    "antwerp": (51.22, 4.40, 20), "brussels": (50.85, 4.35, 20), "copenhagen": (55.68, 12.57, 25),
+    "bordeaux": (44.84, -0.58, 30), "athens": (37.98, 23.73, 30), "crete": (35.24, 24.81, 150),
+    "thessaloniki": (40.64, 22.94, 25), "bologna": (44.49, 11.34, 25), "florence": (43.77, 11.26, 30),
+    "naples": (40.85, 14.27, 30), "venice": (45.44, 12.33, 25), "lisbon": (38.72, -9.14, 35),
+    "stockholm": (59.33, 18.07, 35), "vaud": (46.57, 6.55, 60), "edinburgh": (55.95, -3.19, 20),
+    "western-australia": (-31.95, 115.86, 1200), "singapore": (1.35, 103.82, 30),
+    "twin-cities-msa": (44.98, -93.27, 50), "washington-dc": (38.91, -77.04, 20),
+    "rome": (41.90, 12.50, 35), "rochester": (43.16, -77.61, 25), "san-diego": (32.72, -117.16, 40),
+    "san-francisco": (37.77, -122.42, 12), "santa-clara-county": (37.35, -121.95, 35),
+    "santa-cruz-county": (37.03, -122.00, 30), "lyon": (45.76, 4.84, 25), "paris": (48.86, 2.35, 25),
+    "pays-basque": (43.40, -1.40, 50), "berlin": (52.52, 13.40, 30), "munich": (48.14, 11.58, 25),
+    "dublin": (53.35, -6.26, 30), "bergamo": (45.70, 9.67, 30), "milan": (45.46, 9.19, 30),
+    "puglia": (41.0, 16.6, 150), "trentino": (46.07, 11.12, 60), "riga": (56.95, 24.11, 25),
+    "oslo": (59.91, 10.75, 25), "porto": (41.15, -8.61, 30), "barcelona": (41.39, 2.17, 30),
+    "euskadi": (43.05, -2.60, 70), "girona": (41.98, 2.82, 60), "malaga": (36.72, -4.42, 60),
+    "mallorca": (39.61, 2.95, 70), "menorca": (39.95, 4.05, 35), "sevilla": (37.39, -5.98, 40),
+    "valencia": (39.47, -0.38, 35), "geneva": (46.20, 6.14, 20), "zurich": (47.38, 8.54, 25),
+    "bristol": (51.45, -2.59, 20), "london": (51.51, -0.13, 40), "cape-town": (-33.92, 18.42, 60),
+    "brisbane": (-27.47, 153.03, 40), "melbourne": (-37.81, 144.96, 50), "sydney": (-33.87, 151.21, 60),
+    "tasmania": (-42.0, 146.6, 250), "hong-kong": (22.32, 114.17, 30), "tokyo": (35.68, 139.69, 60),
+    "bangkok": (13.76, 100.50, 40), "buenos-aires": (-34.60, -58.38, 35),
+    "rio-de-janeiro": (-22.91, -43.17, 40), "santiago": (-33.45, -70.67, 40),
+    "mexico-city": (19.43, -99.13, 40), "budapest": (47.50, 19.04, 25),
+})
+
+# Similitud mínima (0-1, por distancia de edición) para aceptar una coincidencia aproximada
+SIMILITUD_MINIMA = 0.75
+
+CANDIDATOS_APROXIMADOS = 5
+
+RADIO_TIERRA_KM = 6371.0088
+
+# Tamaño en grados de las celdas del índice por cajas envolventes
+TAMANO_CELDA_GRADOS = 1.0
+
+
+class CityMatch(NamedTuple):
+    """Resultado de resolver una ciudad."""
+    slug: str
+    city_label: int
+    nombre: str
+    metodo: str  # "exacto", "alias", "aproximado" o "coordenadas"
+    similitud: float = 1.0
+    distancia_km: Optional[float] = None
+
+
+def _sin_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def city_key(city_name):
+    """Clave de búsqueda: ``normalize_city_name`` sin acentos ni puntuación."""
+    return normalize_city_name(_sin_acentos(city_name or "").replace(".", ""))
+
+
+def _trigramas(clave):
+    relleno = f"  {clave.replace('-', ' ')} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def _distancia_edicion(a, b, maximo):
+    """
+    Distancia de edición entre dos cadenas cortas (Levenshtein contando el
+    intercambio de dos letras contiguas como un solo error), o ``maximo + 1``
+    en cuanto se sabe que la supera.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if len(a) - len(b) > maximo:
+        return maximo + 1
+    antepenultima, anterior = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            distancia = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb))
+            if antepenultima is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                distancia = min(distancia, antepenultima[j - 2] + 1)
+            actual.append(distancia)
+        # Cada fila acota por debajo la distancia final
+        if min(actual) > maximo:
+            return maximo + 1
+        antepenultima, anterior = anterior, actual
+    return anterior[-1]
+
+
+_NOMBRE_POR_SLUG = MappingProxyType({normalize_city_name(nombre): nombre for nombre in CIUDADES_DISPONIBLES})
+
+# Clave normalizada -> (slug, método) para nombres oficiales y alias
+_INDICE_EXACTO = MappingProxyType({
+    **{city_key(alias): (slug, "alias") for alias, slug in ALIAS_CIUDADES.items()},
+    **{city_key(slug): (slug, "exacto") for slug in city_mapping},
+})
+
+_INDICE_TRIGRAMAS = {}
+for _clave in _INDICE_EXACTO:
+    for _trigrama in _trigramas(_clave):
+        _INDICE_TRIGRAMAS.setdefault(_trigrama, []).append(_clave)
+_INDICE_TRIGRAMAS = MappingProxyType({t: tuple(claves) for t, claves in _INDICE_TRIGRAMAS.items()})
+_TRIGRAMAS_POR_CLAVE = MappingProxyType({clave: len(_trigramas(clave)) for clave in _INDICE_EXACTO})
+
+
+def _match(slug, metodo, similitud=1.0, distancia_km=None):
+    return CityMatch(slug, city_mapping[slug], _NOMBRE_POR_SLUG[slug], metodo, similitud, distancia_km)
+
+
+@lru_cache(maxsize=4096)
+def resolve_city(city_name, similitud_minima=SIMILITUD_MINIMA):
+    """
+    Resuelve un nombre de ciudad escrito libremente. Devuelve un ``CityMatch``
+    o ``None`` si ninguna ciudad soportada se parece lo suficiente.
+
+    Las coincidencias exactas y los alias son una consulta a un diccionario;
+    si no hay ninguna, se preseleccionan candidatos por trigramas compartidos
+    y se confirma el mejor por distancia de edición.
+    """
+    clave = city_key(city_name)
+    if not clave:
+        return None
+    encontrado = _INDICE_EXACTO.get(clave)
+    if encontrado is not None:
+        return _match(*encontrado)
+    if "," in city_name:
+        # "Barcelona, Spain" -> "Barcelona"
+        return resolve_city(city_name.split(",")[0], similitud_minima)
+
+    trigramas = _trigramas(clave)
+    comunes = {}
+    for trigrama in trigramas:
+        for candidata in _INDICE_TRIGRAMAS.get(trigrama, ()):
+            comunes[candidata] = comunes.get(candidata, 0) + 1
+    if not comunes:
+        return None
+
+    def dice(candidata):
+        return 2 * comunes[candidata] / (len(trigramas) + _TRIGRAMAS_POR_CLAVE[candidata])
+
+    mejor, mejor_similitud = None, similitud_minima
+    for candidata in heapq.nlargest(CANDIDATOS_APROXIMADOS, comunes, key=dice):
+        longitud = max(len(clave), len(candidata))
+        # Distancia máxima con la que la candidata aún mejoraría a la mejor encontrada
+        maximo = int(longitud * (1 - mejor_similitud))
+        similitud = 1 - _distancia_edicion(clave, candidata, maximo) / longitud
+        if similitud > mejor_similitud or (mejor is None and similitud >= mejor_similitud):
+            mejor, mejor_similitud = candidata, similitud
+    if mejor is None:
+        return None
+    return _match(_INDICE_EXACTO[mejor][0], "aproximado", mejor_similitud)
+
+
+def _celdas(lat, lon, radio_km):
+    """Celdas de la rejilla que cubre la caja envolvente de un círculo."""
+    dlat = radio_km / 111.0
+    dlon = radio_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    fila_min, fila_max = math.floor((lat - dlat) / TAMANO_CELDA_GRADOS), math.floor((lat + dlat) / TAMANO_CELDA_GRADOS)
+    columnas = range(math.floor((lon - dlon) / TAMANO_CELDA_GRADOS), math.floor((lon + dlon) / TAMANO_CELDA_GRADOS) + 1)
+    for fila in range(fila_min, fila_max + 1):
+        for columna in columnas:
+            # La longitud da la vuelta en ±180°
+            yield fila, (columna + int(180 / TAMANO_CELDA_GRADOS)) % int(360 / TAMANO_CELDA_GRADOS)
+
+
+_INDICE_CELDAS = {}
+for _slug, (_lat, _lon, _radio) in CENTROS_CIUDADES.items():
+    for _celda in _celdas(_lat, _lon, _radio):
+        _INDICE_CELDAS.setdefault(_celda, []).append(_slug)
+_INDICE_CELDAS = MappingProxyType({celda: tuple(slugs) for celda, slugs in _INDICE_CELDAS.items()})
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def nearest_city(latitude, longitude):
+    """
+    Ciudad soportada más cercana a unas coordenadas, siempre que estén dentro
+    de su radio aproximado. Devuelve un ``CityMatch`` o ``None``.
+    """
+    if latitude is None or longitude is None:
+        return None
+    celda = next(_celdas(latitude, longitude, 0))
+    mejor, mejor_distancia = None, math.inf
+    for slug in _INDICE_CELDAS.get(celda, ()):
+        lat, lon, radio = CENTROS_CIUDADES[slug]
+        distancia = _haversine_km(latitude, longitude, lat, lon)
+        if distancia <= radio and distancia < mejor_distancia:
+            mejor, mejor_distancia = slug, distancia
+    if mejor is None:
+        return None
+    return _match(mejor, "coordenadas", distancia_km=mejor_distancia)
@@ -0,0 +1,208 @@
+"""
+Comparables de mercado alrededor de unas coordenadas.
+
+Cada ciudad tiene su propio fichero ``<ciudad>.npz`` (nombre normalizado con
+``normalize_city_name``) en ``SMARTRENTAL_COMPARABLES_DIR`` (por defecto
+``data/comparables`` en la raíz del proyecto), con arrays ``latitude``,
+``longitude``, ``price`` y ``occupancy`` de los anuncios de esa ciudad. Los ficheros y sus índices
+espaciales (``scipy.spatial.cKDTree`` sobre coordenadas en la esfera unidad)
+se cargan la primera vez que se consulta la ciudad, así que el arranque no
+depende del número de ciudades disponibles.
+
+Para generar los ficheros a partir de un CSV de anuncios (por ejemplo
+``listings.csv`` de Inside Airbnb):
+
+    python -m smartrental.comparables build listings.csv --ciudad Madrid
+"""
+import argparse
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from smartrental.cities import normalize_city_name
+from smartrental.pricing import RAIZ_PROYECTO
+
+COMPARABLES_DIR = os.environ.get("SMARTRENTAL_COMPARABLES_DIR", os.path.join(RAIZ_PROYECTO, "data", "comparables"))
+
+RADIO_TIERRA_KM = 6371.0088
+
+K_COMPARABLES = 20
+
+# Ciudades con índice en memoria a la vez (las menos usadas se descartan)
+CIUDADES_EN_MEMORIA = 16
+
+COLUMNAS = ("latitude", "longitude", "price", "occupancy")
+
+
+def _a_esfera(latitude, longitude):
+    """Coordenadas cartesianas en la esfera unidad (la distancia euclídea es la cuerda)."""
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _cuerda_a_km(cuerda):
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.clip(cuerda / 2, 0.0, 1.0))
+
+
+def _km_a_cuerda(km):
+    return 2 * np.sin(np.asarray(km) / (2 * RADIO_TIERRA_KM))
+
+
+class CityComparables:
+    """Anuncios de una ciudad con su índice espacial."""
+
+    def __init__(self, datos):
+        from scipy.spatial import cKDTree
+
+        self.datos = {columna: np.asarray(datos[columna]) for columna in COLUMNAS}
+        self.tree = cKDTree(_a_esfera(self.datos["latitude"], self.datos["longitude"]))
+
+    def __len__(self):
+        return len(self.datos["latitude"])
+
+    def nearest(self, latitude, longitude, k=K_COMPARABLES, radio_km=None):
+        """
+        Los ``k`` anuncios más cercanos (dentro de ``radio_km`` si se indica),
+        ordenados por distancia, como DataFrame con ``distancia_km``.
+        """
+        k = min(k, len(self))
+        if k == 0:
+            return pd.DataFrame(columns=COLUMNAS + ("distancia_km",))
+        limite = np.inf if radio_km is None else float(_km_a_cuerda(radio_km))
+        distancias, indices = self.tree.query(_a_esfera(latitude, longitude), k=k, distance_upper_bound=limite)
+        distancias, indices = np.atleast_1d(distancias), np.atleast_1d(indices)
+        encontrados = np.isfinite(distancias)
+        indices = indices[encontrados]
+        resultado = pd.DataFrame({columna: valores[indices] for columna, valores in self.datos.items()})
+        resultado["distancia_km"] = _cuerda_a_km(distancias[encontrados])
+        return resultado
+
+
+class ComparablesIndex:
+    """
+    Índices de comparables por ciudad, cargados bajo demanda y compartidos
+    entre hilos (sesiones de Streamlit).
+    """
+
+    def __init__(self, directorio=COMPARABLES_DIR, max_ciudades=CIUDADES_EN_MEMORIA):
+        self.directorio = directorio
+        self.max_ciudades = max_ciudades
+        self._ciudades = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, ciudad):
+        return os.path.join(self.directorio, f"{normalize_city_name(ciudad)}.npz")
+
+    def available(self, ciudad):
+        """Indica si hay datos de comparables para la ciudad."""
+        return os.path.exists(self.path(ciudad))
+
+    def city(self, ciudad):
+        """Índice de la ciudad, o ``None`` si no hay datos."""
+        clave = normalize_city_name(ciudad)
+        with self._lock:
+            if clave in self._ciudades:
+                self._ciudades.move_to_end(clave)
+                return self._ciudades[clave]
+
+        if not self.available(ciudad):
+            return None
+        with np.load(self.path(ciudad)) as datos:
+            indice = CityComparables(datos)
+
+        with self._lock:
+            self._ciudades[clave] = indice
+            while len(self._ciudades) > self.max_ciudades:
+                self._ciudades.popitem(last=False)
+        return indice
+
+    def nearest(self, ciudad, latitude, longitude, k=K_COMPARABLES, radio_km=None):
+        """Comparables más cercanos en la ciudad (``None`` si no hay datos)."""
+        indice = self.city(ciudad)
+        if indice is None:
+            return None
+        return indice.nearest(latitude, longitude, k, radio_km)
+
+
+def _precio_numerico(precios):
+    """Convierte precios de texto como "$1,234.00" en números."""
+    if not pd.api.types.is_numeric_dtype(precios):
+        precios = precios.astype(str).str.replace(r"[^\d.\-]", "", regex=True)
+    return pd.to_numeric(precios, errors="coerce")
+
+
+def listings_to_arrays(listings):
+    """
+    Arrays de comparables a partir de un DataFrame de anuncios. La ocupación
+    se toma de ``occupancy`` (fracción), de ``estimated_occupancy_l365d``
+    (noches) o se estima como ``1 - availability_365 / 365``.
+    """
+    if "occupancy" in listings.columns:
+        ocupacion = pd.to_numeric(listings["occupancy"], errors="coerce")
+    elif "estimated_occupancy_l365d" in listings.columns:
+        ocupacion = pd.to_numeric(listings["estimated_occupancy_l365d"], errors="coerce") / 365
+    elif "availability_365" in listings.columns:
+        ocupacion = 1 - pd.to_numeric(listings["availability_365"], errors="coerce") / 365
+    else:
+        ocupacion = pd.Series(np.nan, index=listings.index)
+
+    datos = pd.DataFrame({
+        "latitude": pd.to_numeric(listings["latitude"], errors="coerce"),
+        "longitude": pd.to_numeric(listings["longitude"], errors="coerce"),
+        "price": _precio_numerico(listings["price"]),
+        "occupancy": ocupacion.clip(0, 1),
+    }).dropna(subset=["latitude", "longitude", "price"])
+    return {
+        "latitude": datos["latitude"].to_numpy(np.float64),
+        "longitude": datos["longitude"].to_numpy(np.float64),
+        "price": datos["price"].to_numpy(np.float32),
+        "occupancy": datos["occupancy"].to_numpy(np.float32),
+    }
+
+
+def build_comparables(listings_path, ciudad=None, directorio=COMPARABLES_DIR, columna_ciudad="city"):
+    """
+    Escribe un ``.npz`` por ciudad a partir de un CSV de anuncios. Con
+    ``ciudad`` todo el fichero se asigna a esa ciudad; si no, se agrupa por
+    ``columna_ciudad``. Devuelve ``{ciudad_normalizada: número de anuncios}``.
+    """
+    listings = pd.read_csv(listings_path, low_memory=False)
+    os.makedirs(directorio, exist_ok=True)
+    if ciudad is not None:
+        grupos = [(ciudad, listings)]
+    else:
+        grupos = listings.groupby(columna_ciudad)
+
+    escritos = {}
+    for nombre, grupo in grupos:
+        arrays = listings_to_arrays(grupo)
+        clave = normalize_city_name(nombre)
+        # Sin compresión: la carga es una lectura directa de los arrays
+        np.savez(os.path.join(directorio, f"{clave}.npz"), **arrays)
+        escritos[clave] = len(arrays["latitude"])
+    return escritos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Datos de comparables por ciudad")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    construir = sub.add_parser("build", help="Genera los ficheros .npz a partir de un CSV de anuncios")
+    construir.add_argument("listings", help="CSV con latitude, longitude, price y ocupación o disponibilidad")
+    construir.add_argument("--ciudad", help="Ciudad de todos los anuncios del fichero")
+    construir.add_argument("--columna-ciudad", default="city", help="Columna con la ciudad si no se indica --ciudad")
+    construir.add_argument("--directorio", default=COMPARABLES_DIR)
+
+    args = parser.parse_args()
+    escritos = build_comparables(args.listings, args.ciudad, args.directorio, args.columna_ciudad)
+    for clave, n in escritos.items():
+        print(f"✅ {clave}: {n:,} anuncios")
+
+
+if __name__ == "__main__":
+    main()
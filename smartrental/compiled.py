@@ -0,0 +1,197 @@
+"""
+Inferencia compilada para modelos de árboles de scikit-learn.
+
+``model.predict`` de scikit-learn paga validaciones del DataFrame, comprobación
+de nombres de variables y un despacho por árbol en cada llamada, lo que domina
+la latencia al valorar un único inmueble. Aquí los árboles del modelo se
+aplanan en arrays contiguos (variable, umbral, hijo izquierdo, hijo derecho,
+valor) y se recorren para todas las filas y todos los árboles a la vez con
+NumPy, sin dependencias adicionales. En lotes grandes el coste fijo deja de
+dominar y se usa el ``predict`` original.
+
+Modelos soportados: ``DecisionTreeRegressor``, ``RandomForestRegressor``,
+``ExtraTreesRegressor`` y ``GradientBoostingRegressor`` (con ``init`` constante).
+``optimize_model`` solo devuelve la versión compilada si reproduce
+``model.predict`` sobre un conjunto de referencia; si no, devuelve el modelo
+original.
+"""
+import os
+
+import numpy as np
+
+# Por encima de este tamaño de lote se usa el predict del modelo original
+FILAS_MAXIMAS = 1000
+
+TOLERANCIA_PARIDAD = 1e-9
+
+FILAS_REFERENCIA = 2000
+
+
+def _tree_arrays(estimator):
+    """Arrays de nodos de un árbol de scikit-learn."""
+    tree = estimator.tree_
+    n_nodos = tree.node_count
+    missing_left = getattr(tree, "missing_go_to_left", None)
+    if missing_left is None:
+        missing_left = np.zeros(n_nodos, dtype=np.uint8)
+    return {
+        "left": tree.children_left.astype(np.int64),
+        "right": tree.children_right.astype(np.int64),
+        "feature": tree.feature.astype(np.int64),
+        "threshold": tree.threshold.astype(np.float64),
+        "missing_left": np.asarray(missing_left, dtype=bool),
+        "value": tree.value[:, 0, 0].astype(np.float64),
+    }
+
+
+def _ensemble_parts(model):
+    """
+    Descompone el modelo en (árboles, escala, sesgo) con
+    ``predict(X) = sesgo + escala * sum(árbol(X))``. ``None`` si no se soporta.
+    """
+    nombre = type(model).__name__
+    n_salidas = getattr(model, "n_outputs_", 1)
+    if n_salidas != 1:
+        return None
+
+    if nombre == "DecisionTreeRegressor":
+        return [model], 1.0, 0.0
+
+    if nombre in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        arboles = list(model.estimators_)
+        return arboles, 1.0 / len(arboles), 0.0
+
+    if nombre == "GradientBoostingRegressor":
+        init = model.init_
+        if isinstance(init, str) and init == "zero":
+            sesgo = 0.0
+        elif type(init).__name__ == "DummyRegressor":
+            sesgo = float(np.ravel(init.constant_)[0])
+        else:
+            return None
+        arboles = [fila[0] for fila in model.estimators_]
+        return arboles, float(model.learning_rate), sesgo
+
+    return None
+
+
+class CompiledTreeEnsemble:
+    """
+    Conjunto de árboles aplanado en arrays. Se usa igual que el modelo original
+    (``predict`` acepta un DataFrame o un array 2-D con las columnas en orden).
+    """
+
+    def __init__(self, model, arboles, escala, sesgo):
+        self.source_model = model
+        self.escala = escala
+        self.sesgo = sesgo
+        if hasattr(model, "feature_names_in_"):
+            self.feature_names_in_ = model.feature_names_in_
+        self.n_features_in_ = model.n_features_in_
+
+        partes = [_tree_arrays(arbol) for arbol in arboles]
+        desplazamientos = np.cumsum([0] + [len(p["left"]) for p in partes[:-1]])
+        self.raices = desplazamientos.astype(np.int64)
+
+        left, right = [], []
+        for parte, desplazamiento in zip(partes, desplazamientos):
+            hoja = parte["left"] == -1
+            indices = np.arange(len(hoja)) + desplazamiento
+            # Las hojas apuntan a sí mismas: el recorrido no necesita ramas
+            left.append(np.where(hoja, indices, parte["left"] + desplazamiento))
+            right.append(np.where(hoja, indices, parte["right"] + desplazamiento))
+
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.feature = np.concatenate([np.maximum(p["feature"], 0) for p in partes])
+        self.threshold = np.concatenate([p["threshold"] for p in partes])
+        self.missing_left = np.concatenate([p["missing_left"] for p in partes])
+        self.value = np.concatenate([p["value"] for p in partes])
+        self.profundidad = max(arbol.tree_.max_depth for arbol in arboles)
+        self.n_arboles = len(arboles)
+
+    def _predict_block(self, X):
+        n_filas, n_columnas = X.shape
+        plano = X.ravel()
+        base = np.repeat(np.arange(n_filas) * n_columnas, self.n_arboles)
+        nodos = np.tile(self.raices, n_filas)
+        for _ in range(self.profundidad):
+            x = plano[base + self.feature[nodos]]
+            izquierda = (x <= self.threshold[nodos]) | (np.isnan(x) & self.missing_left[nodos])
+            nodos = np.where(izquierda, self.left[nodos], self.right[nodos])
+        hojas = self.value[nodos].reshape(n_filas, self.n_arboles)
+        return self.sesgo + self.escala * hojas.sum(axis=1)
+
+    def predict_compiled(self, X):
+        """Predicción con el recorrido compilado, sea cual sea el tamaño del lote."""
+        if hasattr(X, "to_numpy"):
+            X = X.to_numpy()
+        # scikit-learn compara las variables en float32 con umbrales en float64
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Se esperaban {self.n_features_in_} columnas, se recibió forma {X.shape}")
+        return self._predict_block(X)
+
+    def predict(self, X):
+        """
+        Predice una fila por entrada, igual que ``model.predict``. Los lotes de
+        más de ``FILAS_MAXIMAS`` filas se delegan en el modelo original, cuyo
+        recorrido en Cython es más rápido cuando el coste fijo ya no domina.
+        """
+        if len(X) > FILAS_MAXIMAS:
+            return self.source_model.predict(X)
+        return self.predict_compiled(X)
+
+
+def compile_model(model):
+    """Devuelve la versión compilada del modelo o ``None`` si no se soporta."""
+    partes = _ensemble_parts(model)
+    if partes is None:
+        return None
+    return CompiledTreeEnsemble(model, *partes)
+
+
+def reference_dataset(compiled, n_filas=FILAS_REFERENCIA, seed=0):
+    """
+    Conjunto de referencia que recorre las ramas del modelo: cada variable
+    toma valores en los umbrales de los árboles y ligeramente a cada lado.
+    """
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_filas, compiled.n_features_in_), dtype=np.float32)
+    internos = compiled.left != np.arange(len(compiled.left))
+    for columna in range(compiled.n_features_in_):
+        umbrales = compiled.threshold[internos & (compiled.feature == columna)]
+        if umbrales.size == 0:
+            continue
+        valores = rng.choice(umbrales, n_filas)
+        X[:, columna] = valores + rng.choice([-1.0, 0.0, 1.0], n_filas) * np.maximum(np.abs(valores), 1.0) * 1e-3
+    return X
+
+
+def check_parity(model, compiled, X=None):
+    """
+    Compara la versión compilada con ``model.predict``. Devuelve la máxima
+    diferencia absoluta observada.
+    """
+    if X is None:
+        X = reference_dataset(compiled)
+    if hasattr(model, "feature_names_in_") and not hasattr(X, "columns"):
+        import pandas as pd
+        X = pd.DataFrame(X, columns=model.feature_names_in_)
+    return float(np.max(np.abs(model.predict(X) - compiled.predict_compiled(X))))
+
+
+def optimize_model(model):
+    """
+    Devuelve la versión compilada del modelo si está soportada y supera la
+    prueba de paridad; en caso contrario, el propio modelo. Se puede
+    desactivar con la variable de entorno SMARTRENTAL_COMPILED=0.
+    """
+    if os.environ.get("SMARTRENTAL_COMPILED", "1") == "0":
+        return model
+    compiled = compile_model(model)
+    if compiled is None:
+        return model
+    if check_parity(model, compiled) > TOLERANCIA_PARIDAD:
+        return model
+    return compiled
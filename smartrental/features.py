@@ -0,0 +1,140 @@
+"""
+Construcción del vector de variables (diccionario ``data``) que recibe el modelo.
+"""
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from smartrental.amenity_bits import amenity_columns, category_counts, encode_amenities
+
+# Categoría de amenidades -> variable del modelo con el número seleccionado
+CATEGORIAS_AMENIDADES = MappingProxyType({
+    "Accesibilidad y Movilidad": "accesibilidad_y_movilidad_count",
+    "Baño y Bienestar": "baño_y_bienestar_count",
+    "Climatización y Confort": "climatización_y_confort_count",
+    "Cocina y Comida": "cocina_y_comida_count",
+    "Deporte, Salud y Ocio": "deporte_salud_y_ocio_count",
+    "Familia y Bebé": "familia_y_bebé_count",
+    "Lavandería y Limpieza": "lavandería_y_limpieza_count",
+    "Seguridad": "seguridad_count",
+    "Tecnología y Entretenimiento": "tecnología_y_entretenimiento_count",
+    "Vistas y Espacios Exteriores": "vistas_y_espacios_exteriores_count",
+})
+
+TIPOS_ALOJAMIENTO = ("Piso entero", "Habitación privada")
+
+# Valores por defecto del formulario de la aplicación. El servicio HTTP y la
+# evaluación de carteras los usan para los campos que no se indican
+VALORES_POR_DEFECTO = MappingProxyType({
+    "ciudad": "Barcelona",
+    "latitude": 41.3851,
+    "longitude": 2.1734,
+    "room_type": "Piso entero",
+    "accommodates": 4,
+    "bathrooms": 1.0,
+    "bedrooms": 2,
+    "beds": 3,
+    "minimum_nights": 2,
+    "maximum_nights": 30,
+    "amenities": {},
+    "inversion_inmueble": 150000.0,
+    "inversion_amueblar": 20000.0,
+    "costos_operacion_anuales": 5000.0,
+    "ocupacion_anual_porcentaje": 0.7,
+})
+
+
+def build_features(latitude, longitude, city_label, room_type, accommodates, bathrooms,
+                   bedrooms, beds, minimum_nights, maximum_nights, amenities_seleccionadas,
+                   columnas_amenidades=False):
+    """
+    Devuelve el diccionario de variables del modelo para un inmueble.
+
+    room_type: "Piso entero" o "Habitación privada".
+    amenities_seleccionadas: Diccionario categoría -> lista de amenidades elegidas.
+    columnas_amenidades: Añade las variables ``amenity_*`` de un modelo
+    entrenado por amenidad (``smartrental.amenity_bits``).
+    """
+    conteos = {
+        columna: len(amenities_seleccionadas.get(categoria, []))
+        for categoria, columna in CATEGORIAS_AMENIDADES.items()
+    }
+
+    data = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "accommodates": accommodates,
+        "bathrooms": bathrooms,
+        "bedrooms": bedrooms,
+        "beds": beds,
+        "minimum_nights": minimum_nights,
+        "maximum_nights": maximum_nights,
+    }
+    data.update(conteos)
+    data.update({
+        "total_amenities_count": sum(conteos.values()),
+        "city_label": city_label,
+        "room_type_entire home/apt": 1 if room_type == "Piso entero" else 0,
+        "room_type_hotel room": 0,
+        "room_type_private room": 1 if room_type == "Habitación privada" else 0,
+        "room_type_shared room": 0
+    })
+    if columnas_amenidades:
+        data.update({
+            columna: int(valor[0])
+            for columna, valor in amenity_columns(encode_amenities(amenities_seleccionadas)).items()
+        })
+    return data
+
+
+def build_feature_frame(latitude, longitude, city_label, room_type, accommodates, bathrooms,
+                        bedrooms, beds, minimum_nights, maximum_nights, conteos_amenidades=None,
+                        bits_amenidades=None, columnas_amenidades=False):
+    """
+    Versión por lotes de ``build_features``: cada argumento es un array o
+    Serie con un valor por inmueble (o un escalar común a todos).
+
+    room_type: Etiquetas de la aplicación ("Piso entero", "Habitación privada").
+    conteos_amenidades: Diccionario categoría -> número de amenidades por inmueble.
+    bits_amenidades: Matriz N x ``BYTES_AMENIDADES`` de ``smartrental.amenity_bits``;
+    los conteos que no se indiquen en ``conteos_amenidades`` se obtienen de ella.
+    columnas_amenidades: Añade las variables ``amenity_*`` a partir de ``bits_amenidades``.
+    Devuelve un DataFrame con las mismas columnas y en el mismo orden que ``build_features``.
+    """
+    room_type = np.asarray(room_type, dtype=object)
+    n = len(room_type)
+    conteos_amenidades = dict(conteos_amenidades or {})
+    if bits_amenidades is not None:
+        for categoria, conteo in category_counts(bits_amenidades).items():
+            conteos_amenidades.setdefault(categoria, conteo)
+    conteos = {
+        columna: np.broadcast_to(np.asarray(conteos_amenidades.get(categoria, 0), dtype=np.int64), (n,))
+        for categoria, columna in CATEGORIAS_AMENIDADES.items()
+    }
+
+    data = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "accommodates": accommodates,
+        "bathrooms": bathrooms,
+        "bedrooms": bedrooms,
+        "beds": beds,
+        "minimum_nights": minimum_nights,
+        "maximum_nights": maximum_nights,
+    }
+    data = {columna: np.broadcast_to(np.asarray(valor), (n,)) for columna, valor in data.items()}
+    data.update(conteos)
+    data.update({
+        "total_amenities_count": sum(conteos.values()),
+        "city_label": np.broadcast_to(np.asarray(city_label), (n,)),
+        "room_type_entire home/apt": (room_type == "Piso entero").astype(np.int64),
+        "room_type_hotel room": np.zeros(n, dtype=np.int64),
+        "room_type_private room": (room_type == "Habitación privada").astype(np.int64),
+        "room_type_shared room": np.zeros(n, dtype=np.int64),
+    })
+    if columnas_amenidades:
+        if bits_amenidades is None:
+            raise ValueError("El modelo usa variables por amenidad y no se indicaron bits_amenidades")
+        data.update(amenity_columns(bits_amenidades))
+    return pd.DataFrame(data)
@@ -0,0 +1,148 @@
+"""
+Trabajos en segundo plano para que el script de Streamlit no se bloquee.
+
+Un único ``JobPool`` por proceso (servidor) ejecuta los cálculos pesados en
+un pool de hilos acotado: ``SMARTRENTAL_MAX_TRABAJOS`` trabajos a la vez
+(por defecto, hasta 4 según los núcleos) y como mucho ``EN_COLA_POR_HILO``
+esperando por cada hilo. Así muchas sesiones simultáneas no reparten los
+núcleos entre más cálculos de los que pueden avanzar. Se usan hilos y no
+procesos porque el modelo se comparte en memoria y NumPy y scikit-learn
+liberan el GIL en las operaciones costosas.
+
+La sesión guarda el ``Job`` devuelto por ``submit`` en ``st.session_state``
+y consulta su estado en cada ejecución. La función del trabajo recibe el
+propio ``Job`` como primer argumento para informar del progreso, publicar
+resultados parciales y comprobar si se ha cancelado.
+
+Cada trabajo se ejecuta en una copia del contexto de quien lo envía y abre
+su propia petición ``trabajo`` en ``smartrental.metrics``: las etapas que
+mide en el hilo del pool (``get_price``, ``calculate_irr``...) aparecen en
+el desglose por petición aunque la ejecución del script que lo envió ya haya
+terminado.
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from smartrental import metrics
+
+MAX_TRABAJOS = int(os.environ.get("SMARTRENTAL_MAX_TRABAJOS", min(4, os.cpu_count() or 1)))
+
+EN_COLA_POR_HILO = 4
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras se ejecutaba."""
+
+
+class JobPoolFull(RuntimeError):
+    """El servidor ya tiene el máximo de trabajos en curso y en cola."""
+
+
+class Job:
+    """Referencia a un trabajo enviado al pool."""
+
+    def __init__(self, clave):
+        self.id = uuid.uuid4().hex
+        self.clave = clave
+        self.inicio = time.time()
+        self.fraccion = 0.0
+        self.texto = ""
+        self.parcial = {}
+        self._cancelado = threading.Event()
+        self._future = None
+
+    # --- Desde la sesión ---
+
+    def done(self):
+        return self._future.done()
+
+    def wait(self, segundos):
+        """Espera hasta ``segundos`` a que termine; devuelve si ha terminado."""
+        wait([self._future], timeout=segundos)
+        return self._future.done()
+
+    def result(self):
+        """Resultado del trabajo terminado (relanza su excepción si falló)."""
+        return self._future.result(timeout=0)
+
+    def cancel(self):
+        """Cancela el trabajo: si no ha empezado no llega a ejecutarse."""
+        self._cancelado.set()
+        self._future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelado.is_set()
+
+    # --- Desde la función del trabajo ---
+
+    def report(self, fraccion, texto="", **parcial):
+        """Actualiza el progreso y publica resultados parciales."""
+        self.fraccion = fraccion
+        self.texto = texto
+        self.parcial.update(parcial)
+
+    def check_cancelled(self):
+        """Lanza ``JobCancelled`` si se ha pedido cancelar el trabajo."""
+        if self._cancelado.is_set():
+            raise JobCancelled(self.clave)
+
+
+class JobPool:
+    """Pool de hilos acotado y compartido por todas las sesiones del proceso."""
+
+    def __init__(self, max_trabajos=MAX_TRABAJOS, en_cola_por_hilo=EN_COLA_POR_HILO):
+        self.max_trabajos = max_trabajos
+        self.max_pendientes = max_trabajos * (1 + en_cola_por_hilo)
+        self._executor = ThreadPoolExecutor(max_workers=max_trabajos, thread_name_prefix="smartrental-job")
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self.enviados = 0
+        self.rechazados = 0
+
+    def submit(self, clave, funcion, *args, **kwargs):
+        """
+        Envía ``funcion(job, *args, **kwargs)`` al pool y devuelve el ``Job``.
+        Lanza ``JobPoolFull`` si ya hay demasiados trabajos pendientes.
+        """
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self.rechazados += 1
+                raise JobPoolFull(f"{self._pendientes} trabajos pendientes")
+            self._pendientes += 1
+            self.enviados += 1
+
+        job = Job(clave)
+        origen = metrics.current_request()
+        contexto = contextvars.copy_context()
+
+        def ejecutar():
+            # Un trabajo cancelado antes de empezar no llega aquí
+            job.check_cancelled()
+            with metrics.request("trabajo", funcion=getattr(funcion, "__name__", str(funcion)),
+                                 origen=origen["tipo"] if origen else None):
+                return funcion(job, *args, **kwargs)
+
+        try:
+            job._future = self._executor.submit(contexto.run, ejecutar)
+        except RuntimeError:
+            self._liberar(None)
+            raise
+        job._future.add_done_callback(self._liberar)
+        return job
+
+    def _liberar(self, _future):
+        with self._lock:
+            self._pendientes -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"max_trabajos": self.max_trabajos, "pendientes": self._pendientes,
+                    "enviados": self.enviados, "rechazados": self.rechazados}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
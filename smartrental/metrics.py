@@ -0,0 +1,212 @@
+"""
+Instrumentación opcional de las rutas críticas.
+
+Se activa con la variable de entorno ``SMARTRENTAL_METRICS=1`` (o con
+``enable()``). Desactivada, ``stage`` devuelve un contexto vacío y el coste es
+despreciable. Activada:
+
+- Cada etapa (``with stage("get_price"):``) alimenta un histograma de
+  duraciones y se añade al desglose de la petición en curso.
+- Cada petición (una ejecución del script o una llamada al servicio) se
+  guarda al terminar en un buffer circular con las últimas
+  ``PETICIONES_GUARDADAS`` y se registra como una línea JSON en el logger
+  ``smartrental.metrics``.
+- ``prometheus_text()`` exporta contadores e histogramas en el formato de
+  texto de Prometheus.
+
+Las métricas son por proceso: con varios procesos de trabajo cada uno
+expone las suyas.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("smartrental.metrics")
+
+PETICIONES_GUARDADAS = 50
+
+# Límites superiores de los buckets del histograma, en segundos
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_activado = False
+_lock = threading.Lock()
+_histogramas = {}
+_contadores = {}
+_ultimas_peticiones = deque(maxlen=PETICIONES_GUARDADAS)
+_peticion_actual = contextvars.ContextVar("peticion_actual", default=None)
+
+
+def enable(activado=True):
+    """Activa o desactiva la instrumentación en este proceso."""
+    global _activado
+    _activado = activado
+    if activado and not logger.handlers:
+        # Una línea JSON por petición en stderr, sin depender del logging de quien importa
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def is_enabled():
+    return _activado
+
+
+def _observar(nombre, segundos):
+    with _lock:
+        histograma = _histogramas.get(nombre)
+        if histograma is None:
+            histograma = _histogramas[nombre] = {"buckets": [0] * len(BUCKETS_SEGUNDOS), "suma": 0.0, "total": 0}
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if segundos <= limite:
+                histograma["buckets"][i] += 1
+        histograma["suma"] += segundos
+        histograma["total"] += 1
+
+
+def increment(nombre, valor=1):
+    """Suma ``valor`` a un contador."""
+    if not _activado:
+        return
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + valor
+
+
+def event(evento, nivel=logging.INFO, **campos):
+    """
+    Registra un suceso del proceso (p. ej. un fallo al cargar el modelo) como
+    una línea JSON en el logger de métricas, aunque la instrumentación esté
+    desactivada. Activada, lo cuenta además en ``eventos_<evento>_total``.
+    """
+    increment(f"eventos_{evento}_total")
+    logger.log(nivel, json.dumps({"evento": evento, "hora": time.time(), **campos}, default=str,
+                                 ensure_ascii=False))
+
+
+@contextmanager
+def _medir_etapa(nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        _observar(nombre, segundos)
+        peticion = _peticion_actual.get()
+        if peticion is not None:
+            peticion["etapas"].append((nombre, segundos * 1000))
+
+
+def stage(nombre):
+    """Contexto que mide una etapa: ``with stage("calculate_irr"): ...``."""
+    if not _activado:
+        return nullcontext()
+    return _medir_etapa(nombre)
+
+
+def start_request(tipo, raiz=False, **campos):
+    """
+    Abre el desglose de una petición en el contexto actual. Devuelve la
+    petición (o ``None`` si la instrumentación está desactivada).
+
+    Una petición abierta dentro de otra (un fragmento dentro del script) la
+    sustituye hasta que se cierra. Con ``raiz=True`` (el inicio de una
+    ejecución del script) las peticiones que siguen abiertas en el contexto
+    se cierran antes como interrumpidas: una ejecución que termina con
+    ``st.rerun()`` o ``st.stop()`` no llega a cerrar la suya.
+    """
+    if raiz:
+        interrumpida = _peticion_actual.get()
+        while interrumpida is not None:
+            padre = interrumpida.get("_padre")
+            if "_t0" in interrumpida:
+                interrumpida["campos"]["interrumpida"] = True
+                finish_request(interrumpida)
+            interrumpida = padre
+        _peticion_actual.set(None)
+    if not _activado:
+        return None
+    peticion = {"tipo": tipo, "inicio": time.time(), "_t0": time.perf_counter(),
+                "etapas": [], "campos": dict(campos), "_padre": _peticion_actual.get()}
+    _peticion_actual.set(peticion)
+    return peticion
+
+
+def current_request():
+    """Petición abierta en el contexto actual, o ``None``."""
+    return _peticion_actual.get()
+
+
+def annotate(**campos):
+    """Añade campos estructurados a la petición en curso."""
+    peticion = _peticion_actual.get()
+    if peticion is not None:
+        peticion["campos"].update(campos)
+
+
+def finish_request(peticion):
+    """Cierra la petición, la guarda en el buffer circular y la registra."""
+    if peticion is None or "_t0" not in peticion:
+        return
+    padre = peticion.pop("_padre")
+    if _peticion_actual.get() is peticion:
+        _peticion_actual.set(padre)
+    segundos = time.perf_counter() - peticion.pop("_t0")
+    peticion["total_ms"] = segundos * 1000
+    _observar(f"peticion_{peticion['tipo']}", segundos)
+    increment(f"peticiones_{peticion['tipo']}_total")
+    with _lock:
+        _ultimas_peticiones.append(peticion)
+    logger.info(json.dumps({"evento": "peticion", **peticion}, default=str, ensure_ascii=False))
+
+
+@contextmanager
+def request(tipo, **campos):
+    """Contexto equivalente a ``start_request`` + ``finish_request``."""
+    peticion = start_request(tipo, **campos)
+    try:
+        yield peticion
+    finally:
+        finish_request(peticion)
+
+
+def recent_requests(n=PETICIONES_GUARDADAS):
+    """Últimas ``n`` peticiones terminadas, de la más reciente a la más antigua."""
+    with _lock:
+        return list(reversed(_ultimas_peticiones))[:n]
+
+
+def reset():
+    """Vacía histogramas, contadores y el buffer de peticiones."""
+    with _lock:
+        _histogramas.clear()
+        _contadores.clear()
+        _ultimas_peticiones.clear()
+
+
+def prometheus_text(prefijo="smartrental"):
+    """Contadores e histogramas en el formato de texto de Prometheus."""
+    lineas = []
+    with _lock:
+        for nombre, valor in sorted(_contadores.items()):
+            lineas.append(f"# TYPE {prefijo}_{nombre} counter")
+            lineas.append(f"{prefijo}_{nombre} {valor}")
+
+        if _histogramas:
+            metrica = f"{prefijo}_etapa_segundos"
+            lineas.append(f"# TYPE {metrica} histogram")
+            for nombre, histograma in sorted(_histogramas.items()):
+                for limite, cuenta in zip(BUCKETS_SEGUNDOS, histograma["buckets"]):
+                    lineas.append(f'{metrica}_bucket{{etapa="{nombre}",le="{limite}"}} {cuenta}')
+                lineas.append(f'{metrica}_bucket{{etapa="{nombre}",le="+Inf"}} {histograma["total"]}')
+                lineas.append(f'{metrica}_sum{{etapa="{nombre}"}} {histograma["suma"]:.6f}')
+                lineas.append(f'{metrica}_count{{etapa="{nombre}"}} {histograma["total"]}')
+    return "\n".join(lineas) + "\n"
+
+
+enable(os.environ.get("SMARTRENTAL_METRICS", "0") == "1")
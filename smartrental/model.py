@@ -0,0 +1,145 @@
+"""
+Carga del modelo de precios desde disco, sin dependencias de Streamlit.
+
+El modelo puede guardarse en formato joblib sin comprimir
+(``price_model.joblib``), que permite cargar los arrays de NumPy del
+estimador con ``mmap_mode="r"``: la carga es casi instantánea y todos los
+procesos que abren el mismo fichero comparten esas páginas de memoria a través
+de la caché del sistema operativo. Si no existe, se usa ``price_model.pkl``.
+
+Para convertir el modelo:
+
+    python -m smartrental.model convert
+"""
+import argparse
+import os
+import pickle
+import time
+
+import joblib
+
+from smartrental.pricing import RAIZ_PROYECTO
+
+MODEL_FILENAME = "price_model.pkl"
+
+# La ruta puede sobrescribirse con la variable de entorno SMARTRENTAL_MODEL
+MODEL_PATH = os.environ.get("SMARTRENTAL_MODEL", os.path.join(RAIZ_PROYECTO, MODEL_FILENAME))
+
+EXTENSION_MMAP = ".joblib"
+
+# Datos de la última carga en este proceso (para el panel de depuración)
+ultima_carga = {}
+
+
+def mmap_path(model_path):
+    """Ruta del artefacto joblib equivalente a ``model_path``."""
+    return os.path.splitext(model_path)[0] + EXTENSION_MMAP
+
+
+def resolve_model_path(model_path=MODEL_PATH):
+    """
+    Devuelve la ruta que se cargará: el artefacto joblib si existe y no es más
+    antiguo que el pickle original, o el pickle en caso contrario.
+    """
+    if model_path.endswith(EXTENSION_MMAP):
+        return model_path
+    candidato = mmap_path(model_path)
+    if os.path.exists(candidato):
+        if not os.path.exists(model_path) or os.path.getmtime(candidato) >= os.path.getmtime(model_path):
+            return candidato
+    return model_path
+
+
+def model_version(model_path=MODEL_PATH):
+    """
+    Identificador del artefacto que se cargará: nombre, tamaño y fecha de
+    modificación. Cambia al sustituir el fichero por un modelo reentrenado.
+    """
+    ruta = resolve_model_path(model_path)
+    info = os.stat(ruta)
+    return f"{os.path.basename(ruta)}:{info.st_size}:{info.st_mtime_ns}"
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (pico si no hay /proc)."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_model_file(model_path=MODEL_PATH, mmap_mode="r"):
+    """
+    Deserializa el modelo de ML. Lanza ``FileNotFoundError`` si no existe.
+
+    Los artefactos ``.joblib`` se abren con ``mmap_mode`` (solo lectura por
+    defecto); los ``.pkl`` se cargan enteros en memoria.
+    """
+    ruta = resolve_model_path(model_path)
+    version = model_version(ruta)
+    rss_antes = rss_mb()
+    inicio = time.perf_counter()
+
+    if ruta.endswith(EXTENSION_MMAP):
+        model = joblib.load(ruta, mmap_mode=mmap_mode)
+    else:
+        with open(ruta, 'rb') as f:
+            model = pickle.load(f)
+
+    ultima_carga.clear()
+    ultima_carga.update({
+        "ruta": ruta,
+        "version": version,
+        "segundos": time.perf_counter() - inicio,
+        "rss_mb": rss_mb(),
+        "incremento_rss_mb": rss_mb() - rss_antes,
+        "pid": os.getpid(),
+    })
+    return model
+
+
+def convert_model(model_path=MODEL_PATH, destino=None):
+    """
+    Guarda el modelo en formato joblib sin comprimir para poder cargarlo
+    con memoria mapeada. Devuelve la ruta del nuevo artefacto.
+    """
+    destino = destino or mmap_path(model_path)
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    # Sin compresión: los arrays se escriben tal cual y pueden mapearse
+    joblib.dump(model, destino, compress=0)
+    return destino
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Utilidades del artefacto del modelo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    convertir = sub.add_parser("convert", help="Convierte el .pkl a .joblib con memoria mapeable")
+    convertir.add_argument("--model", default=MODEL_PATH)
+
+    informe = sub.add_parser("report", help="Mide el tiempo de carga y la memoria del proceso")
+    informe.add_argument("--model", default=MODEL_PATH)
+
+    args = parser.parse_args()
+    if args.comando == "convert":
+        print(f"✅ Modelo convertido: {convert_model(args.model)}")
+    else:
+        # La primera carga incluye importar scikit-learn; la segunda mide solo
+        # la deserialización, que es lo que paga cada proceso con el código ya importado
+        load_model_file(args.model)
+        primera = dict(ultima_carga)
+        load_model_file(args.model)
+        print(f"Ruta: {ultima_carga['ruta']}")
+        print(f"Primera carga (con imports): {primera['segundos'] * 1000:.1f} ms, "
+              f"+{primera['incremento_rss_mb']:.1f} MB RSS")
+        print(f"Carga en caliente: {ultima_carga['segundos'] * 1000:.1f} ms, "
+              f"+{ultima_carga['incremento_rss_mb']:.1f} MB RSS")
+        print(f"RSS total del proceso: {ultima_carga['rss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
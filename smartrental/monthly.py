@@ -0,0 +1,235 @@
+"""
+Flujos de caja mensuales con financiación, impuestos y estacionalidad.
+
+Alternativa detallada a ``build_cash_flows`` (un vector anual con el precio
+de compra como valor terminal). Cada fila es una matriz de
+``12 * horizonte + 1`` flujos para el inversor, con el mes 0 como desembolso:
+
+- Ingresos por noche ocupada con una curva de ocupación mensual
+  (``estacionalidad``, 12 factores con media 1) y actualización anual.
+- Costes fijos (``costos_operacion_anuales`` / 12) y variables
+  (``costos_operacion_porcentaje`` de los ingresos).
+- Hipoteca de cuota constante sobre ``porcentaje_financiado`` del inmueble.
+- Impuesto sobre el rendimiento anual (ingresos menos costes, intereses y
+  amortización fiscal), cargado en el último mes de cada año.
+- Venta al final del horizonte con revalorización, costes de salida,
+  cancelación de la hipoteca e impuesto sobre la plusvalía.
+
+Todos los parámetros admiten escalares o arrays de longitud N, de modo que
+una cartera o una rejilla se evalúa en una sola pasada con NumPy.
+
+Con impuestos, hipoteca y revalorización el VAN ya no es lineal en el precio,
+la ocupación ni el precio de compra, así que los valores de equilibrio de
+este modelo (``monthly_break_even_targets``) se buscan por bisección, con las
+tres variables de todas las filas evaluadas en cada paso en una sola llamada.
+"""
+import numpy as np
+
+from smartrental.cashflows import HORIZONTE_ANALISIS_ANOS, TASA_DESCUENTO_OBJETIVO
+from smartrental.irr import irr_batch
+
+MESES_POR_ANO = 12
+
+# 365 noches al año, como ``annual_net_cash_flow``: sin estacionalidad, los
+# ingresos de un año coinciden con los del modelo anual
+DIAS_POR_MES = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Porcentaje anual del precio de compra deducible como amortización del inmueble
+AMORTIZACION_FISCAL = 0.03
+
+# Pasos de bisección de los valores de equilibrio y límite superior de la
+# búsqueda del precio por noche y del precio de compra (veces el valor actual)
+ITERACIONES_EQUILIBRIO = 50
+FACTOR_BUSQUEDA = 100.0
+
+
+def _columna(valor, n):
+    """Parámetro como columna (N, 1) para operar contra la matriz de meses."""
+    return np.broadcast_to(np.asarray(valor, dtype=np.float64), (n,))[:, np.newaxis]
+
+
+def mortgage_payment(principal, tipo_anual, plazo_anos):
+    """Cuota mensual de un préstamo de cuota constante (sistema francés)."""
+    principal = np.asarray(principal, dtype=np.float64)
+    r = np.asarray(tipo_anual, dtype=np.float64) / MESES_POR_ANO
+    n = np.asarray(plazo_anos, dtype=np.float64) * MESES_POR_ANO
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cuota = principal * r / (1 - (1 + r) ** -n)
+    return np.where(r == 0, principal / n, cuota)
+
+
+def mortgage_balance(principal, tipo_anual, plazo_anos, meses):
+    """Capital pendiente tras ``meses`` cuotas (cero una vez terminado el plazo)."""
+    principal = np.asarray(principal, dtype=np.float64)
+    r = np.asarray(tipo_anual, dtype=np.float64) / MESES_POR_ANO
+    meses = np.minimum(meses, np.asarray(plazo_anos, dtype=np.float64) * MESES_POR_ANO)
+    cuota = mortgage_payment(principal, tipo_anual, plazo_anos)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = (1 + r) ** meses
+        saldo = principal * factor - cuota * (factor - 1) / r
+    return np.maximum(np.where(r == 0, principal - cuota * meses, saldo), 0.0)
+
+
+def monthly_cash_flows(precio_noche, ocupacion, costos_operacion_anuales, inversion_inmueble,
+                       inversion_amueblar, horizonte=HORIZONTE_ANALISIS_ANOS, *,
+                       costos_operacion_porcentaje=0.0, estacionalidad=None,
+                       actualizacion_anual=0.0, revalorizacion_anual=0.0,
+                       porcentaje_financiado=0.0, tipo_hipoteca=0.0, plazo_hipoteca_anos=25,
+                       tipo_impositivo=0.0, tipo_plusvalias=0.0, amortizacion_fiscal=AMORTIZACION_FISCAL,
+                       costes_salida_porcentaje=0.0, desglose=False):
+    """
+    Matriz N x (12 * horizonte + 1) con los flujos mensuales del inversor.
+
+    estacionalidad: 12 factores de ocupación (enero a diciembre, media 1), o
+    una matriz N x 12; ``None`` reparte la ocupación por igual.
+    actualizacion_anual: Subida anual de precios por noche y costes fijos.
+    desglose: Si es ``True`` devuelve además un diccionario con ingresos,
+    costes, cuota de la hipoteca, impuestos y venta neta por mes.
+    """
+    n = max(np.size(p) for p in (
+        precio_noche, ocupacion, costos_operacion_anuales, inversion_inmueble, inversion_amueblar,
+        costos_operacion_porcentaje, actualizacion_anual, revalorizacion_anual, porcentaje_financiado,
+        tipo_hipoteca, plazo_hipoteca_anos, tipo_impositivo, tipo_plusvalias, costes_salida_porcentaje,
+        np.zeros(0 if estacionalidad is None else np.size(estacionalidad) // MESES_POR_ANO),
+    ))
+    meses = MESES_POR_ANO * horizonte
+    ano = np.repeat(np.arange(horizonte), MESES_POR_ANO)[np.newaxis, :]
+    mes = np.arange(meses + 1)[np.newaxis, :]
+
+    compra = _columna(inversion_inmueble, n)
+    factor_precios = (1 + _columna(actualizacion_anual, n)) ** ano
+
+    if estacionalidad is None:
+        curva = np.ones((1, MESES_POR_ANO))
+    else:
+        curva = np.asarray(estacionalidad, dtype=np.float64).reshape(-1, MESES_POR_ANO)
+    noches = np.tile(DIAS_POR_MES * curva, horizonte) * np.clip(_columna(ocupacion, n), 0, None)
+    ingresos = _columna(precio_noche, n) * factor_precios * np.minimum(noches, np.tile(DIAS_POR_MES, horizonte))
+    costes = (ingresos * _columna(costos_operacion_porcentaje, n)
+              + _columna(costos_operacion_anuales, n) / MESES_POR_ANO * factor_precios)
+
+    prestamo = compra * _columna(porcentaje_financiado, n)
+    tipo = _columna(tipo_hipoteca, n)
+    plazo = _columna(plazo_hipoteca_anos, n)
+    saldo = mortgage_balance(prestamo, tipo, plazo, mes)
+    intereses = saldo[:, :-1] * tipo / MESES_POR_ANO
+    cuota = intereses + saldo[:, :-1] - saldo[:, 1:]
+
+    # Impuesto sobre el rendimiento de cada año, pagado en diciembre
+    rendimiento = (ingresos - costes - intereses).reshape(n, horizonte, MESES_POR_ANO).sum(axis=2)
+    base = rendimiento - compra * amortizacion_fiscal
+    impuestos = np.zeros((n, meses))
+    impuestos[:, MESES_POR_ANO - 1::MESES_POR_ANO] = _columna(tipo_impositivo, n) * np.maximum(base, 0)
+
+    valor_venta = compra[:, 0] * (1 + _columna(revalorizacion_anual, n)[:, 0]) ** horizonte
+    costes_salida = valor_venta * _columna(costes_salida_porcentaje, n)[:, 0]
+    plusvalia = np.maximum(valor_venta - costes_salida - compra[:, 0], 0)
+    venta_neta = (valor_venta - costes_salida - saldo[:, -1]
+                  - _columna(tipo_plusvalias, n)[:, 0] * plusvalia)
+
+    flujos = np.empty((n, meses + 1))
+    flujos[:, 0] = -(compra[:, 0] - prestamo[:, 0] + _columna(inversion_amueblar, n)[:, 0])
+    flujos[:, 1:] = ingresos - costes - cuota - impuestos
+    flujos[:, -1] += venta_neta
+    if not desglose:
+        return flujos
+    return flujos, {
+        "ingresos": ingresos, "costes": costes, "hipoteca": cuota, "intereses": intereses,
+        "impuestos": impuestos, "venta_neta": venta_neta,
+    }
+
+
+def monthly_returns(flujos, tasa_descuento=TASA_DESCUENTO_OBJETIVO):
+    """
+    TIR y VAN anuales equivalentes y plazo de recuperación de flujos mensuales.
+
+    Devuelve un diccionario de arrays de longitud N: ``tir`` (``nan`` si no
+    existe), ``van`` a ``tasa_descuento`` anual y ``recuperacion_meses``
+    (primer mes con flujo acumulado no negativo, ``nan`` si nunca se recupera).
+    """
+    flujos = np.atleast_2d(np.asarray(flujos, dtype=np.float64))
+    tasa_mensual = (1 + tasa_descuento) ** (1 / MESES_POR_ANO) - 1
+    tir_mensual, converged = irr_batch(flujos, guess=tasa_mensual)
+
+    acumulado = np.cumsum(flujos, axis=1)
+    recuperado = acumulado >= 0
+    return {
+        "tir": np.where(converged, (1 + tir_mensual) ** MESES_POR_ANO - 1, np.nan),
+        "van": monthly_npv(flujos, tasa_descuento),
+        "recuperacion_meses": np.where(recuperado.any(axis=1), np.argmax(recuperado, axis=1), np.nan),
+    }
+
+
+def monthly_npv(flujos, tasa_descuento=TASA_DESCUENTO_OBJETIVO):
+    """VAN de flujos mensuales a la tasa anual ``tasa_descuento`` (su equivalente mensual)."""
+    flujos = np.atleast_2d(np.asarray(flujos, dtype=np.float64))
+    tasa_mensual = (1 + tasa_descuento) ** (1 / MESES_POR_ANO) - 1
+    return flujos @ (1 + tasa_mensual) ** -np.arange(flujos.shape[1])
+
+
+def monthly_break_even_targets(tasa_descuento, precio_noche, ocupacion, costos_operacion_anuales,
+                               inversion_inmueble, inversion_amueblar, horizonte=HORIZONTE_ANALISIS_ANOS,
+                               iteraciones=ITERACIONES_EQUILIBRIO, **parametros):
+    """
+    Equivalente de ``smartrental.sensitivity.break_even_targets`` para el
+    modelo mensual: precio por noche mínimo, ocupación mínima y precio de
+    compra máximo con los que la TIR anual equivalente iguala
+    ``tasa_descuento``, cambiando una sola variable.
+
+    ``parametros`` son los de ``monthly_cash_flows`` (escalares, o arrays de
+    longitud N). Devuelve un diccionario de arrays de longitud N con
+    ``precio_equilibrio``, ``ocupacion_minima`` y ``compra_maxima``; ``nan``
+    donde el objetivo no se alcanza dentro del rango de búsqueda.
+    """
+    forma = np.broadcast(np.asarray(precio_noche), np.asarray(ocupacion), np.asarray(inversion_inmueble)).shape
+    precio, ocupacion, compra = (np.ravel(np.broadcast_to(np.asarray(v, dtype=np.float64), forma))
+                                 for v in (precio_noche, ocupacion, inversion_inmueble))
+    n = precio.size
+
+    def triplicar(valor, nombre=None):
+        # Las tres variables se buscan a la vez en 3N filas
+        if np.ndim(valor) == 0 or (nombre == "estacionalidad" and np.ndim(valor) == 1):
+            return valor
+        return np.concatenate([np.broadcast_to(valor, (n,) + np.shape(valor)[1:])] * 3)
+
+    fijos = {nombre: triplicar(valor, nombre) for nombre, valor in parametros.items() if nombre != "desglose"}
+    costos, amueblar = triplicar(costos_operacion_anuales), triplicar(inversion_amueblar)
+
+    def van(x):
+        flujos = monthly_cash_flows(
+            np.concatenate([x[:n], precio, precio]), np.concatenate([ocupacion, x[n:2 * n], ocupacion]),
+            costos, np.concatenate([compra, compra, x[2 * n:]]), amueblar, horizonte, **fijos
+        )
+        return monthly_npv(flujos, tasa_descuento)
+
+    bajo = np.zeros(3 * n)
+    alto = np.concatenate([np.maximum(precio, 1.0) * FACTOR_BUSQUEDA, np.ones(n),
+                           np.maximum(compra, 1.0) * FACTOR_BUSQUEDA])
+    positivo_bajo, positivo_alto = van(bajo) >= 0, van(alto) >= 0
+    for _ in range(iteraciones):
+        medio = (bajo + alto) / 2
+        mismo_signo = (van(medio) >= 0) == positivo_bajo
+        bajo = np.where(mismo_signo, medio, bajo)
+        alto = np.where(mismo_signo, alto, medio)
+    raiz = np.where(positivo_bajo != positivo_alto, (bajo + alto) / 2, np.nan)
+    # Si el objetivo se alcanza con precio u ocupación cero, el mínimo es cero
+    raiz[:2 * n] = np.where(positivo_bajo[:2 * n], 0.0, raiz[:2 * n])
+    return {
+        "precio_equilibrio": raiz[:n].reshape(forma),
+        "ocupacion_minima": raiz[n:2 * n].reshape(forma),
+        "compra_maxima": raiz[2 * n:].reshape(forma),
+    }
+
+
+def annual_summary(flujos, componentes):
+    """Suma por año de los flujos y de cada componente del desglose (primera fila)."""
+    meses = flujos.shape[1] - 1
+    anos = meses // MESES_POR_ANO
+    resumen = {
+        nombre: valores[0].reshape(anos, MESES_POR_ANO).sum(axis=1)
+        for nombre, valores in componentes.items() if np.ndim(valores) == 2
+    }
+    resumen["flujo_neto"] = flujos[0, 1:].reshape(anos, MESES_POR_ANO).sum(axis=1)
+    resumen["flujo_neto"][-1] -= componentes["venta_neta"][0]
+    resumen["venta_neta"] = np.where(np.arange(anos) == anos - 1, componentes["venta_neta"][0], 0.0)
+    return resumen
@@ -0,0 +1,357 @@
+"""
+Evaluación de carteras desde CSV o Parquet, por bloques.
+
+El fichero se lee en bloques (``pandas.read_csv(chunksize=...)`` o
+``ParquetFile.iter_batches``), de modo que nunca se carga entero en memoria.
+Cada bloque se convierte en las variables del modelo con la misma lógica que
+el diccionario ``data`` de la aplicación, se valora con una llamada al modelo y
+se resuelve la TIR de todas sus filas a la vez. Solo se conservan las columnas
+del resultado para ordenar la cartera al final.
+
+Columnas reconocidas (las que falten toman los valores por defecto; sin
+``latitude``/``longitude`` el inmueble se sitúa en el centro de su ciudad):
+``ciudad``, ``latitude``, ``longitude``, ``room_type``, ``accommodates``,
+``bathrooms``, ``bedrooms``, ``beds``, ``minimum_nights``, ``maximum_nights``,
+``inversion_inmueble``, ``inversion_amueblar``, ``costos_operacion_anuales``,
+``ocupacion_anual_porcentaje`` (fracción entre 0 y 1; si falta se usa la
+ocupación de referencia de la ciudad de la fila y, sin ella, la del
+formulario) y las amenidades, bien como lista en ``amenities`` (separada por comas, punto y coma o barras) o
+bien como conteos por categoría con los nombres de columna del modelo
+(``cocina_y_comida_count``...). Una columna ``id`` se conserva en el resultado.
+
+Además de la TIR, el resultado incluye el precio por noche mínimo, la
+ocupación mínima y el precio de compra máximo con los que cada inmueble
+alcanzaría la tasa objetivo (``smartrental.sensitivity.break_even_targets``).
+
+Uso sin la aplicación:
+
+    python -m smartrental.portfolio cartera.parquet --salida ranking.csv
+"""
+import argparse
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from smartrental.amenity_bits import BYTES_AMENIDADES, parse_amenity_lists, uses_amenity_columns
+from smartrental.cashflows import HORIZONTE_ANALISIS_ANOS, TASA_DESCUENTO_OBJETIVO, annual_net_cash_flow
+from smartrental.cities import CENTROS_CIUDADES, resolve_city
+from smartrental.features import CATEGORIAS_AMENIDADES, VALORES_POR_DEFECTO, build_feature_frame
+from smartrental.irr import solve_level_annuity_irr
+from smartrental.pricing import load_feature_names, predict_prices
+from smartrental.priors import load_priors
+from smartrental.sensitivity import break_even_targets
+
+FILAS_POR_BLOQUE = 100_000
+
+EXTENSIONES_PARQUET = (".parquet", ".pq")
+
+COLUMNAS_NUMERICAS = (
+    "latitude", "longitude", "accommodates", "bathrooms", "bedrooms", "beds",
+    "minimum_nights", "maximum_nights", "inversion_inmueble", "inversion_amueblar",
+    "costos_operacion_anuales", "ocupacion_anual_porcentaje",
+)
+
+COLUMNAS_ENTRADA = ("id", "ciudad", "room_type", "amenities") + COLUMNAS_NUMERICAS + tuple(CATEGORIAS_AMENIDADES.values())
+
+COLUMNAS_RESULTADO = (
+    "fila", "ciudad", "latitude", "longitude", "room_type", "inversion_inmueble",
+    "precio_noche", "flujo_anual", "tir", "supera_objetivo",
+    "precio_equilibrio", "ocupacion_minima", "compra_maxima", "error",
+)
+
+COLUMNAS_CATEGORICAS = ("ciudad", "room_type", "error")
+
+# Memoria aproximada del ranking por inmueble (sin la columna ``id``): las
+# columnas numéricas más los códigos de las categorías. Al ordenar se copia
+BYTES_POR_FILA_RANKING = 100
+
+
+def _es_parquet(fuente, formato):
+    if formato:
+        return formato.lower() in ("parquet", "pq")
+    nombre = fuente if isinstance(fuente, (str, os.PathLike)) else getattr(fuente, "name", "")
+    return str(nombre).lower().endswith(EXTENSIONES_PARQUET)
+
+
+def read_chunks(fuente, formato=None, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Itera sobre el fichero en bloques. Genera ``(bloque, fraccion_leida)``,
+    donde la fracción es ``None`` si no puede estimarse.
+
+    fuente: Ruta o fichero abierto en modo binario (p. ej. un ``UploadedFile``).
+    formato: "csv" o "parquet"; si se omite, se deduce de la extensión.
+    """
+    if _es_parquet(fuente, formato):
+        import pyarrow.parquet as pq
+
+        fichero = pq.ParquetFile(fuente)
+        columnas = [c for c in fichero.schema_arrow.names if c in COLUMNAS_ENTRADA]
+        total = fichero.metadata.num_rows
+        leidas = 0
+        for lote in fichero.iter_batches(batch_size=filas_por_bloque, columns=columnas):
+            leidas += lote.num_rows
+            yield lote.to_pandas(), leidas / total if total else None
+        return
+
+    tamano = None
+    if hasattr(fuente, "seek") and hasattr(fuente, "tell"):
+        fuente.seek(0, os.SEEK_END)
+        tamano = fuente.tell()
+        fuente.seek(0)
+    elif isinstance(fuente, (str, os.PathLike)):
+        tamano = os.path.getsize(fuente)
+
+    lector = pd.read_csv(
+        fuente, chunksize=filas_por_bloque,
+        usecols=lambda columna: columna in COLUMNAS_ENTRADA,
+        dtype={"id": str, "ciudad": str, "room_type": str, "amenities": str},
+    )
+    with lector:
+        for bloque in lector:
+            fraccion = None
+            if tamano and hasattr(fuente, "tell"):
+                fraccion = min(fuente.tell() / tamano, 1.0)
+            yield bloque, fraccion
+
+
+def _resolve_cities(ciudades):
+    """
+    ``city_label`` y centro (lat, lon) de cada fila, resolviendo cada nombre
+    una vez. Llevan ``nan`` si la ciudad no se reconoce o no tiene centro.
+    """
+    codigos, unicos = pd.factorize(ciudades.fillna(""))
+    if not len(unicos):
+        return np.full(len(ciudades), np.nan), np.full((len(ciudades), 2), np.nan)
+    coincidencias = [resolve_city(str(nombre)) for nombre in unicos]
+    etiquetas = np.array([c.city_label if c else np.nan for c in coincidencias], dtype=np.float64)
+    centros = np.array([CENTROS_CIUDADES[c.slug][:2] if c and c.slug in CENTROS_CIUDADES else (np.nan, np.nan)
+                        for c in coincidencias], dtype=np.float64)
+    return etiquetas[codigos], centros[codigos]
+
+
+def _amenity_bits(bloque):
+    """Matriz de bits de las amenidades de cada fila (ceros si no hay columna ``amenities``)."""
+    if "amenities" in bloque.columns:
+        return parse_amenity_lists(bloque["amenities"])
+    return np.zeros((len(bloque), BYTES_AMENIDADES), dtype=np.uint8)
+
+
+def _amenity_counts(bloque):
+    """Conteos por categoría indicados explícitamente en el bloque."""
+    # Prevalecen sobre los que se obtienen de la lista ``amenities``
+    return {
+        categoria: pd.to_numeric(bloque[columna], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+        for categoria, columna in CATEGORIAS_AMENIDADES.items() if columna in bloque.columns
+    }
+
+
+def evaluate_chunk(model, bloque, valores_por_defecto=None, tasa_descuento=TASA_DESCUENTO_OBJETIVO,
+                   horizonte=HORIZONTE_ANALISIS_ANOS, primera_fila=0, feature_names=None):
+    """
+    Valora un bloque de la cartera. Devuelve un DataFrame con las columnas de
+    ``COLUMNAS_RESULTADO`` (más ``id`` si existe). Las filas que no pueden
+    valorarse llevan el motivo en ``error`` y ``nan`` en precio y TIR.
+
+    valores_por_defecto: Valores para las columnas que faltan (los del
+    formulario en la aplicación); completan ``VALORES_POR_DEFECTO``.
+    feature_names: Variables del modelo (por defecto, ``price_model_features.pkl``).
+    """
+    if feature_names is None:
+        feature_names = load_feature_names()
+    valores = {**VALORES_POR_DEFECTO, **(valores_por_defecto or {})}
+    bloque = bloque.reset_index(drop=True)
+    n = len(bloque)
+
+    def columna(nombre):
+        if nombre in bloque.columns:
+            return bloque[nombre]
+        return pd.Series([valores[nombre]] * n)
+
+    ciudades = columna("ciudad").astype(object)
+    room_type = columna("room_type").fillna(valores["room_type"]).astype(object).to_numpy()
+    city_label, centros = _resolve_cities(ciudades)
+
+    ocupacion = (pd.to_numeric(bloque["ocupacion_anual_porcentaje"], errors="coerce").to_numpy(dtype=np.float64)
+                 if "ocupacion_anual_porcentaje" in bloque.columns else np.full(n, np.nan))
+    priors = load_priors()
+    # Sin ocupación en la fila se usa la de referencia de su ciudad; la del
+    # formulario (o la por defecto) solo si la ciudad no tiene datos
+    if priors is not None:
+        ocupacion = np.where(np.isnan(ocupacion), priors.occupancy_for(city_label), ocupacion)
+
+    numericas = {
+        nombre: pd.to_numeric(columna(nombre), errors="coerce").fillna(valores[nombre]).to_numpy(dtype=np.float64)
+        for nombre in COLUMNAS_NUMERICAS if nombre not in ("latitude", "longitude", "ocupacion_anual_porcentaje")
+    }
+    # Sin coordenadas, cada inmueble se sitúa en el centro de su ciudad y no en el valor por defecto
+    for i, nombre in enumerate(("latitude", "longitude")):
+        coordenadas = (pd.to_numeric(bloque[nombre], errors="coerce").to_numpy(dtype=np.float64)
+                       if nombre in bloque.columns else np.full(n, np.nan))
+        numericas[nombre] = np.where(np.isnan(coordenadas), centros[:, i], coordenadas)
+    sin_coordenadas = np.isnan(numericas["latitude"]) | np.isnan(numericas["longitude"])
+    validas = ~np.isnan(city_label) & ~sin_coordenadas
+    numericas["ocupacion_anual_porcentaje"] = np.where(np.isnan(ocupacion), valores["ocupacion_anual_porcentaje"],
+                                                       ocupacion)
+
+    error = np.where(np.isnan(city_label), "Ciudad no encontrada",
+                     np.where(sin_coordenadas, "Sin coordenadas ni centro de la ciudad", None)).astype(object)
+    precio = np.full(n, np.nan)
+    if validas.any():
+        features = build_feature_frame(
+            numericas["latitude"], numericas["longitude"], city_label, room_type,
+            numericas["accommodates"], numericas["bathrooms"], numericas["bedrooms"], numericas["beds"],
+            numericas["minimum_nights"], numericas["maximum_nights"], _amenity_counts(bloque),
+            bits_amenidades=_amenity_bits(bloque), columnas_amenidades=uses_amenity_columns(feature_names),
+        )
+        features["city_label"] = features["city_label"].fillna(0).astype(np.int64)
+        precio[validas] = predict_prices(model, features[validas], feature_names)
+
+    flujo_anual = annual_net_cash_flow(precio, numericas["ocupacion_anual_porcentaje"],
+                                       numericas["costos_operacion_anuales"])
+    with np.errstate(invalid="ignore"):
+        tir, converged = solve_level_annuity_irr(
+            numericas["inversion_inmueble"] + numericas["inversion_amueblar"],
+            flujo_anual, numericas["inversion_inmueble"], horizonte,
+        )
+    # Igual que en la aplicación: sin precio positivo no hay rentabilidad
+    tir = np.where(converged & (precio > 0), tir, np.nan)
+    error = np.where(validas & ~(precio > 0), "Precio no positivo", error)
+    error = np.where(validas & (precio > 0) & np.isnan(tir), "No se encontró la TIR", error)
+    # Valores con los que cada inmueble llegaría justo a la tasa objetivo
+    equilibrio = break_even_targets(
+        tasa_descuento, precio, numericas["ocupacion_anual_porcentaje"], numericas["inversion_inmueble"],
+        numericas["inversion_amueblar"], numericas["costos_operacion_anuales"], horizonte,
+    )
+
+    resultado = pd.DataFrame({
+        "fila": np.arange(primera_fila, primera_fila + n),
+        "ciudad": ciudades.to_numpy(),
+        "latitude": numericas["latitude"],
+        "longitude": numericas["longitude"],
+        "room_type": room_type,
+        "inversion_inmueble": numericas["inversion_inmueble"],
+        "precio_noche": precio,
+        "flujo_anual": flujo_anual,
+        "tir": tir,
+        "supera_objetivo": tir > tasa_descuento,
+        "precio_equilibrio": np.where(validas, equilibrio["precio_equilibrio"], np.nan),
+        "ocupacion_minima": equilibrio["ocupacion_minima"],
+        "compra_maxima": equilibrio["compra_maxima"],
+        "error": error,
+    })
+    # Los textos, muy repetidos, se guardan como categorías para que el ranking ocupe poco en memoria
+    for nombre in COLUMNAS_CATEGORICAS:
+        resultado[nombre] = resultado[nombre].astype("category")
+    if "id" in bloque.columns:
+        resultado.insert(0, "id", bloque["id"].to_numpy())
+    return resultado
+
+
+def evaluate_portfolio(model, fuente, formato=None, valores_por_defecto=None,
+                       tasa_descuento=TASA_DESCUENTO_OBJETIVO, horizonte=HORIZONTE_ANALISIS_ANOS,
+                       filas_por_bloque=FILAS_POR_BLOQUE, feature_names=None):
+    """
+    Evalúa la cartera bloque a bloque. Genera ``(resultado_bloque, filas_procesadas, fraccion_leida)``
+    para poder mostrar el progreso mientras se lee el fichero.
+    """
+    procesadas = 0
+    for bloque, fraccion in read_chunks(fuente, formato, filas_por_bloque):
+        resultado = evaluate_chunk(model, bloque, valores_por_defecto, tasa_descuento, horizonte, procesadas,
+                                   feature_names)
+        procesadas += len(bloque)
+        yield resultado, procesadas, fraccion
+
+
+def rank_results(resultados):
+    """
+    Une los resultados de los bloques y los ordena por TIR descendente (las
+    filas sin TIR al final). Añade la columna ``ranking`` empezando en 1.
+
+    La cartera entera se ordena en memoria: unos ``BYTES_POR_FILA_RANKING``
+    bytes por inmueble (el doble mientras se ordena) más la columna ``id``.
+    """
+    resultados = list(resultados)
+    if not resultados:
+        return pd.DataFrame(columns=("ranking",) + COLUMNAS_RESULTADO)
+    # Con las mismas categorías en todos los bloques, la unión sigue siendo categórica
+    for nombre in COLUMNAS_CATEGORICAS:
+        categorias = union_categoricals([resultado[nombre] for resultado in resultados],
+                                        ignore_order=True).categories
+        for resultado in resultados:
+            resultado[nombre] = resultado[nombre].cat.set_categories(categorias)
+    cartera = pd.concat(resultados, ignore_index=True)
+    cartera = cartera.sort_values("tir", ascending=False, na_position="last", kind="stable", ignore_index=True)
+    cartera.insert(0, "ranking", pd.array(np.where(cartera["tir"].notna(), np.arange(1, len(cartera) + 1), pd.NA),
+                                          dtype="Int64"))
+    return cartera
+
+
+def write_ranking(cartera, salida, formato=None, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Escribe el ranking en CSV o Parquet bloque a bloque, sin generar el
+    fichero entero en memoria antes de escribirlo.
+
+    salida: Ruta o fichero abierto en modo binario.
+    formato: "csv" o "parquet"; si se omite, se deduce de la extensión.
+    """
+    if _es_parquet(salida, formato):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        esquema = pa.Schema.from_pandas(cartera.iloc[:0], preserve_index=False)
+        with pq.ParquetWriter(salida, esquema) as escritor:
+            for inicio in range(0, max(len(cartera), 1), filas_por_bloque):
+                escritor.write_table(pa.Table.from_pandas(cartera.iloc[inicio:inicio + filas_por_bloque],
+                                                          schema=esquema, preserve_index=False))
+        return
+
+    cerrar = isinstance(salida, (str, os.PathLike))
+    binario = open(salida, "wb") if cerrar else salida
+    texto = io.TextIOWrapper(binario, encoding="utf-8", newline="")
+    try:
+        for inicio in range(0, max(len(cartera), 1), filas_por_bloque):
+            cartera.iloc[inicio:inicio + filas_por_bloque].to_csv(texto, index=False, header=inicio == 0)
+        texto.flush()
+    finally:
+        # Sin cerrar el fichero que nos han pasado
+        texto.detach()
+        if cerrar:
+            binario.close()
+
+
+def main():
+    from smartrental.compiled import optimize_model
+    from smartrental.model import MODEL_PATH, load_model_file
+
+    parser = argparse.ArgumentParser(
+        description="Evalúa y ordena una cartera de inmuebles",
+        epilog=f"El fichero se lee por bloques, pero el ranking se ordena en memoria: unos "
+               f"{BYTES_POR_FILA_RANKING} bytes por inmueble, el doble mientras se ordena "
+               f"(~{2 * BYTES_POR_FILA_RANKING} MB por millón de filas), más la columna id si existe.",
+    )
+    parser.add_argument("fichero", help="CSV o Parquet con un inmueble por fila")
+    parser.add_argument("--salida", required=True, help="CSV o Parquet donde guardar el ranking")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--bloque", type=int, default=FILAS_POR_BLOQUE, help="Filas por bloque")
+    args = parser.parse_args()
+
+    model = optimize_model(load_model_file(args.model))
+    partes = []
+    for resultado, procesadas, fraccion in evaluate_portfolio(model, args.fichero, filas_por_bloque=args.bloque):
+        partes.append(resultado)
+        progreso = f" ({fraccion:.0%})" if fraccion is not None else ""
+        print(f"\r{procesadas:,} filas evaluadas{progreso}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    cartera = rank_results(partes)
+    write_ranking(cartera, args.salida)
+    print(f"✅ {len(cartera):,} inmuebles ordenados en {args.salida} "
+          f"({int(cartera['error'].notna().sum()):,} con errores)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Motor de precios por lotes.
+
+``get_price`` valora un único inmueble construyendo un DataFrame de una fila.
+Este módulo permite valorar carteras completas (miles de inmuebles) con una
+sola llamada a ``predict`` por bloque, validando una única vez que las
+columnas coinciden con las del modelo (``price_model_features.pkl``).
+"""
+import os
+import pickle
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Un modelo reentrenado (p. ej. con las variables ``amenity_*``) indica su lista con SMARTRENTAL_FEATURES
+FEATURES_PATH = os.environ.get("SMARTRENTAL_FEATURES", os.path.join(RAIZ_PROYECTO, "price_model_features.pkl"))
+
+# Número de filas por llamada a ``predict``. Bloques grandes amortizan el coste
+# fijo de validación de scikit-learn sin disparar el consumo de memoria.
+TAMANO_BLOQUE = 65536
+
+
+@lru_cache(maxsize=None)
+def _load_feature_names(path):
+    with open(path, 'rb') as f:
+        return tuple(pickle.load(f))
+
+
+def load_feature_names(path=FEATURES_PATH):
+    """
+    Devuelve la lista ordenada de variables con las que se entrenó el modelo.
+    El fichero se lee una sola vez por proceso.
+    """
+    return list(_load_feature_names(path))
+
+
+def to_feature_frame(X, feature_names=None):
+    """
+    Convierte una entrada columnar en un DataFrame con las columnas en el orden
+    exacto que espera el modelo.
+
+    Acepta:
+    - ``pd.DataFrame`` o diccionario de columnas: se seleccionan y reordenan
+      las columnas por nombre (las columnas extra se ignoran).
+    - Tabla o RecordBatch de Arrow: se convierte a pandas y se trata igual.
+    - Array de NumPy 2-D: se asume que las columnas ya siguen el orden del modelo.
+
+    Lanza ``ValueError`` si faltan columnas o la forma no es la esperada.
+    """
+    if feature_names is None:
+        feature_names = load_feature_names()
+
+    # Arrow (Table / RecordBatch) sin importar pyarrow explícitamente
+    if hasattr(X, "to_pandas") and hasattr(X, "column_names"):
+        X = X.to_pandas()
+
+    if isinstance(X, dict):
+        X = pd.DataFrame(X)
+
+    if isinstance(X, pd.DataFrame):
+        faltantes = [col for col in feature_names if col not in X.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas requeridas por el modelo: {faltantes}")
+        if list(X.columns) == list(feature_names):
+            return X
+        return X.loc[:, list(feature_names)]
+
+    array = np.asarray(X)
+    if array.ndim != 2 or array.shape[1] != len(feature_names):
+        raise ValueError(
+            f"Se esperaba un array 2-D con {len(feature_names)} columnas, "
+            f"se recibió uno con forma {array.shape}"
+        )
+    return pd.DataFrame(array, columns=list(feature_names))
+
+
+def check_model_features(model, feature_names=None):
+    """
+    Comprueba que el modelo se entrenó con las mismas variables y en el mismo
+    orden que ``price_model_features.pkl``.
+    """
+    if feature_names is None:
+        feature_names = load_feature_names()
+
+    entrenadas = getattr(model, "feature_names_in_", None)
+    if entrenadas is not None and list(entrenadas) != list(feature_names):
+        raise ValueError(
+            "Las variables del modelo no coinciden con price_model_features.pkl: "
+            f"{list(entrenadas)} != {list(feature_names)}"
+        )
+
+
+def predict_prices(model, X, feature_names=None, chunk_size=TAMANO_BLOQUE):
+    """
+    Predice el precio por noche de muchos inmuebles a la vez.
+
+    model: Modelo devuelto por ``load_model``.
+    X: Entrada columnar con las mismas variables que el diccionario ``data``.
+    chunk_size: Filas por llamada a ``predict``.
+
+    Devuelve un array de NumPy con un precio por fila, en el mismo orden de entrada.
+    """
+    if feature_names is None:
+        feature_names = load_feature_names()
+
+    check_model_features(model, feature_names)
+    features_df = to_feature_frame(X, feature_names)
+
+    n_filas = len(features_df)
+    precios = np.empty(n_filas, dtype=np.float64)
+    for inicio in range(0, n_filas, chunk_size):
+        fin = min(inicio + chunk_size, n_filas)
+        precios[inicio:fin] = model.predict(features_df.iloc[inicio:fin])
+
+    return precios
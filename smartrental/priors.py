@@ -0,0 +1,192 @@
+"""
+Valores de referencia por ciudad: ocupación, estacionalidad y precios.
+
+Se guardan en un único ``.npz`` pequeño (``SMARTRENTAL_PRIORS``, por defecto
+``data/city_priors.npz`` en la raíz del proyecto) con arrays indexados
+directamente por ``city_label``, de modo que la carga es una lectura de unos
+pocos KB y cada consulta un acceso por índice:
+
+- ``ocupacion``: ocupación anual mediana de los anuncios (fracción).
+- ``estacionalidad``: 12 factores mensuales de ocupación con media 1.
+- ``precio_cuantiles``: precio por noche P10, P50 y P90.
+- ``n_anuncios``: anuncios usados para calcularlos.
+
+Se generan sin conexión a partir de los ficheros de comparables
+(``smartrental.comparables``) y, opcionalmente, de un calendario de
+disponibilidad (``calendar.csv`` de Inside Airbnb con una columna de ciudad):
+
+    python -m smartrental.priors build --calendario calendar.csv
+"""
+import argparse
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from smartrental.cities import city_mapping, normalize_city_name
+from smartrental.comparables import COMPARABLES_DIR
+from smartrental.pricing import RAIZ_PROYECTO
+
+logger = logging.getLogger("smartrental.priors")
+
+PRIORS_PATH = os.environ.get("SMARTRENTAL_PRIORS", os.path.join(RAIZ_PROYECTO, "data", "city_priors.npz"))
+
+CUANTILES_PRECIO = (10, 50, 90)
+
+FILAS_POR_BLOQUE = 1_000_000
+
+
+class CityPriors:
+    """Tabla de valores de referencia indexada por ``city_label``."""
+
+    def __init__(self, arrays):
+        self.ocupacion = arrays["ocupacion"]
+        self.estacionalidad = arrays["estacionalidad"]
+        self.precio_cuantiles = arrays["precio_cuantiles"]
+        self.n_anuncios = arrays["n_anuncios"]
+
+    def get(self, city_label):
+        """Valores de referencia de la ciudad, o ``None`` si no hay datos."""
+        if city_label is None or not 0 <= city_label < len(self.ocupacion):
+            return None
+        if not self.n_anuncios[city_label]:
+            return None
+        p10, p50, p90 = self.precio_cuantiles[city_label].tolist()
+        ocupacion = float(self.ocupacion[city_label])
+        return {
+            "ocupacion": None if np.isnan(ocupacion) else ocupacion,
+            "estacionalidad": tuple(self.estacionalidad[city_label].tolist()),
+            "precio_p10": p10,
+            "precio_p50": p50,
+            "precio_p90": p90,
+            "n_anuncios": int(self.n_anuncios[city_label]),
+        }
+
+    def occupancy_for(self, city_labels):
+        """Ocupación de referencia de cada ``city_label`` (``nan`` si no hay datos)."""
+        etiquetas = np.asarray(city_labels, dtype=np.float64)
+        validas = np.isfinite(etiquetas) & (etiquetas >= 0) & (etiquetas < len(self.ocupacion))
+        resultado = np.full(etiquetas.shape, np.nan)
+        resultado[validas] = self.ocupacion[etiquetas[validas].astype(np.int64)]
+        return resultado
+
+
+@lru_cache(maxsize=None)
+def _load_priors_file(path, mtime):
+    with np.load(path) as datos:
+        return CityPriors({nombre: datos[nombre] for nombre in datos.files})
+
+
+def load_priors(path=PRIORS_PATH):
+    """
+    Carga la tabla una vez por versión del fichero (se relee si cambia su
+    fecha de modificación). Devuelve ``None`` si no existe, sin recordarlo:
+    el fichero se usa en cuanto se genera.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return _load_priors_file(path, mtime)
+
+
+def empty_arrays():
+    """Arrays vacíos con una fila por ``city_label`` (la fila 0 no se usa)."""
+    n = max(city_mapping.values()) + 1
+    return {
+        "ocupacion": np.full(n, np.nan, dtype=np.float32),
+        "estacionalidad": np.ones((n, 12), dtype=np.float32),
+        "precio_cuantiles": np.full((n, len(CUANTILES_PRECIO)), np.nan, dtype=np.float32),
+        "n_anuncios": np.zeros(n, dtype=np.int32),
+    }
+
+
+def priors_from_comparables(arrays, directorio=COMPARABLES_DIR):
+    """Rellena ocupación y cuantiles de precio con los ficheros de comparables."""
+    if not os.path.isdir(directorio):
+        logger.warning("No hay comparables en %s; se omiten ocupación y precios", directorio)
+        return arrays
+    for fichero in sorted(os.listdir(directorio)):
+        if not fichero.endswith(".npz"):
+            continue
+        city_label = city_mapping.get(normalize_city_name(fichero[:-len(".npz")]))
+        if city_label is None:
+            continue
+        with np.load(os.path.join(directorio, fichero)) as datos:
+            precios = datos["price"][np.isfinite(datos["price"])]
+            ocupaciones = datos["occupancy"][np.isfinite(datos["occupancy"])]
+        if precios.size:
+            arrays["precio_cuantiles"][city_label] = np.percentile(precios, CUANTILES_PRECIO)
+        if ocupaciones.size:
+            arrays["ocupacion"][city_label] = np.median(ocupaciones)
+        arrays["n_anuncios"][city_label] = max(precios.size, ocupaciones.size)
+    return arrays
+
+
+def seasonality_from_calendar(arrays, calendario, columna_ciudad="city", ciudad=None,
+                              filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Factores mensuales de ocupación a partir de un calendario con columnas
+    ``date`` y ``available`` ("t"/"f"). Se lee por bloques, acumulando noches
+    ocupadas y totales por ciudad y mes.
+    """
+    columnas = ["date", "available"] + ([] if ciudad else [columna_ciudad])
+    ocupadas, totales = {}, {}
+    for bloque in pd.read_csv(calendario, usecols=columnas, chunksize=filas_por_bloque):
+        mes = pd.to_datetime(bloque["date"], errors="coerce").dt.month
+        ocupada = ~bloque["available"].astype(str).str.lower().isin(("t", "true", "1"))
+        ciudades = pd.Series(ciudad, index=bloque.index) if ciudad else bloque[columna_ciudad]
+        agrupado = pd.DataFrame({"ciudad": ciudades, "mes": mes, "ocupada": ocupada}).dropna()
+        resumen = agrupado.groupby(["ciudad", "mes"])["ocupada"].agg(["sum", "count"])
+        for (nombre, numero_mes), fila in resumen.iterrows():
+            clave = (nombre, int(numero_mes))
+            ocupadas[clave] = ocupadas.get(clave, 0) + fila["sum"]
+            totales[clave] = totales.get(clave, 0) + fila["count"]
+
+    for nombre in {nombre for nombre, _ in totales}:
+        city_label = city_mapping.get(normalize_city_name(nombre))
+        if city_label is None:
+            continue
+        mensual = np.array([
+            ocupadas.get((nombre, m), 0) / totales[(nombre, m)] if totales.get((nombre, m)) else np.nan
+            for m in range(1, 13)
+        ])
+        if np.isnan(mensual).all() or np.nanmean(mensual) == 0:
+            continue
+        mensual = np.where(np.isnan(mensual), np.nanmean(mensual), mensual)
+        arrays["estacionalidad"][city_label] = mensual / mensual.mean()
+    return arrays
+
+
+def build_priors(destino=PRIORS_PATH, directorio_comparables=COMPARABLES_DIR, calendario=None,
+                 columna_ciudad="city", ciudad=None):
+    """Genera el fichero de valores de referencia. Devuelve las ciudades con datos."""
+    arrays = priors_from_comparables(empty_arrays(), directorio_comparables)
+    if calendario:
+        seasonality_from_calendar(arrays, calendario, columna_ciudad, ciudad)
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    np.savez(destino, **arrays)
+    _load_priors_file.cache_clear()
+    return int((arrays["n_anuncios"] > 0).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valores de referencia por ciudad")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    construir = sub.add_parser("build", help="Genera el .npz a partir de los comparables y un calendario")
+    construir.add_argument("--destino", default=PRIORS_PATH)
+    construir.add_argument("--comparables", default=COMPARABLES_DIR, help="Directorio de ficheros de comparables")
+    construir.add_argument("--calendario", help="CSV con date, available y la ciudad")
+    construir.add_argument("--columna-ciudad", default="city")
+    construir.add_argument("--ciudad", help="Ciudad de todo el calendario (si no tiene columna de ciudad)")
+
+    args = parser.parse_args()
+    n = build_priors(args.destino, args.comparables, args.calendario, args.columna_ciudad, args.ciudad)
+    print(f"✅ Valores de referencia de {n} ciudades en {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Recomendador de amenidades: qué añadir para subir el precio y la TIR.
+
+Parte del diccionario ``data`` del inmueble y de las amenidades elegidas, y
+valora todas las amenidades que se pueden comprar y aún no tiene con una sola
+llamada a ``predict_prices`` (una fila por candidata) y una resolución
+vectorizada de la TIR (``solve_level_annuity_irr``). El coste de cada amenidad
+(``COSTE_AMENIDADES``) se suma a la inversión inicial y los servicios
+(limpieza, chef...) añaden además un coste anual (``COSTE_ANUAL_AMENIDADES``).
+Las amenidades que dependen de la ubicación (vistas, frente al mar...) o de
+las normas del anuncio no se recomiendan.
+
+La búsqueda de combinaciones es voraz: en cada paso se valoran, también en un
+único lote, todas las candidatas que caben en el presupuesto restante, y se
+añade la que más TIR gana por cada 1.000 $ de coste, hasta agotar el
+presupuesto o que ninguna mejore la TIR.
+"""
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from smartrental.amenities import amenities_por_categoria, amenity_traducciones
+from smartrental.amenity_bits import (N_AMENIDADES, POSICION_AMENIDAD, amenity_columns, category_counts,
+                                      encode_amenities, total_counts, uses_amenity_columns)
+from smartrental.cashflows import HORIZONTE_ANALISIS_ANOS, annual_net_cash_flow
+from smartrental.features import CATEGORIAS_AMENIDADES
+from smartrental.irr import solve_level_annuity_irr
+from smartrental.pricing import load_feature_names, predict_prices
+
+# Coste de compra o instalación aproximado de cada amenidad ($); las que no
+# dependen de una compra (ubicación, vistas, normas del anuncio) no aparecen
+COSTE_AMENIDADES = MappingProxyType({
+    "wifi": 150, "tv": 500, "sound_system": 300, "streaming_services": 150, "game_console": 450,
+    "security_guard": 500, "security_system": 800, "window_guards": 600, "lockbox": 60, "smoke_alarm": 30,
+    "carbon_monoxide_alarm": 40, "first_aid_kit": 30, "fire_extinguisher": 50, "lock_on_bedroom_door": 80,
+    "spa_access": 300, "bathtub": 1500, "body_soap": 20, "shampoo": 20, "conditioner": 20, "shower_gel": 20,
+    "vegan_shampoo": 30, "vegan_conditioner": 30, "vegan_soap": 30, "hair_dryer": 40, "essentials": 150,
+    "washer": 500, "dryer": 500, "iron": 40, "housekeeping": 200,
+    "garden": 3000, "balcony": 8000, "hammock": 100,
+    "parking": 5000, "free_parking": 5000, "luggage_dropoff": 100, "private_entrance": 4000,
+    "air_conditioning": 1500, "heating": 1500, "workspace": 350, "hot_water_kettle": 30, "pool": 25000,
+    "hot_tub": 6000, "sauna": 5000,
+    "kitchen": 6000, "coffee_maker": 80, "microwave": 120, "refrigerator": 700, "dishwasher": 500, "oven": 500,
+    "toaster": 40, "blender": 60, "waiststaff": 300, "bar": 1500, "breakfast_bar": 800, "bread_maker": 120,
+    "gas_stove": 500, "electric_stove": 400, "induction_stove": 600, "chef_service": 300, "bbq_grill": 400,
+    "exercise_equipment": 800, "gym": 10000, "sports_court": 20000, "table_sports": 400, "board_games": 60,
+    "bicycle": 500,
+    "children_books_toys": 100, "baby_bath": 40, "baby_monitor": 80, "crib": 200, "baby_care": 150,
+})
+
+# Coste anual de las amenidades que son servicios contratados ($ al año)
+COSTE_ANUAL_AMENIDADES = MappingProxyType({
+    "security_guard": 12000, "housekeeping": 3000, "spa_access": 1200, "streaming_services": 200,
+    "waiststaff": 8000, "chef_service": 6000,
+})
+
+# Pasos máximos de la búsqueda voraz
+MAX_PASOS = 10
+
+CANDIDATAS = tuple(amenidad for amenidad in POSICION_AMENIDAD if amenidad in COSTE_AMENIDADES)
+
+_CATEGORIA_DE_AMENIDAD = {
+    amenidad: categoria for categoria, amenidades in amenities_por_categoria.items() for amenidad in amenidades
+}
+
+# Una fila de bits por amenidad, para añadirlas con un OR
+_BIT_AMENIDAD = np.packbits(np.eye(N_AMENIDADES, dtype=np.uint8), axis=1, bitorder="little")
+
+
+def _feature_rows(data, bits, feature_names):
+    """Columnas del modelo: ``data`` repetido con las amenidades de cada fila de ``bits``."""
+    n = len(bits)
+    columnas = {nombre: np.full(n, valor) for nombre, valor in data.items() if nombre in feature_names}
+    for categoria, conteo in category_counts(bits).items():
+        columnas[CATEGORIAS_AMENIDADES[categoria]] = conteo
+    columnas["total_amenities_count"] = total_counts(bits)
+    if uses_amenity_columns(feature_names):
+        columnas.update(amenity_columns(bits))
+    return columnas
+
+
+def _evaluate(model, data, bits, coste, coste_anual, financieros, feature_names):
+    """Precio por noche y TIR de cada fila de ``bits`` con sus costes añadidos."""
+    precios = predict_prices(model, _feature_rows(data, bits, feature_names), feature_names)
+    flujo_anual = annual_net_cash_flow(precios, financieros["ocupacion"],
+                                       financieros["costos_operacion_anuales"] + coste_anual)
+    inversion_inmueble = financieros["inversion_inmueble"]
+    tir, converged = solve_level_annuity_irr(inversion_inmueble + financieros["inversion_amueblar"] + coste,
+                                             flujo_anual, inversion_inmueble, financieros["horizonte"])
+    return precios, np.where(converged & (precios > 0), tir, np.nan)
+
+
+def _pending(bits, candidatas):
+    """Candidatas que la fila ``bits`` aún no tiene."""
+    posiciones = np.array([POSICION_AMENIDAD[a] for a in candidatas], dtype=np.int64)
+    tiene = (_BIT_AMENIDAD[posiciones] & bits).any(axis=1)
+    return [a for a, presente in zip(candidatas, tiene) if not presente]
+
+
+def _costs(amenidades):
+    coste = np.array([COSTE_AMENIDADES[a] for a in amenidades], dtype=np.float64)
+    coste_anual = np.array([COSTE_ANUAL_AMENIDADES.get(a, 0.0) for a in amenidades], dtype=np.float64)
+    return coste, coste_anual
+
+
+def rank_single_amenities(model, data, base_bits, financieros, feature_names):
+    """
+    Valora cada amenidad candidata por separado. Devuelve ``(base, ranking)``:
+    el precio y la TIR actuales y un DataFrame con una fila por candidata,
+    ordenado por TIR ganada por cada 1.000 $.
+    """
+    candidatas = _pending(base_bits, CANDIDATAS)
+    coste, coste_anual = _costs(candidatas)
+    posiciones = [POSICION_AMENIDAD[a] for a in candidatas]
+    # Fila 0: el inmueble tal cual; el resto, una amenidad más cada una
+    bits = np.vstack([base_bits[np.newaxis, :], base_bits | _BIT_AMENIDAD[posiciones]])
+    precios, tir = _evaluate(model, data, bits, np.concatenate([[0.0], coste]),
+                             np.concatenate([[0.0], coste_anual]), financieros, feature_names)
+    base = {"precio_noche": float(precios[0]), "tir": float(tir[0])}
+
+    incremento_precio = precios[1:] - precios[0]
+    incremento_tir = tir[1:] - tir[0]
+    ingreso_extra = incremento_precio * 365 * financieros["ocupacion"] - coste_anual
+    with np.errstate(divide="ignore", invalid="ignore"):
+        recuperacion = np.where(ingreso_extra > 0, coste / ingreso_extra, np.nan)
+    ranking = pd.DataFrame({
+        "amenidad": candidatas,
+        "nombre": [amenity_traducciones.get(a, a) for a in candidatas],
+        "categoria": [_CATEGORIA_DE_AMENIDAD[a] for a in candidatas],
+        "coste": coste,
+        "coste_anual": coste_anual,
+        "precio_noche": precios[1:],
+        "incremento_precio": incremento_precio,
+        "tir": tir[1:],
+        "incremento_tir": incremento_tir,
+        "incremento_tir_por_1000": incremento_tir / coste * 1000,
+        "recuperacion_anos": recuperacion,
+    })
+    ranking = ranking.sort_values(["incremento_tir_por_1000", "incremento_precio"], ascending=False,
+                                  na_position="last")
+    return base, ranking.reset_index(drop=True)
+
+
+def greedy_amenities(model, data, base_bits, financieros, presupuesto, feature_names, max_pasos=MAX_PASOS):
+    """
+    Combinación de amenidades dentro de ``presupuesto`` elegida paso a paso.
+    Devuelve un DataFrame con una fila por amenidad añadida, con el coste
+    acumulado y el precio y la TIR tras añadirla.
+    """
+    bits = base_bits.copy()
+    precio_base, tir_base = _evaluate(model, data, bits[np.newaxis, :], 0.0, 0.0, financieros, feature_names)
+    tir_actual = tir_base[0]
+    gastado, gasto_anual = 0.0, 0.0
+    pasos = []
+    while len(pasos) < max_pasos and np.isfinite(tir_actual):
+        candidatas = [a for a in _pending(bits, CANDIDATAS) if COSTE_AMENIDADES[a] <= presupuesto - gastado]
+        if not candidatas:
+            break
+        coste, coste_anual = _costs(candidatas)
+        filas = bits | _BIT_AMENIDAD[[POSICION_AMENIDAD[a] for a in candidatas]]
+        precios, tir = _evaluate(model, data, filas, gastado + coste, gasto_anual + coste_anual,
+                                 financieros, feature_names)
+        ganancia = (tir - tir_actual) / coste
+        if not np.nanmax(ganancia, initial=-np.inf) > 0:
+            break
+        mejor = int(np.nanargmax(ganancia))
+        bits = filas[mejor]
+        gastado += coste[mejor]
+        gasto_anual += coste_anual[mejor]
+        tir_actual = tir[mejor]
+        pasos.append({
+            "amenidad": candidatas[mejor],
+            "nombre": amenity_traducciones.get(candidatas[mejor], candidatas[mejor]),
+            "coste": coste[mejor],
+            "coste_acumulado": gastado,
+            "coste_anual_acumulado": gasto_anual,
+            "precio_noche": precios[mejor],
+            "tir": tir[mejor],
+        })
+    return pd.DataFrame(pasos, columns=["amenidad", "nombre", "coste", "coste_acumulado",
+                                        "coste_anual_acumulado", "precio_noche", "tir"])
+
+
+def recommend_amenities(model, data, amenities_seleccionadas, inversion_inmueble, inversion_amueblar,
+                        costos_operacion_anuales, ocupacion, horizonte=HORIZONTE_ANALISIS_ANOS,
+                        presupuesto=None, max_pasos=MAX_PASOS, feature_names=None):
+    """
+    Amenidades que más mejoran la rentabilidad del inmueble.
+
+    data: Diccionario de ``build_features`` del inmueble.
+    amenities_seleccionadas: Diccionario categoría -> lista de amenidades que ya tiene.
+    presupuesto: Gasto máximo en amenidades nuevas (por defecto, ``inversion_amueblar``).
+
+    Devuelve un diccionario con ``base`` (precio y TIR actuales), ``individuales``
+    (ranking de ``rank_single_amenities``) y ``combinacion`` (``greedy_amenities``).
+    """
+    if feature_names is None:
+        feature_names = load_feature_names()
+    financieros = {
+        "inversion_inmueble": float(inversion_inmueble), "inversion_amueblar": float(inversion_amueblar),
+        "costos_operacion_anuales": float(costos_operacion_anuales), "ocupacion": float(ocupacion),
+        "horizonte": horizonte,
+    }
+    base_bits = encode_amenities(amenities_seleccionadas)
+    if presupuesto is None:
+        presupuesto = inversion_amueblar
+
+    base, individuales = rank_single_amenities(model, data, base_bits, financieros, feature_names)
+    combinacion = greedy_amenities(model, data, base_bits, financieros, presupuesto, feature_names, max_pasos)
+    return {"base": base, "individuales": individuales, "combinacion": combinacion}
@@ -0,0 +1,557 @@
+"""
+Registro de versiones del modelo, cambio en caliente y evaluación en sombra.
+
+El registro (``SMARTRENTAL_REGISTRY``, por defecto ``models`` en la raíz del
+proyecto) guarda cada
+versión en su propio directorio, con el artefacto y su lista de variables:
+
+    models/
+        CURRENT                  versión activa
+        CANDIDATE                versión evaluada en sombra (opcional)
+        20261018-120000/
+            price_model.pkl      (o .joblib)
+            features.pkl
+            meta.json
+        shadow/
+            20261018-120000.jsonl
+
+Los punteros son ficheros de texto que se sustituyen con ``os.replace``, así
+que un lector ve siempre la versión anterior o la nueva, nunca un fichero a
+medias; las versiones se publican en un directorio temporal que se renombra
+al terminar. Sin ``CURRENT`` se usa ``MODEL_PATH`` con ``FEATURES_PATH``,
+como antes del registro.
+
+``ModelManager`` mantiene el modelo activo del proceso. Cada
+``INTERVALO_COMPROBACION`` segundos lee los punteros y, si cambian, carga la
+versión nueva en un hilo aparte y la sustituye de una vez: las peticiones en
+curso terminan con el modelo con el que empezaron y el servidor no se
+reinicia ni pierde sus cachés. Si hay candidata, ``ShadowEvaluator`` valora
+en otro hilo una muestra (``SMARTRENTAL_FRACCION_SOMBRA``) de las peticiones
+reales con ella y registra la diferencia de precio y la latencia de los dos
+modelos, sin añadir tiempo a la respuesta:
+
+    python -m smartrental.registry publish price_model.pkl --candidate
+    python -m smartrental.registry shadow
+    python -m smartrental.registry promote 20261018-120000
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from smartrental import metrics
+from smartrental.compiled import CompiledTreeEnsemble, optimize_model
+from smartrental.model import EXTENSION_MMAP, MODEL_PATH, load_model_file, model_version, ultima_carga
+from smartrental.pricing import (FEATURES_PATH, RAIZ_PROYECTO, check_model_features, load_feature_names,
+                                 predict_prices)
+
+logger = logging.getLogger("smartrental.shadow")
+
+logger_modelos = logging.getLogger("smartrental.models")
+
+REGISTRY_PATH = os.environ.get("SMARTRENTAL_REGISTRY", os.path.join(RAIZ_PROYECTO, "models"))
+
+PUNTERO_ACTUAL = "CURRENT"
+
+PUNTERO_CANDIDATO = "CANDIDATE"
+
+ARCHIVO_MODELO = "price_model"
+
+ARCHIVO_VARIABLES = "features.pkl"
+
+ARCHIVO_META = "meta.json"
+
+DIRECTORIO_SOMBRA = "shadow"
+
+# Segundos entre lecturas de los punteros
+INTERVALO_COMPROBACION = 5.0
+
+# Fracción de las peticiones que se valoran también con la candidata
+FRACCION_SOMBRA = float(os.environ.get("SMARTRENTAL_FRACCION_SOMBRA", 0.1))
+
+# Peticiones en espera para la sombra; si se llena se descartan, no se espera
+MAX_COLA_SOMBRA = 256
+
+REGISTROS_SOMBRA = 500
+
+_NOMBRE_VERSION = re.compile(r"[\w.-]+")
+
+
+class ModelVersion:
+    """Un modelo cargado con su versión y la lista de variables con la que se entrenó."""
+
+    def __init__(self, version, model, feature_names, ruta):
+        self.version = version
+        self.model = model
+        self.feature_names = list(feature_names)
+        self.ruta = ruta
+
+
+def _cargar(version, ruta_modelo, ruta_variables):
+    with metrics.stage("load_model"):
+        model = load_model_file(ruta_modelo)
+    logger_modelos.info("Modelo %s cargado: %s (%.0f ms, RSS %.0f MB)", version, ultima_carga["ruta"],
+                        ultima_carga["segundos"] * 1000, ultima_carga["rss_mb"])
+    # Versión compilada de los árboles si reproduce exactamente las predicciones
+    with metrics.stage("compile_model"):
+        model = optimize_model(model)
+    if isinstance(model, CompiledTreeEnsemble):
+        logger_modelos.info("Inferencia compilada activada para %s", version)
+    return ModelVersion(version, model, load_feature_names(ruta_variables), ultima_carga["ruta"])
+
+
+class ModelRegistry:
+    """Directorio de versiones del modelo con punteros atómicos."""
+
+    def __init__(self, root=REGISTRY_PATH):
+        self.root = root
+
+    def _ruta(self, *partes):
+        return os.path.join(self.root, *partes)
+
+    def _comprobar_nombre(self, version):
+        if not _NOMBRE_VERSION.fullmatch(version or ""):
+            raise ValueError(f"Nombre de versión no válido: {version!r}")
+
+    def versions(self):
+        """Versiones publicadas, de la más antigua a la más reciente."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(nombre for nombre in os.listdir(self.root)
+                      if not nombre.startswith(".") and os.path.isfile(self._ruta(nombre, ARCHIVO_VARIABLES)))
+
+    def metadata(self, version):
+        with open(self._ruta(version, ARCHIVO_META)) as f:
+            return json.load(f)
+
+    def model_path(self, version):
+        """Artefacto de la versión: el ``.joblib`` si existe, si no el ``.pkl``."""
+        ruta = self._ruta(version, ARCHIVO_MODELO + EXTENSION_MMAP)
+        return ruta if os.path.exists(ruta) else self._ruta(version, ARCHIVO_MODELO + ".pkl")
+
+    def features_path(self, version):
+        return self._ruta(version, ARCHIVO_VARIABLES)
+
+    def pointer_path(self, nombre):
+        return self._ruta(nombre)
+
+    def read_pointer(self, nombre):
+        """Versión a la que apunta ``nombre`` (``CURRENT`` o ``CANDIDATE``), o ``None``."""
+        try:
+            with open(self._ruta(nombre)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, nombre, version):
+        if version is None:
+            try:
+                os.remove(self._ruta(nombre))
+            except FileNotFoundError:
+                pass
+            return
+        if version not in self.versions():
+            raise ValueError(f"La versión {version} no está publicada en {self.root}")
+        descriptor, temporal = tempfile.mkstemp(dir=self.root, prefix=f".{nombre}-")
+        with os.fdopen(descriptor, "w") as f:
+            f.write(version + "\n")
+        os.replace(temporal, self._ruta(nombre))
+
+    def current(self):
+        return self.read_pointer(PUNTERO_ACTUAL)
+
+    def candidate(self):
+        return self.read_pointer(PUNTERO_CANDIDATO)
+
+    def promote(self, version):
+        """Activa ``version``; si era la candidata, deja de evaluarse en sombra."""
+        self._write_pointer(PUNTERO_ACTUAL, version)
+        if self.candidate() == version:
+            self._write_pointer(PUNTERO_CANDIDATO, None)
+
+    def set_candidate(self, version):
+        """Evalúa ``version`` en sombra (``None`` para dejar de hacerlo)."""
+        self._write_pointer(PUNTERO_CANDIDATO, version)
+
+    def publish(self, model_path, features_path=FEATURES_PATH, version=None, notas=None):
+        """
+        Copia el artefacto y su lista de variables como una versión nueva y
+        devuelve su nombre. Comprueba antes que el modelo se entrenó con esas
+        variables. No cambia los punteros.
+        """
+        version = version or time.strftime("%Y%m%d-%H%M%S")
+        self._comprobar_nombre(version)
+        if os.path.exists(self._ruta(version)):
+            raise ValueError(f"La versión {version} ya existe en {self.root}")
+        feature_names = load_feature_names(features_path)
+        check_model_features(load_model_file(model_path), feature_names)
+
+        os.makedirs(self.root, exist_ok=True)
+        temporal = tempfile.mkdtemp(dir=self.root, prefix=f".{version}-")
+        extension = EXTENSION_MMAP if model_path.endswith(EXTENSION_MMAP) else ".pkl"
+        shutil.copyfile(model_path, os.path.join(temporal, ARCHIVO_MODELO + extension))
+        shutil.copyfile(features_path, os.path.join(temporal, ARCHIVO_VARIABLES))
+        with open(os.path.join(temporal, ARCHIVO_META), "w") as f:
+            json.dump({"version": version, "creado": time.time(), "origen": os.path.abspath(model_path),
+                       "variables": len(feature_names), "notas": notas}, f, indent=2)
+        # El directorio aparece completo o no aparece
+        os.rename(temporal, self._ruta(version))
+        return version
+
+    def load(self, version):
+        """Carga la versión publicada ``version``."""
+        self._comprobar_nombre(version)
+        return _cargar(version, self.model_path(version), self.features_path(version))
+
+    def shadow_log_path(self, version):
+        return self._ruta(DIRECTORIO_SOMBRA, f"{version}.jsonl")
+
+
+class ShadowEvaluator:
+    """
+    Valora con el modelo candidato, en un hilo propio, una muestra de las
+    peticiones del modelo activo y registra las diferencias.
+    """
+
+    def __init__(self, candidata, fraccion=FRACCION_SOMBRA, ruta_log=None, max_cola=MAX_COLA_SOMBRA):
+        self.candidata = candidata
+        self.fraccion = fraccion
+        self.ruta_log = ruta_log
+        self.registros = deque(maxlen=REGISTROS_SOMBRA)
+        self.descartadas = 0
+        self.errores = 0
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._parada = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name=f"smartrental-sombra-{candidata.version}",
+                                      daemon=True)
+        self._hilo.start()
+
+    def submit(self, X, precios, segundos, version_activa):
+        """
+        Encola una petición ya respondida (con su precio y su tiempo) si entra
+        en la muestra. Nunca bloquea: con la cola llena se descarta.
+        """
+        if random.random() >= self.fraccion:
+            return False
+        try:
+            self._cola.put_nowait((X, np.asarray(precios, dtype=np.float64), segundos, version_activa))
+        except queue.Full:
+            self.descartadas += 1
+            return False
+        return True
+
+    def _ejecutar(self):
+        while not self._parada.is_set():
+            peticion = self._cola.get()
+            if peticion is None or self._parada.is_set():
+                return
+            X, precios, segundos, version_activa = peticion
+            try:
+                inicio = time.perf_counter()
+                with metrics.stage("shadow_predict"):
+                    candidatos = predict_prices(self.candidata.model, X, self.candidata.feature_names)
+                segundos_candidata = time.perf_counter() - inicio
+            except Exception as e:
+                self.errores += 1
+                logger.warning("Sombra %s: %s", self.candidata.version, e)
+                continue
+            diferencia = candidatos - precios
+            with np.errstate(divide="ignore", invalid="ignore"):
+                relativa = np.where(precios != 0, diferencia / np.abs(precios), np.nan)
+            registro = {
+                "hora": time.time(),
+                "version_activa": version_activa,
+                "version_candidata": self.candidata.version,
+                "filas": int(precios.size),
+                "precio_activo": float(precios.mean()),
+                "precio_candidato": float(candidatos.mean()),
+                "diferencia_media": float(diferencia.mean()),
+                "diferencia_abs_max": float(np.abs(diferencia).max()),
+                "diferencia_relativa_media": float(np.nanmean(relativa)) if np.isfinite(relativa).any() else None,
+                "ms_activo": segundos * 1000,
+                "ms_candidato": segundos_candidata * 1000,
+            }
+            self.registros.append(registro)
+            self._escribir(registro)
+
+    def _escribir(self, registro):
+        linea = json.dumps(registro)
+        logger.info(linea)
+        if self.ruta_log is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.ruta_log), exist_ok=True)
+            # Una línea por escritura en modo "append": los procesos no se mezclan
+            with open(self.ruta_log, "a") as f:
+                f.write(linea + "\n")
+        except OSError as e:
+            logger.warning("No se pudo escribir %s: %s", self.ruta_log, e)
+
+    def stats(self):
+        return summarize_shadow(list(self.registros), descartadas=self.descartadas, errores=self.errores)
+
+    def close(self):
+        """Detiene el hilo sin bloquear, aunque la cola esté llena."""
+        self._parada.set()
+        try:
+            # Despierta al hilo si está esperando en una cola vacía
+            self._cola.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+def summarize_shadow(registros, **extra):
+    """Resumen de los registros de la sombra: diferencias de precio y latencias."""
+    resumen = {"peticiones": len(registros), **extra}
+    if not registros:
+        return resumen
+    diferencia = np.array([r["diferencia_media"] for r in registros])
+    relativa = np.array([np.nan if r["diferencia_relativa_media"] is None else r["diferencia_relativa_media"]
+                         for r in registros])
+    ms_activo = np.array([r["ms_activo"] for r in registros])
+    ms_candidato = np.array([r["ms_candidato"] for r in registros])
+    resumen.update({
+        "diferencia_media": float(diferencia.mean()),
+        "diferencia_relativa_abs_media": float(np.nanmean(np.abs(relativa))) if np.isfinite(relativa).any() else None,
+        "diferencia_relativa_abs_p95": (float(np.nanpercentile(np.abs(relativa), 95))
+                                        if np.isfinite(relativa).any() else None),
+        "ms_activo_p50": float(np.percentile(ms_activo, 50)),
+        "ms_activo_p95": float(np.percentile(ms_activo, 95)),
+        "ms_candidato_p50": float(np.percentile(ms_candidato, 50)),
+        "ms_candidato_p95": float(np.percentile(ms_candidato, 95)),
+    })
+    return resumen
+
+
+class ModelManager:
+    """
+    Modelo activo (y candidato) de un proceso, con cambio en caliente.
+
+    registry: ``ModelRegistry``; si no tiene ``CURRENT`` se usa ``model_path``.
+    """
+
+    def __init__(self, registry=None, model_path=MODEL_PATH, intervalo=INTERVALO_COMPROBACION,
+                 fraccion_sombra=FRACCION_SOMBRA):
+        self.registry = registry or ModelRegistry()
+        self.model_path = model_path
+        self.intervalo = intervalo
+        self.fraccion_sombra = fraccion_sombra
+        self._activo = None
+        self._sombra = None
+        self._lock = threading.Lock()
+        self._cargando = None
+        self._ultima_comprobacion = 0.0
+        # Versiones cuya carga falló -> (firma, error): se reintentan cuando
+        # cambia algún puntero o el artefacto (``_firma``)
+        self._fallidas = {}
+        self.cambios = 0
+
+    def _objetivo(self):
+        """Versión que debería estar activa y cómo cargarla."""
+        version = self.registry.current()
+        if version is not None:
+            return version, lambda: self.registry.load(version)
+        version = model_version(self.model_path)
+        return version, lambda: _cargar(version, self.model_path, FEATURES_PATH)
+
+    def _firma(self, version):
+        """Fechas de modificación de los punteros y del artefacto de ``version``."""
+        rutas = (self.registry.pointer_path(PUNTERO_ACTUAL), self.registry.pointer_path(PUNTERO_CANDIDATO),
+                 self.registry.model_path(version))
+        return tuple(os.path.getmtime(ruta) if os.path.exists(ruta) else None for ruta in rutas)
+
+    def _descartada(self, version):
+        """``True`` si la carga de ``version`` falló y desde entonces no ha cambiado nada."""
+        fallo = self._fallidas.get(version)
+        if fallo is None:
+            return False
+        if fallo[0] == self._firma(version):
+            return True
+        del self._fallidas[version]
+        return False
+
+    def _registrar_fallo(self, version, error, candidata=False):
+        self._fallidas[version] = (self._firma(version), str(error))
+        logger_modelos.error("No se pudo cargar el modelo %s%s: %s", "candidato " if candidata else "",
+                             version, error)
+        metrics.event("fallo_carga_modelo", logging.ERROR, version=version, candidata=candidata,
+                      error=str(error))
+
+    def active(self):
+        """
+        ``ModelVersion`` activa. La primera llamada la carga (y lanza la
+        excepción si falla); las siguientes no esperan nunca a una carga.
+        """
+        if self._activo is None:
+            with self._lock:
+                if self._activo is None:
+                    if self.registry.current() is None:
+                        logger_modelos.warning("Sin versión activa en el registro %s; se usa %s",
+                                               self.registry.root, self.model_path)
+                    _, cargar = self._objetivo()
+                    self._activo = cargar()
+                    self._ultima_comprobacion = time.monotonic()
+        self._comprobar()
+        return self._activo
+
+    def _comprobar(self):
+        ahora = time.monotonic()
+        if ahora - self._ultima_comprobacion < self.intervalo:
+            return
+        with self._lock:
+            if ahora - self._ultima_comprobacion < self.intervalo or self._cargando is not None:
+                return
+            self._ultima_comprobacion = ahora
+            try:
+                version, cargar = self._objetivo()
+            except OSError:
+                return  # El artefacto se está sustituyendo: se mira en la siguiente comprobación
+            candidata = self.registry.candidate()
+            if candidata == version:
+                candidata = None
+            actual_sombra = self._sombra.candidata.version if self._sombra else None
+            cambiar = version != self._activo.version and not self._descartada(version)
+            cambiar_sombra = candidata != actual_sombra and not self._descartada(candidata)
+            if not cambiar and not cambiar_sombra:
+                return
+            self._cargando = threading.Thread(
+                target=self._cargar_en_segundo_plano, name="smartrental-carga-modelo", daemon=True,
+                args=(version if cambiar else None, cargar, candidata if cambiar_sombra else actual_sombra),
+            )
+            self._cargando.start()
+
+    def _cargar_en_segundo_plano(self, version, cargar, candidata):
+        try:
+            if version is not None:
+                try:
+                    nuevo = cargar()
+                except Exception as e:
+                    self._registrar_fallo(version, e)
+                else:
+                    anterior = self._activo.version
+                    # Una sola asignación: cada petición ve el modelo anterior o el nuevo
+                    self._activo = nuevo
+                    self.cambios += 1
+                    logger_modelos.info("Modelo activo: %s -> %s", anterior, nuevo.version)
+                    metrics.event("cambio_modelo", anterior=anterior, version=nuevo.version)
+            self._cambiar_sombra(candidata)
+        finally:
+            with self._lock:
+                self._cargando = None
+
+    def _cambiar_sombra(self, candidata):
+        actual = self._sombra.candidata.version if self._sombra else None
+        if candidata == actual:
+            return
+        if self._sombra is not None:
+            self._sombra.close()
+            self._sombra = None
+        if candidata is None:
+            return
+        try:
+            modelo = self.registry.load(candidata)
+        except Exception as e:
+            self._registrar_fallo(candidata, e, candidata=True)
+            return
+        self._sombra = ShadowEvaluator(modelo, self.fraccion_sombra, self.registry.shadow_log_path(candidata))
+        logger_modelos.info("Evaluando en sombra %s con el %.0f%% de las peticiones", candidata,
+                            self.fraccion_sombra * 100)
+
+    def required_features(self):
+        """Variables que hay que construir para el modelo activo y el candidato."""
+        nombres = list(self._activo.feature_names) if self._activo else load_feature_names()
+        if self._sombra is not None:
+            nombres += [n for n in self._sombra.candidata.feature_names if n not in nombres]
+        return nombres
+
+    def shadow(self, X, precios, segundos, version_activa=None):
+        """Envía a la sombra una petición ya respondida, si hay candidata."""
+        sombra = self._sombra
+        if sombra is None:
+            return False
+        return sombra.submit(X, precios, segundos, version_activa or self._activo.version)
+
+    def stats(self):
+        sombra = self._sombra
+        return {
+            "version": self._activo.version if self._activo else None,
+            "registro": self.registry.root if self.registry.current() else None,
+            "candidata": sombra.candidata.version if sombra else None,
+            "cambios": self.cambios,
+            "fallidas": {version: error for version, (_, error) in self._fallidas.items()},
+            "sombra": sombra.stats() if sombra else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registro de versiones del modelo")
+    parser.add_argument("--registry", default=REGISTRY_PATH)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    publicar = sub.add_parser("publish", help="Publica un artefacto como versión nueva")
+    publicar.add_argument("model")
+    publicar.add_argument("--features", default=FEATURES_PATH)
+    publicar.add_argument("--version")
+    publicar.add_argument("--notas")
+    destino = publicar.add_mutually_exclusive_group()
+    destino.add_argument("--promote", action="store_true", help="Activarla directamente")
+    destino.add_argument("--candidate", action="store_true", help="Evaluarla en sombra")
+
+    promover = sub.add_parser("promote", help="Activa una versión publicada")
+    promover.add_argument("version")
+
+    candidata = sub.add_parser("candidate", help="Evalúa una versión en sombra")
+    candidata.add_argument("version", nargs="?", help="Sin versión, deja de evaluar en sombra")
+
+    sub.add_parser("list", help="Muestra las versiones publicadas")
+
+    sombra = sub.add_parser("shadow", help="Resume las diferencias registradas en sombra")
+    sombra.add_argument("version", nargs="?", help="Por defecto, la candidata actual")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.registry)
+    if args.comando == "publish":
+        version = registry.publish(args.model, args.features, args.version, args.notas)
+        if args.promote:
+            registry.promote(version)
+        elif args.candidate:
+            registry.set_candidate(version)
+        print(f"✅ Versión {version} publicada en {registry.root}")
+    elif args.comando == "promote":
+        registry.promote(args.version)
+        print(f"✅ Versión activa: {args.version}")
+    elif args.comando == "candidate":
+        registry.set_candidate(args.version)
+        print(f"✅ Candidata: {args.version or 'ninguna'}")
+    elif args.comando == "list":
+        actual, candidata = registry.current(), registry.candidate()
+        for version in registry.versions():
+            meta = registry.metadata(version)
+            marca = "*" if version == actual else "s" if version == candidata else " "
+            print(f"{marca} {version}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(meta['creado']))}  "
+                  f"{meta['variables']} variables  {meta.get('notas') or ''}")
+    else:
+        version = args.version or registry.candidate()
+        if version is None:
+            raise SystemExit("No hay candidata: indica la versión")
+        try:
+            with open(registry.shadow_log_path(version)) as f:
+                registros = [json.loads(linea) for linea in f if linea.strip()]
+        except FileNotFoundError:
+            registros = []
+        for clave, valor in summarize_shadow(registros).items():
+            print(f"{clave}: {valor:.4g}" if isinstance(valor, float) else f"{clave}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Análisis de sensibilidad de la TIR.
+
+Evalúa en una sola pasada vectorizada una rejilla 3-D de ocupación anual,
+precio por noche y precio de compra del inmueble, con la misma estructura de
+flujos que la sección de resultados, y calcula la frontera de rentabilidad
+(precio por noche con el que la TIR iguala la tasa objetivo).
+
+Los valores de equilibrio (precio por noche, ocupación mínima y precio de
+compra máximo con los que la TIR iguala la tasa objetivo) se despejan en
+forma cerrada: a una tasa fija el VAN de los flujos
+[-(compra + amueblar), A x (horizonte - 1), compra] es lineal en el flujo
+anual A, que a su vez es lineal en el precio y en la ocupación, y también es
+lineal en el precio de compra. No hace falta iterar, y todas las funciones
+admiten arrays para valorar carteras completas.
+"""
+import numpy as np
+
+from smartrental.cashflows import annual_net_cash_flow
+from smartrental.irr import level_annuity_breakeven_flow, level_annuity_npv, solve_level_annuity_irr
+
+PUNTOS_OCUPACION = 50
+PUNTOS_PRECIO = 50
+PUNTOS_COMPRA = 20
+
+
+def sensitivity_axes(precio_noche, inversion_inmueble, puntos_ocupacion=PUNTOS_OCUPACION,
+                     puntos_precio=PUNTOS_PRECIO, puntos_compra=PUNTOS_COMPRA):
+    """
+    Ejes por defecto de la rejilla: ocupación del 20 % al 100 %, y precio por
+    noche y precio de compra entre el 50 % y el 150 % de los valores actuales.
+    """
+    return {
+        "ocupacion": np.linspace(0.2, 1.0, puntos_ocupacion),
+        "precio_noche": precio_noche * np.linspace(0.5, 1.5, puntos_precio),
+        "inversion_inmueble": inversion_inmueble * np.linspace(0.5, 1.5, puntos_compra),
+    }
+
+
+def sensitivity_grid(ocupaciones, precios_noche, inversiones_inmueble, inversion_amueblar,
+                     costos_operacion_anuales, horizonte):
+    """
+    TIR para todas las combinaciones de los tres ejes.
+
+    Devuelve un array de forma (ocupaciones, precios_noche, inversiones_inmueble)
+    con ``nan`` donde no existe TIR.
+    """
+    ocupacion = np.asarray(ocupaciones, dtype=np.float64)[:, np.newaxis, np.newaxis]
+    precio = np.asarray(precios_noche, dtype=np.float64)[np.newaxis, :, np.newaxis]
+    compra = np.asarray(inversiones_inmueble, dtype=np.float64)[np.newaxis, np.newaxis, :]
+
+    flujo_anual = annual_net_cash_flow(precio, ocupacion, costos_operacion_anuales)
+    tir, converged = solve_level_annuity_irr(compra + inversion_amueblar, flujo_anual, compra, horizonte)
+    return np.where(converged, tir, np.nan)
+
+
+def break_even_price(tasa_objetivo, ocupaciones, inversion_inmueble, inversion_amueblar,
+                     costos_operacion_anuales, horizonte):
+    """
+    Precio por noche con el que la TIR es exactamente ``tasa_objetivo`` para
+    cada ocupación (la curva de nivel de la rejilla a esa tasa).
+    """
+    flujo_necesario = level_annuity_breakeven_flow(
+        tasa_objetivo, inversion_inmueble + inversion_amueblar, inversion_inmueble, horizonte
+    )
+    ocupacion = np.asarray(ocupaciones, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        return (flujo_necesario + costos_operacion_anuales) / (365 * ocupacion)
+
+
+def break_even_occupancy(tasa_objetivo, precio_noche, inversion_inmueble, inversion_amueblar,
+                         costos_operacion_anuales, horizonte):
+    """
+    Ocupación anual mínima (fracción) con la que la TIR es ``tasa_objetivo``
+    al precio por noche dado. Mayor que 1 si no se alcanza ni con ocupación
+    completa; ``nan`` si el precio no es positivo.
+    """
+    flujo_necesario = level_annuity_breakeven_flow(
+        tasa_objetivo, inversion_inmueble + inversion_amueblar, inversion_inmueble, horizonte
+    )
+    precio = np.asarray(precio_noche, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(precio > 0, (flujo_necesario + costos_operacion_anuales) / (365 * precio), np.nan)
+
+
+def max_purchase_price(tasa_objetivo, flujo_anual, inversion_amueblar, horizonte):
+    """
+    Precio de compra máximo con el que la TIR es ``tasa_objetivo``. El
+    inmueble se recupera por su precio al final del horizonte, así que
+    VAN = -(P + amueblar) + A * S + P * v**horizonte = 0 y
+    P = (A * S - amueblar) / (1 - v**horizonte). Por encima de ese precio la
+    TIR es menor. ``nan`` si no se alcanza ni con el inmueble gratis o si la
+    tasa no es positiva (el precio de compra no afecta entonces al VAN).
+    """
+    tasa = np.asarray(tasa_objetivo, dtype=np.float64)
+    anualidad = level_annuity_npv(tasa, 0.0, 1.0, 0.0, horizonte)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        compra = ((np.asarray(flujo_anual, dtype=np.float64) * anualidad - inversion_amueblar)
+                  / (1 - (1 + tasa) ** -horizonte))
+    return np.where((tasa > 0) & (compra >= 0), compra, np.nan)
+
+
+def break_even_targets(tasa_objetivo, precio_noche, ocupacion, inversion_inmueble, inversion_amueblar,
+                       costos_operacion_anuales, horizonte):
+    """
+    Valores con los que la TIR iguala ``tasa_objetivo`` cambiando una sola
+    variable y dejando el resto como están. Todos los argumentos admiten
+    arrays (una fila por inmueble).
+
+    Devuelve un diccionario de arrays: ``precio_equilibrio`` (precio por noche
+    mínimo), ``ocupacion_minima`` y ``compra_maxima`` (precio de compra máximo).
+    """
+    precio_equilibrio = break_even_price(tasa_objetivo, ocupacion, inversion_inmueble, inversion_amueblar,
+                                         costos_operacion_anuales, horizonte)
+    ocupacion = np.asarray(ocupacion, dtype=np.float64)
+    return {
+        "precio_equilibrio": np.where(ocupacion > 0, precio_equilibrio, np.nan),
+        "ocupacion_minima": break_even_occupancy(tasa_objetivo, precio_noche, inversion_inmueble,
+                                                 inversion_amueblar, costos_operacion_anuales, horizonte),
+        "compra_maxima": max_purchase_price(
+            tasa_objetivo, annual_net_cash_flow(precio_noche, ocupacion, costos_operacion_anuales),
+            inversion_amueblar, horizonte
+        ),
+    }
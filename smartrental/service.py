@@ -0,0 +1,325 @@
+"""
+Servicio HTTP de valoración, sin Streamlit.
+
+Expone el modelo de precios y el cálculo de TIR para integraciones y cribado
+de carteras. El modelo se carga una sola vez al arrancar, antes de crear los
+procesos de trabajo, de modo que todos lo comparten (con un artefacto
+``.joblib`` los arrays del modelo además están mapeados en memoria). Como en
+la aplicación, el modelo es la versión activa del registro
+(``smartrental.registry``; sin registro, ``MODEL_PATH``): cada proceso cambia
+en caliente a la versión que se promueva y, si hay candidata, la evalúa en
+sombra con una muestra de las peticiones:
+
+    python -m smartrental.service --port 8000 --workers 4
+
+Endpoints:
+- ``GET /health``: estado del servicio, con la versión activa y la candidata.
+- ``GET /metrics``: tiempos por etapa en formato Prometheus (con
+  ``SMARTRENTAL_METRICS=1``; las métricas son por proceso de trabajo).
+- ``POST /score``: un inmueble (objeto JSON) o una lista de inmuebles. Los
+  campos tienen los mismos nombres y valores por defecto que el formulario
+  de la aplicación; las amenidades se indican como categoría -> lista. Si no
+  se indica la ocupación se usa la de referencia de la ciudad, si existe. La
+  ciudad admite alias y errores tipográficos; si se omite pero se indican
+  las coordenadas, se usa la ciudad soportada más cercana, y si se indica
+  sin coordenadas, el inmueble se sitúa en el centro de la ciudad (las
+  coordenadas se indican las dos o ninguna). Cada resultado
+  incluye precio por noche, TIR y los valores de equilibrio con los que la
+  TIR iguala la tasa objetivo (``precio_equilibrio``, ``ocupacion_minima`` y
+  ``compra_maxima``). En una lista, un inmueble que no puede valorarse
+  (p. ej. con una ciudad desconocida) devuelve ``{"error": ...}`` en su
+  posición y los demás se valoran igual; un inmueble suelto responde 400.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from smartrental.amenity_bits import uses_amenity_columns
+from smartrental.cashflows import (HORIZONTE_ANALISIS_ANOS, TASA_DESCUENTO_OBJETIVO,
+                                   annual_net_cash_flow)
+from smartrental.cities import CENTROS_CIUDADES, nearest_city, resolve_city
+from smartrental.compiled import CompiledTreeEnsemble
+from smartrental.features import VALORES_POR_DEFECTO, build_features
+from smartrental import metrics
+from smartrental.irr import solve_level_annuity_irr
+from smartrental.model import MODEL_PATH, rss_mb, ultima_carga
+from smartrental.pricing import load_feature_names, predict_prices
+from smartrental.priors import load_priors
+from smartrental.registry import REGISTRY_PATH, ModelManager, ModelRegistry
+from smartrental.sensitivity import break_even_targets
+
+logger = logging.getLogger("smartrental.service")
+
+TAMANO_MAXIMO_LOTE = 50_000
+
+COLUMNAS_FINANCIERAS = ("inversion_inmueble", "inversion_amueblar", "ocupacion_anual_porcentaje",
+                        "costos_operacion_anuales")
+
+_gestor = None
+
+
+def get_model_manager():
+    """Devuelve el ``ModelManager`` de este proceso."""
+    if _gestor is None:
+        raise RuntimeError("El modelo no está cargado")
+    return _gestor
+
+
+def set_model_manager(gestor):
+    """Fija el gestor del modelo que usa el servicio (se llama al arrancar)."""
+    global _gestor
+    _gestor = gestor
+
+
+def get_model():
+    """Devuelve la versión activa del modelo (``ModelVersion``)."""
+    return get_model_manager().active()
+
+
+def _resolve_city_label(inmueble, entrada):
+    if ("latitude" in inmueble) != ("longitude" in inmueble):
+        raise ValueError("Se deben indicar latitude y longitude juntas")
+    if "ciudad" not in inmueble and "latitude" in inmueble and "longitude" in inmueble:
+        coincidencia = nearest_city(inmueble["latitude"], inmueble["longitude"])
+        if coincidencia is None:
+            raise ValueError(f"Ninguna ciudad soportada cerca de ({inmueble['latitude']}, {inmueble['longitude']})")
+        return coincidencia.city_label
+    coincidencia = resolve_city(entrada["ciudad"])
+    if coincidencia is None:
+        raise ValueError(f"Ciudad no encontrada: {entrada['ciudad']!r}")
+    # Sin coordenadas, el inmueble se sitúa en el centro de su ciudad y no en el valor por defecto
+    if "latitude" not in inmueble and coincidencia.slug in CENTROS_CIUDADES:
+        entrada["latitude"], entrada["longitude"], _ = CENTROS_CIUDADES[coincidencia.slug]
+    return coincidencia.city_label
+
+
+def score_properties(model, inmuebles, tasa_descuento=TASA_DESCUENTO_OBJETIVO,
+                     horizonte=HORIZONTE_ANALISIS_ANOS, feature_names=None, gestor=None, version_modelo=None):
+    """
+    Calcula precio por noche y TIR de una lista de inmuebles con una sola
+    llamada al modelo y una sola resolución vectorizada de la TIR.
+
+    inmuebles: Lista de diccionarios con los campos de ``VALORES_POR_DEFECTO``.
+    feature_names: Variables del modelo (por defecto, ``price_model_features.pkl``).
+    gestor: ``ModelManager`` opcional; la petición se envía a su evaluación en
+    sombra como en la aplicación, atribuida a ``version_modelo``.
+    Los inmuebles que no pueden valorarse (p. ej. con una ciudad desconocida)
+    devuelven ``{"error": ...}`` en su posición y el resto se valora igual.
+    """
+    entradas = [{**VALORES_POR_DEFECTO, **inmueble} for inmueble in inmuebles]
+    if feature_names is None:
+        feature_names = load_feature_names()
+
+    priors = load_priors()
+    # Con candidata en sombra se construyen también las variables que solo usa ella
+    columnas_amenidades = uses_amenity_columns(gestor.required_features() if gestor else feature_names)
+    resultados = [None] * len(inmuebles)
+    filas, validos = [], []
+    with metrics.stage("build_features"):
+        for i, (inmueble, entrada) in enumerate(zip(inmuebles, entradas)):
+            try:
+                city_label = _resolve_city_label(inmueble, entrada)
+                prior = priors.get(city_label) if priors else None
+                if prior and prior["ocupacion"] is not None and "ocupacion_anual_porcentaje" not in inmueble:
+                    entrada["ocupacion_anual_porcentaje"] = prior["ocupacion"]
+                for nombre in COLUMNAS_FINANCIERAS:
+                    entrada[nombre] = float(entrada[nombre])
+                fila = build_features(
+                    entrada["latitude"], entrada["longitude"], city_label, entrada["room_type"],
+                    entrada["accommodates"], entrada["bathrooms"], entrada["bedrooms"], entrada["beds"],
+                    entrada["minimum_nights"], entrada["maximum_nights"], entrada["amenities"],
+                    columnas_amenidades=columnas_amenidades,
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                resultados[i] = {"error": str(e)}
+                continue
+            filas.append(fila)
+            validos.append(i)
+
+    if not filas:
+        return resultados
+
+    X = pd.DataFrame(filas)
+    inicio = time.perf_counter()
+    with metrics.stage("get_price"):
+        precios = predict_prices(model, X, feature_names)
+    if gestor is not None:
+        gestor.shadow(X, precios, time.perf_counter() - inicio, version_modelo)
+
+    financieros = pd.DataFrame([entradas[i] for i in validos], columns=COLUMNAS_FINANCIERAS)
+    inversion_inmueble = financieros["inversion_inmueble"].to_numpy(dtype=np.float64)
+    inversion_amueblar = financieros["inversion_amueblar"].to_numpy(dtype=np.float64)
+    ocupacion = financieros["ocupacion_anual_porcentaje"].to_numpy(dtype=np.float64)
+    costos = financieros["costos_operacion_anuales"].to_numpy(dtype=np.float64)
+    flujo_anual = annual_net_cash_flow(precios, ocupacion, costos)
+    with metrics.stage("calculate_irr"):
+        tir, converged = solve_level_annuity_irr(inversion_inmueble + inversion_amueblar, flujo_anual,
+                                                 inversion_inmueble, horizonte)
+    equilibrio = break_even_targets(tasa_descuento, precios, ocupacion, inversion_inmueble, inversion_amueblar,
+                                    costos, horizonte)
+
+    def valor(x):
+        return x if np.isfinite(x) else None
+
+    for j, (i, precio, tasa, ok) in enumerate(zip(validos, precios.tolist(), tir.tolist(), converged.tolist())):
+        # Igual que en la aplicación: sin precio positivo no hay rentabilidad
+        tasa = tasa if ok and precio > 0 else None
+        resultados[i] = {
+            "precio_noche": precio,
+            "tir": tasa,
+            "supera_objetivo": None if tasa is None else tasa > tasa_descuento,
+            **{nombre: valor(float(valores[j])) for nombre, valores in equilibrio.items()},
+        }
+    return resultados
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """Atiende las peticiones JSON del servicio."""
+
+    protocol_version = "HTTP/1.1"
+    verbose = False
+
+    def _send(self, status, cuerpo, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        if self.path == "/health":
+            modelo = _gestor.active() if _gestor is not None else None
+            estado_modelo = _gestor.stats() if _gestor is not None else {}
+            self._send_json(200, {
+                "status": "ok",
+                "modelo_cargado": modelo is not None,
+                "version_modelo": estado_modelo.get("version"),
+                "version_candidata": estado_modelo.get("candidata"),
+                "cambios_modelo": estado_modelo.get("cambios", 0),
+                "inferencia_compilada": isinstance(modelo.model if modelo else None, CompiledTreeEnsemble),
+                "pid": os.getpid(),
+                "carga_modelo": ultima_carga,
+                "rss_mb": rss_mb(),
+                "metricas": metrics.is_enabled(),
+            })
+        elif self.path == "/metrics":
+            self._send(200, metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": f"Ruta desconocida: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._send_json(404, {"error": f"Ruta desconocida: {self.path}"})
+            return
+
+        try:
+            longitud = int(self.headers.get("Content-Length", 0))
+            peticion = json.loads(self.rfile.read(longitud) or b"null")
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {"error": "El cuerpo de la petición no es JSON válido"})
+            return
+
+        es_lote = isinstance(peticion, list)
+        inmuebles = peticion if es_lote else [peticion]
+        if not all(isinstance(inmueble, dict) for inmueble in inmuebles):
+            self._send_json(400, {"error": "Se esperaba un objeto o una lista de objetos"})
+            return
+        if len(inmuebles) > TAMANO_MAXIMO_LOTE:
+            self._send_json(413, {"error": f"Máximo {TAMANO_MAXIMO_LOTE} inmuebles por petición"})
+            return
+
+        try:
+            gestor = get_model_manager()
+            # Toda la petición usa la misma versión aunque entretanto se active otra
+            modelo = gestor.active()
+            with metrics.request("score", inmuebles=len(inmuebles), version_modelo=modelo.version):
+                resultados = score_properties(
+                    modelo.model, inmuebles, feature_names=modelo.feature_names,
+                    gestor=gestor, version_modelo=modelo.version,
+                ) if inmuebles else []
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except RuntimeError as e:
+            self._send_json(503, {"error": str(e)})
+            return
+        except Exception as e:
+            # Cualquier otro fallo responde 500 en lugar de cortar la conexión sin respuesta
+            logger.exception("Error al valorar %d inmuebles", len(inmuebles))
+            self._send_json(500, {"error": f"Error interno: {type(e).__name__}"})
+            return
+
+        if not es_lote and "error" in resultados[0]:
+            self._send_json(400, resultados[0])
+            return
+        self._send_json(200, resultados if es_lote else resultados[0])
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host="127.0.0.1", port=8000, workers=1, model_path=MODEL_PATH, verbose=False,
+          registry_path=REGISTRY_PATH):
+    """
+    Carga el modelo y atiende peticiones. Con ``workers > 1`` (solo POSIX) el
+    proceso principal crea el socket y lanza procesos hijo que lo comparten;
+    el modelo se carga antes del ``fork``, así que no se deserializa por proceso.
+    Después, cada proceso comprueba el registro por su cuenta y cambia de
+    versión en caliente.
+    """
+    gestor = ModelManager(ModelRegistry(registry_path), model_path)
+    set_model_manager(gestor)
+    gestor.active()
+
+    ScoringHandler.verbose = verbose
+    server = ThreadingHTTPServer((host, port), ScoringHandler)
+    print(f"🚀 Servicio escuchando en http://{host}:{port} con {workers} proceso(s)")
+
+    hijos = []
+    if workers > 1 and hasattr(os, "fork"):
+        for _ in range(workers - 1):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    server.serve_forever()
+                finally:
+                    os._exit(0)
+            hijos.append(pid)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for pid in hijos:
+            try:
+                os.kill(pid, 15)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP de valoración de SmartRental")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--model", default=MODEL_PATH, help="Ruta del modelo (.pkl) si el registro no tiene CURRENT")
+    parser.add_argument("--registry", default=REGISTRY_PATH, help="Directorio del registro de modelos")
+    parser.add_argument("--verbose", action="store_true", help="Registrar cada petición")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.model, args.verbose, args.registry)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Modo de riesgo: simulación Monte Carlo de la rentabilidad.
+
+En lugar de una única TIR calculada con un precio por noche y una ocupación
+fijos, se muestrean muchas trayectorias de ocupación, precio (alrededor de la
+predicción del modelo), costes de operación y valor de salida del inmueble, y
+se calculan de una vez las distribuciones de TIR y VAN con el motor vectorizado.
+
+``simulate_monthly_returns`` muestrea los mismos escenarios sobre el modelo
+mensual detallado (``smartrental.monthly``), por bloques de trayectorias para
+acotar la memoria de las matrices de flujos mensuales.
+"""
+import numpy as np
+
+from smartrental.cashflows import annual_net_cash_flow
+from smartrental.irr import level_annuity_npv, solve_level_annuity_irr
+from smartrental.monthly import monthly_cash_flows, monthly_returns
+
+N_TRAYECTORIAS = 100_000
+
+# Dispersión por defecto de cada variable muestreada
+VOLATILIDAD_PRECIO = 0.15      # desviación relativa del precio por noche
+VOLATILIDAD_OCUPACION = 0.10   # desviación absoluta de la ocupación (0-1)
+VOLATILIDAD_COSTOS = 0.10      # desviación relativa de los costes anuales
+VOLATILIDAD_SALIDA = 0.20      # desviación relativa del valor de venta final
+
+PERCENTILES = (10, 50, 90)
+
+# Trayectorias por llamada al modelo mensual (cada una es una fila de 12 * horizonte + 1 flujos)
+TRAYECTORIAS_POR_BLOQUE = 20_000
+
+
+def _lognormal_factor(rng, volatilidad, n):
+    """Factor multiplicativo lognormal de media 1."""
+    return np.exp(volatilidad * rng.standard_normal(n) - 0.5 * volatilidad ** 2)
+
+
+def sample_scenarios(precio_noche, ocupacion, costos_operacion_anuales, inversion_inmueble,
+                     n_paths=N_TRAYECTORIAS, seed=None,
+                     volatilidad_precio=VOLATILIDAD_PRECIO,
+                     volatilidad_ocupacion=VOLATILIDAD_OCUPACION,
+                     volatilidad_costos=VOLATILIDAD_COSTOS,
+                     volatilidad_salida=VOLATILIDAD_SALIDA):
+    """
+    Muestrea ``n_paths`` escenarios alrededor de los valores de partida.
+
+    Devuelve un diccionario de arrays con ``precio_noche``, ``ocupacion``,
+    ``costos_operacion_anuales`` y ``valor_salida``.
+    """
+    rng = np.random.default_rng(seed)
+    return {
+        "precio_noche": precio_noche * _lognormal_factor(rng, volatilidad_precio, n_paths),
+        "ocupacion": np.clip(ocupacion + volatilidad_ocupacion * rng.standard_normal(n_paths), 0.0, 1.0),
+        "costos_operacion_anuales": costos_operacion_anuales * _lognormal_factor(rng, volatilidad_costos, n_paths),
+        "valor_salida": inversion_inmueble * _lognormal_factor(rng, volatilidad_salida, n_paths),
+    }
+
+
+def simulate_returns(precio_noche, ocupacion, costos_operacion_anuales, inversion_inmueble,
+                     inversion_amueblar, horizonte=10, tasa_descuento=0.10,
+                     n_paths=N_TRAYECTORIAS, seed=None, **volatilidades):
+    """
+    Simula la TIR y el VAN del proyecto con la misma estructura de flujos que
+    la sección de resultados: inversión inicial, ``horizonte - 1`` flujos netos
+    anuales y el valor de venta del inmueble al final.
+
+    ``volatilidades`` admite los mismos parámetros ``volatilidad_*`` que
+    ``sample_scenarios``.
+
+    Devuelve un diccionario con:
+    - ``tir`` y ``van``: arrays con el resultado de cada trayectoria
+      (``tir`` es ``nan`` en las trayectorias sin TIR).
+    - ``tir_percentiles`` y ``van_percentiles``: P10/P50/P90.
+    - ``prob_supera_objetivo``: probabilidad de que la TIR supere ``tasa_descuento``.
+    - ``prob_van_negativo``: probabilidad de perder dinero a esa tasa.
+    """
+    escenarios = sample_scenarios(
+        precio_noche, ocupacion, costos_operacion_anuales, inversion_inmueble,
+        n_paths=n_paths, seed=seed, **volatilidades
+    )
+
+    flujo_anual = annual_net_cash_flow(
+        escenarios["precio_noche"], escenarios["ocupacion"], escenarios["costos_operacion_anuales"]
+    )
+    inversion_total = inversion_inmueble + inversion_amueblar
+
+    tir, converged = solve_level_annuity_irr(
+        inversion_total, flujo_anual, escenarios["valor_salida"], horizonte
+    )
+    tir = np.where(converged, tir, np.nan)
+    van = level_annuity_npv(tasa_descuento, inversion_total, flujo_anual,
+                            escenarios["valor_salida"], horizonte)
+    return _resumen(tir, van, tasa_descuento)
+
+
+def simulate_monthly_returns(precio_noche, ocupacion, costos_operacion_anuales, inversion_inmueble,
+                             inversion_amueblar, horizonte=10, tasa_descuento=0.10,
+                             n_paths=N_TRAYECTORIAS, seed=None, parametros_mensuales=None,
+                             trayectorias_por_bloque=TRAYECTORIAS_POR_BLOQUE, **volatilidades):
+    """
+    Igual que ``simulate_returns``, pero cada trayectoria se valora con
+    ``monthly_cash_flows`` y los ``parametros_mensuales`` de la aplicación
+    (hipoteca, impuestos, estacionalidad...). La variación del valor de venta
+    se aplica a la revalorización anual del inmueble, de modo que el precio de
+    venta de la trayectoria es el del modelo mensual por el factor muestreado.
+    """
+    parametros = dict(parametros_mensuales or {})
+    escenarios = sample_scenarios(
+        precio_noche, ocupacion, costos_operacion_anuales, inversion_inmueble,
+        n_paths=n_paths, seed=seed, **volatilidades
+    )
+    revalorizacion = parametros.pop("revalorizacion_anual", 0.0)
+    factor_salida = escenarios["valor_salida"] / inversion_inmueble
+    escenarios["revalorizacion_anual"] = (1 + revalorizacion) * factor_salida ** (1 / horizonte) - 1
+
+    tir, van = np.empty(n_paths), np.empty(n_paths)
+    for inicio in range(0, n_paths, trayectorias_por_bloque):
+        bloque = slice(inicio, inicio + trayectorias_por_bloque)
+        flujos = monthly_cash_flows(
+            escenarios["precio_noche"][bloque], escenarios["ocupacion"][bloque],
+            escenarios["costos_operacion_anuales"][bloque], inversion_inmueble, inversion_amueblar, horizonte,
+            revalorizacion_anual=escenarios["revalorizacion_anual"][bloque], **parametros
+        )
+        rendimientos = monthly_returns(flujos, tasa_descuento)
+        tir[bloque], van[bloque] = rendimientos["tir"], rendimientos["van"]
+    return _resumen(tir, van, tasa_descuento)
+
+
+def _resumen(tir, van, tasa_descuento):
+    """Percentiles y probabilidades de las TIR y VAN simulados."""
+    # Las trayectorias sin TIR se cuentan como resultados por debajo de cualquier
+    # percentil para no sesgar la distribución al alza.
+    tir_ordenable = np.where(np.isnan(tir), -np.inf, tir)
+    return {
+        "tir": tir,
+        "van": van,
+        "tir_percentiles": dict(zip(PERCENTILES, np.percentile(tir_ordenable, PERCENTILES, method="lower").tolist())),
+        "van_percentiles": dict(zip(PERCENTILES, np.percentile(van, PERCENTILES).tolist())),
+        "prob_supera_objetivo": float(np.mean(tir_ordenable > tasa_descuento)),
+        "prob_van_negativo": float(np.mean(van < 0)),
+    }
@@ -0,0 +1,369 @@
+"""
+Almacén persistente de escenarios en SQLite.
+
+Cada escenario calculado se guarda con sus datos de entrada, el diccionario
+``data`` que recibió el modelo, el precio por noche, los flujos de caja y la
+TIR, junto con la versión del modelo que lo valoró (``model_version``). Como
+la caché en disco, es opcional: solo se usa si ``SMARTRENTAL_STORE`` indica
+el fichero (p. ej. ``./data/scenarios.sqlite``). El fichero usa el modo WAL,
+de modo que varios procesos del servidor pueden leer y escribir a la vez.
+
+El recálculo es incremental: los precios se guardan además por huella de las
+variables del modelo y versión (tabla ``predicciones``). Si solo cambia un
+dato financiero (costes, ocupación, inversión...), el precio se reutiliza y
+únicamente se rehacen los flujos y la TIR. Cuando cambia el modelo, todos los
+escenarios guardados con otra versión se vuelven a valorar con una sola
+llamada a ``predict_prices`` por bloque. Los escenarios cuyas variables
+guardadas no incluyen todas las que pide el nuevo modelo (p. ej. las
+``amenity_*`` de un modelo entrenado por amenidad) no pueden revalorarse: se
+quedan sin precio y con el motivo en la columna ``error``.
+
+    python -m smartrental.store reprice
+    python -m smartrental.store list
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from smartrental.cache import _canonical, scenario_key
+from smartrental.cashflows import HORIZONTE_ANALISIS_ANOS, TASA_DESCUENTO_OBJETIVO, annual_net_cash_flow
+from smartrental.irr import solve_level_annuity_irr
+from smartrental.monthly import MESES_POR_ANO, monthly_cash_flows, monthly_returns
+from smartrental.pricing import TAMANO_BLOQUE, load_feature_names, predict_prices
+
+STORE_PATH = os.environ.get("SMARTRENTAL_STORE") or None
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS escenarios (
+    clave TEXT PRIMARY KEY,
+    nombre TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    entradas TEXT NOT NULL,
+    features TEXT NOT NULL,
+    clave_features TEXT NOT NULL,
+    version_modelo TEXT,
+    precio_noche REAL,
+    flujos_caja TEXT,
+    tir REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS escenarios_version ON escenarios (version_modelo);
+CREATE TABLE IF NOT EXISTS predicciones (
+    clave_features TEXT NOT NULL,
+    version_modelo TEXT NOT NULL,
+    precio_noche REAL NOT NULL,
+    PRIMARY KEY (clave_features, version_modelo)
+);
+"""
+
+
+def features_key(data):
+    """Huella de las variables del modelo: mismo ``data``, mismo precio con el mismo modelo."""
+    return scenario_key(data)
+
+
+def _json(valor):
+    return json.dumps(_canonical(valor), separators=(",", ":"))
+
+
+def _annual_returns(precios, entradas):
+    """Flujos (lista por fila) y TIR del modelo anual, con la misma forma que ``build_cash_flows``."""
+    inversion_inmueble = entradas["inversion_inmueble"].to_numpy(dtype=np.float64)
+    inversion_total = inversion_inmueble + entradas["inversion_amueblar"].to_numpy(dtype=np.float64)
+    flujo_anual = annual_net_cash_flow(precios, entradas["ocupacion_anual_porcentaje"].to_numpy(dtype=np.float64),
+                                       entradas["costos_operacion_anuales"].to_numpy(dtype=np.float64))
+    horizonte = int(entradas["horizonte_analisis_anos"].iloc[0])
+    tir, converged = solve_level_annuity_irr(inversion_total, flujo_anual, inversion_inmueble, horizonte)
+    flujos = np.empty((len(precios), horizonte + 1))
+    flujos[:, 0] = -inversion_total
+    flujos[:, 1:-1] = flujo_anual[:, np.newaxis]
+    flujos[:, -1] = inversion_inmueble
+    return flujos, np.where(converged, tir, np.nan)
+
+
+def _monthly_returns(precios, entradas):
+    """Flujos y TIR del modelo mensual, con los parámetros de cada escenario."""
+    parametros = pd.DataFrame(list(entradas["parametros_mensuales"]), index=entradas.index)
+    estacionalidad = None
+    if "estacionalidad" in parametros:
+        # Los escenarios sin datos de la ciudad no tienen estacionalidad
+        estacionalidad = np.stack([np.asarray(e, dtype=np.float64) if isinstance(e, (list, tuple))
+                                   else np.ones(MESES_POR_ANO) for e in parametros.pop("estacionalidad")])
+    flujos = monthly_cash_flows(
+        precios, entradas["ocupacion_anual_porcentaje"].to_numpy(dtype=np.float64),
+        entradas["costos_operacion_anuales"].to_numpy(dtype=np.float64),
+        entradas["inversion_inmueble"].to_numpy(dtype=np.float64),
+        entradas["inversion_amueblar"].to_numpy(dtype=np.float64),
+        int(entradas["horizonte_analisis_anos"].iloc[0]), estacionalidad=estacionalidad,
+        **{nombre: parametros[nombre].to_numpy(dtype=np.float64) for nombre in parametros.columns},
+    )
+    tasa = float(entradas["tasa_descuento_objetivo"].iloc[0])
+    return flujos, monthly_returns(flujos, tasa)["tir"]
+
+
+def scenario_returns(precios, entradas):
+    """
+    Flujos de caja y TIR de varios escenarios con la misma lógica que la
+    aplicación: modelo anual o, si ``parametros_mensuales`` no es ``None``,
+    el mensual. Se resuelven por grupos (horizonte, tasa y modelo) en lotes.
+
+    precios: Precio por noche de cada escenario.
+    entradas: DataFrame con los datos financieros de ``ScenarioStore.save``.
+    Devuelve ``(flujos, tir)``: una lista de flujos (``None`` sin precio
+    positivo) y un array de TIR (``nan`` si no existe).
+    """
+    precios = np.asarray(precios, dtype=np.float64)
+    entradas = entradas.reset_index(drop=True).copy()
+    if "parametros_mensuales" not in entradas:
+        entradas["parametros_mensuales"] = None
+    entradas["horizonte_analisis_anos"] = entradas.get("horizonte_analisis_anos", HORIZONTE_ANALISIS_ANOS)
+    entradas["tasa_descuento_objetivo"] = entradas.get("tasa_descuento_objetivo", TASA_DESCUENTO_OBJETIVO)
+    flujos = [None] * len(entradas)
+    tir = np.full(len(entradas), np.nan)
+
+    mensual = entradas["parametros_mensuales"].notna()
+    validas = precios > 0
+    for (horizonte, tasa, es_mensual), grupo in entradas[validas].groupby(
+            ["horizonte_analisis_anos", "tasa_descuento_objetivo", mensual[validas]]):
+        calcular = _monthly_returns if es_mensual else _annual_returns
+        flujos_grupo, tir_grupo = calcular(precios[grupo.index], grupo)
+        tir[grupo.index] = tir_grupo
+        for i, fila in zip(grupo.index, flujos_grupo.tolist()):
+            flujos[i] = fila
+    return flujos, tir
+
+
+def _missing_message(faltantes, mostradas=5):
+    resto = f" y {len(faltantes) - mostradas} más" if len(faltantes) > mostradas else ""
+    return f"Faltan variables del modelo: {', '.join(faltantes[:mostradas])}{resto}"
+
+
+class ScenarioStore:
+    """
+    Escenarios y precios guardados en un fichero SQLite, seguro entre hilos
+    (una conexión protegida con un cerrojo) y entre procesos (modo WAL).
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conexion:
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.executescript(ESQUEMA)
+            columnas = {fila[1] for fila in self._conexion.execute("PRAGMA table_info(escenarios)")}
+            if "error" not in columnas:
+                # Ficheros creados antes de la columna ``error``
+                self._conexion.execute("ALTER TABLE escenarios ADD COLUMN error TEXT")
+        self.precios_reutilizados = 0
+        self.precios_calculados = 0
+
+    # --- Precios por huella de variables ---
+
+    def get_price(self, clave_features, version_modelo):
+        """Precio ya calculado para estas variables con este modelo, o ``None``."""
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT precio_noche FROM predicciones WHERE clave_features = ? AND version_modelo = ?",
+                (clave_features, version_modelo),
+            ).fetchone()
+            if fila is None:
+                return None
+            self.precios_reutilizados += 1
+            return fila[0]
+
+    def put_price(self, clave_features, version_modelo, precio_noche):
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO predicciones VALUES (?, ?, ?)",
+                (clave_features, version_modelo, float(precio_noche)),
+            )
+            self.precios_calculados += 1
+
+    # --- Escenarios ---
+
+    def save(self, clave, entradas, data, version_modelo, precio_noche, flujos_caja, tir, nombre=None):
+        """
+        Guarda (o actualiza) un escenario.
+
+        entradas: Datos financieros (inversiones, costes, ocupación, tasa,
+        horizonte y ``parametros_mensuales`` si se usó el modelo mensual).
+        data: Diccionario de variables que recibió el modelo.
+        """
+        ahora = time.time()
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                """
+                INSERT INTO escenarios VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
+                ON CONFLICT (clave) DO UPDATE SET
+                    nombre = COALESCE(excluded.nombre, nombre), actualizado = excluded.actualizado,
+                    version_modelo = excluded.version_modelo, precio_noche = excluded.precio_noche,
+                    flujos_caja = excluded.flujos_caja, tir = excluded.tir, error = NULL
+                """,
+                (clave, nombre, ahora, ahora, _json(entradas), _json(data), features_key(data), version_modelo,
+                 float(precio_noche), None if flujos_caja is None else _json(flujos_caja),
+                 None if tir is None or not np.isfinite(tir) else float(tir)),
+            )
+
+    def get(self, clave):
+        """Escenario guardado como diccionario, o ``None``."""
+        with self._lock:
+            cursor = self._conexion.execute("SELECT * FROM escenarios WHERE clave = ?", (clave,))
+            fila = cursor.fetchone()
+            columnas = [c[0] for c in cursor.description]
+        if fila is None:
+            return None
+        escenario = dict(zip(columnas, fila))
+        for campo in ("entradas", "features", "flujos_caja"):
+            if escenario[campo] is not None:
+                escenario[campo] = json.loads(escenario[campo])
+        return escenario
+
+    def list(self, limite=50):
+        """Últimos escenarios actualizados, sin los flujos ni las variables."""
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT clave, nombre, creado, actualizado, version_modelo, precio_noche, tir, error, entradas "
+                "FROM escenarios ORDER BY actualizado DESC LIMIT ?",
+                self._conexion, params=(limite,),
+            )
+
+    def delete(self, clave):
+        with self._lock, self._conexion:
+            self._conexion.execute("DELETE FROM escenarios WHERE clave = ?", (clave,))
+
+    def count_failed(self, version_modelo):
+        """Escenarios que no se pudieron revalorar con este modelo."""
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT COUNT(*) FROM escenarios WHERE version_modelo IS ? AND error IS NOT NULL", (version_modelo,)
+            ).fetchone()[0]
+
+    def count_stale(self, version_modelo):
+        """Escenarios valorados con otro modelo."""
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT COUNT(*) FROM escenarios WHERE version_modelo IS NOT ?", (version_modelo,)
+            ).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            escenarios = self._conexion.execute("SELECT COUNT(*) FROM escenarios").fetchone()[0]
+            predicciones = self._conexion.execute("SELECT COUNT(*) FROM predicciones").fetchone()[0]
+        return {"escenarios": escenarios, "predicciones": predicciones,
+                "precios_reutilizados": self.precios_reutilizados, "precios_calculados": self.precios_calculados}
+
+    def reprice(self, model, version_modelo, feature_names=None, filas_por_bloque=TAMANO_BLOQUE, trabajo=None):
+        """
+        Vuelve a valorar con ``model`` los escenarios guardados con otra
+        versión: un ``predict_prices`` y una resolución de la TIR por bloque.
+        Borra los precios de versiones anteriores. Devuelve los escenarios
+        actualizados.
+
+        Los escenarios a los que les faltan variables del modelo se marcan con
+        la nueva versión, sin precio y con el motivo en ``error``, para no
+        detener el resto ni volver a intentarlo con el mismo modelo.
+
+        trabajo: ``Job`` opcional para informar del progreso y poder cancelar.
+        """
+        if feature_names is None:
+            feature_names = load_feature_names()
+        total = self.count_stale(version_modelo)
+        actualizados = procesados = 0
+        while True:
+            with self._lock:
+                pendientes = self._conexion.execute(
+                    "SELECT clave, entradas, features FROM escenarios WHERE version_modelo IS NOT ? LIMIT ?",
+                    (version_modelo, filas_por_bloque),
+                ).fetchall()
+            if not pendientes:
+                break
+            variables = [json.loads(f) for _, _, f in pendientes]
+            faltantes = [[nombre for nombre in feature_names if nombre not in v] for v in variables]
+            fallidos = [(clave, f) for (clave, _, _), f in zip(pendientes, faltantes) if f]
+            validos = [i for i, f in enumerate(faltantes) if not f]
+            claves = [pendientes[i][0] for i in validos]
+            variables = [variables[i] for i in validos]
+
+            precios, flujos, tir = np.empty(0), [], np.empty(0)
+            if validos:
+                entradas = pd.DataFrame([json.loads(pendientes[i][1]) for i in validos])
+                precios = predict_prices(model, pd.DataFrame(variables), feature_names)
+                flujos, tir = scenario_returns(precios, entradas)
+
+            ahora = time.time()
+            with self._lock, self._conexion:
+                self._conexion.executemany(
+                    "UPDATE escenarios SET version_modelo = ?, precio_noche = ?, flujos_caja = ?, tir = ?, "
+                    "error = NULL, actualizado = ? WHERE clave = ?",
+                    [(version_modelo, float(p), None if f is None else _json(f),
+                      float(t) if np.isfinite(t) else None, ahora, clave)
+                     for clave, p, f, t in zip(claves, precios, flujos, tir)],
+                )
+                self._conexion.executemany(
+                    "UPDATE escenarios SET version_modelo = ?, precio_noche = NULL, flujos_caja = NULL, "
+                    "tir = NULL, error = ?, actualizado = ? WHERE clave = ?",
+                    [(version_modelo, _missing_message(f), ahora, clave) for clave, f in fallidos],
+                )
+                self._conexion.executemany(
+                    "INSERT OR REPLACE INTO predicciones VALUES (?, ?, ?)",
+                    [(features_key(v), version_modelo, float(p)) for v, p in zip(variables, precios)],
+                )
+            actualizados += len(claves)
+            procesados += len(pendientes)
+            if trabajo is not None:
+                trabajo.report(procesados / max(total, 1), f"{procesados:,} escenarios revalorados")
+                trabajo.check_cancelled()
+
+        with self._lock, self._conexion:
+            self._conexion.execute("DELETE FROM predicciones WHERE version_modelo IS NOT ?", (version_modelo,))
+        return actualizados
+
+    def close(self):
+        with self._lock:
+            self._conexion.close()
+
+
+def main():
+    from smartrental.compiled import optimize_model
+    from smartrental.model import MODEL_PATH, load_model_file, model_version
+
+    parser = argparse.ArgumentParser(description="Almacén de escenarios")
+    parser.add_argument("--store", default=STORE_PATH, required=STORE_PATH is None,
+                        help="Fichero SQLite (por defecto, SMARTRENTAL_STORE)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    revalorar = sub.add_parser("reprice", help="Vuelve a valorar los escenarios con el modelo actual")
+    revalorar.add_argument("--model", default=MODEL_PATH)
+
+    listar = sub.add_parser("list", help="Muestra los últimos escenarios")
+    listar.add_argument("--limite", type=int, default=20)
+
+    args = parser.parse_args()
+    store = ScenarioStore(args.store)
+    if args.comando == "reprice":
+        version = model_version(args.model)
+        model = optimize_model(load_model_file(args.model))
+        inicio = time.perf_counter()
+        n = store.reprice(model, version)
+        fallidos = store.count_failed(version)
+        print(f"✅ {n:,} escenarios revalorados con {version} en {time.perf_counter() - inicio:.2f} s"
+              + (f" ({fallidos:,} sin las variables del modelo)" if fallidos else ""))
+    else:
+        escenarios = store.list(args.limite).drop(columns=["entradas"])
+        for columna in ("creado", "actualizado"):
+            escenarios[columna] = pd.to_datetime(escenarios[columna], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+        print(escenarios.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
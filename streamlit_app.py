@@ -3,6 +3,9 @@ import streamlit as st
 # --- 3. Título y Descripción de la Aplicación ---
 st.set_page_config(layout="centered", page_title="SmartRental") # Configuración de la página
 
+# Contador de ejecuciones completas del script (visible en el panel de depuración)
+st.session_state.ejecuciones_script = st.session_state.get("ejecuciones_script", 0) + 1
+
 st.markdown("""
     <style>
     /* Cambiar los chips de multiselect (rojo por defecto) a azul */
@@ -16,347 +19,153 @@ st.markdown("""
     div[data-baseweb="tag"] svg {
         color: white !important;
     }
+
+    /* Reducir espacios en el mapa y entre elementos */
+    .stApp > div[data-testid="stVerticalBlock"] > div[data-testid="stVerticalBlock"] {
+        gap: 0.5rem;
+    }
+    
+    /* Reducir margen del mapa */
+    iframe[title="streamlit_folium.st_folium"] {
+        margin-bottom: 0 !important;
+    }
+    
+    /* Reducir espacios entre elementos */
+    .element-container {
+        margin-bottom: 0.5rem !important;
+    }
+
+    /* Botón principal */
+    div.stButton > button:first-child {
+        background-color: #4099c6;
+        color: white;
+        border: none;
+        padding: 0.6em 1.2em;
+        border-radius: 0.5em;
+        font-weight: bold;
+    }
+    div.stButton > button:first-child:hover {
+        background-color: #4099c6;
+        color: white;
+    }
     </style>
 """, unsafe_allow_html=True)
 
+import hmac
+import io
+import os
+import time
 import pandas as pd
+import altair as alt
 import folium
+from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 import numpy as np
-import random # Para generar un precio aleatorio
-import pickle
-from scipy.optimize import newton # Para el cálculo de TIR
-
-# app.py (en la parte superior de tu script, después de los imports)
-
-CIUDADES_DISPONIBLES = [
-    "Seattle",
-    "Sicily", 
-    "South Aegean",
-    "Barwon South West Vic",
-    "Madrid",
-    "Pacific Grove",
-    "Belize",
-    "San Mateo County",
-    "Northern Rivers",
-    "Mid North Coast",
-    "Columbus",
-    "Quebec City",
-    "Greater Manchester",
-    "Sunshine Coast",
-    "Salem Or",
-    "Ghent",
-    "Mornington Peninsula",
-    "Barossa Valley",
-    "New Brunswick",
-    "Victoria",
-    "Broward County",
-    "Rhode Island",
-    "Montreal",
-    "Toronto",
-    "Vancouver",
-    "Ottawa",
-    "Winnipeg",
-    "Albany",
-    "Asheville",
-    "Austin",
-    "Boston",
-    "Bozeman",
-    "Cambridge",
-    "Chicago",
-    "Clark County Nv",
-    "Dallas",
-    "Denver",
-    "Fort Worth",
-    "Hawaii",
-    "Jersey City",
-    "Los Angeles",
-    "Nashville",
-    "New Orleans",
-    "New York City",
-    "Newark",
-    "Oakland",
-    "Portland",
-    "Vienna",
-    "Antwerp",
-    "Brussels",
-    "Copenhagen",
-    "Bordeaux",
-    "Athens",
-    "Crete",
-    "Thessaloniki",
-    "Bologna",
-    "Florence",
-    "Naples",
-    "Venice",
-    "Lisbon",
-    "Stockholm",
-    "Vaud",
-    "Edinburgh",
-    "Western Australia",
-    "Singapore",
-    "Twin Cities Msa",
-    "Washington Dc",
-    "Rome",
-    "Rochester",
-    "San Diego",
-    "San Francisco",
-    "Santa Clara County",
-    "Santa Cruz County",
-    "Lyon",
-    "Paris",
-    "Pays Basque",
-    "Berlin",
-    "Munich",
-    "Dublin",
-    "Bergamo",
-    "Milan",
-    "Puglia",
-    "Trentino",
-    "Riga",
-    "Oslo",
-    "Porto",
-    "Barcelona",
-    "Euskadi",
-    "Girona",
-    "Malaga",
-    "Mallorca",
-    "Menorca",
-    "Sevilla",
-    "Valencia",
-    "Geneva",
-    "Zurich",
-    "Bristol",
-    "London",
-    "Cape Town",
-    "Brisbane",
-    "Melbourne",
-    "Sydney",
-    "Tasmania",
-    "Hong Kong",
-    "Tokyo",
-    "Bangkok",
-    "Buenos Aires",
-    "Rio De Janeiro",
-    "Santiago",
-    "Mexico City",
-    "Budapest"
-]
-
-city_mapping = {
-    "seattle": 1,
-    "sicily": 2,
-    "south-aegean": 3,
-    "barwon-south-west-vic": 4,
-    "madrid": 5,
-    "pacific-grove": 6,
-    "belize": 7,
-    "san-mateo-county": 8,
-    "northern-rivers": 9,
-    "mid-north-coast": 10,
-    "columbus": 11,
-    "quebec-city": 12,
-    "greater-manchester": 13,
-    "sunshine-coast": 14,
-    "salem-or": 15,
-    "ghent": 16,
-    "mornington-peninsula": 17,
-    "barossa-valley": 18,
-    "new-brunswick": 19,
-    "victoria": 20,
-    "broward-county": 21,
-    "rhode-island": 22,
-    "montreal": 23,
-    "toronto": 24,
-    "vancouver": 25,
-    "ottawa": 26,
-    "winnipeg": 27,
-    "albany": 28,
-    "asheville": 29,
-    "austin": 30,
-    "boston": 31,
-    "bozeman": 32,
-    "cambridge": 33,
-    "chicago": 34,
-    "clark-county-nv": 35,
-    "dallas": 36,
-    "denver": 37,
-    "fort-worth": 38,
-    "hawaii": 39,
-    "jersey-city": 40,
-    "los-angeles": 41,
-    "nashville": 42,
-    "new-orleans": 43,
-    "new-york-city": 44,
-    "newark": 45,
-    "oakland": 46,
-    "portland": 47,
-    "vienna": 48,
-    "antwerp": 49,
-    "brussels": 50,
-    "copenhagen": 51,
-    "bordeaux": 52,
-    "athens": 53,
-    "crete": 54,
-    "thessaloniki": 55,
-    "bologna": 56,
-    "florence": 57,
-    "naples": 58,
-    "venice": 59,
-    "lisbon": 60,
-    "stockholm": 61,
-    "vaud": 62,
-    "edinburgh": 63,
-    "western-australia": 64,
-    "singapore": 65,
-    "twin-cities-msa": 66,
-    "washington-dc": 67,
-    "rome": 68,
-    "rochester": 69,
-    "san-diego": 70,
-    "san-francisco": 71,
-    "santa-clara-county": 72,
-    "santa-cruz-county": 73,
-    "lyon": 74,
-    "paris": 75,
-    "pays-basque": 76,
-    "berlin": 77,
-    "munich": 78,
-    "dublin": 79,
-    "bergamo": 80,
-    "milan": 81,
-    "puglia": 82,
-    "trentino": 83,
-    "riga": 84,
-    "oslo": 85,
-    "porto": 86,
-    "barcelona": 87,
-    "euskadi": 88,
-    "girona": 89,
-    "malaga": 90,
-    "mallorca": 91,
-    "menorca": 92,
-    "sevilla": 93,
-    "valencia": 94,
-    "geneva": 95,
-    "zurich": 96,
-    "bristol": 97,
-    "london": 98,
-    "cape-town": 99,
-    "brisbane": 100,
-    "melbourne": 101,
-    "sydney": 102,
-    "tasmania": 103,
-    "hong-kong": 104,
-    "tokyo": 105,
-    "bangkok": 106,
-    "buenos-aires": 107,
-    "rio-de-janeiro": 108,
-    "santiago": 109,
-    "mexico-city": 110,
-    "budapest": 111
-}
-
-import re
-
-def normalize_city_name(city_name):
-    """
-    Normaliza el nombre de la ciudad para hacer coincidencias.
-    Convierte a minúsculas, reemplaza espacios por guiones, y elimina caracteres especiales.
-    """
-    if not city_name:
-        return ""
-    
-    # Convertir a minúsculas
-    normalized = city_name.lower()
-    
-    # Reemplazar espacios y caracteres especiales por guiones
-    normalized = re.sub(r'[\s\-_]+', '-', normalized)
-    
-    # Eliminar caracteres especiales excepto guiones
-    normalized = re.sub(r'[^\w\-]', '', normalized)
-    
-    # Eliminar guiones múltiples
-    normalized = re.sub(r'-+', '-', normalized)
-    
-    # Eliminar guiones al inicio y final
-    normalized = normalized.strip('-')
-    
-    return normalized
-
+from smartrental.amenities import amenities_por_categoria, amenity_traducciones
+from smartrental.amenity_bits import uses_amenity_columns # Modelos entrenados por amenidad
+from smartrental.cache import ScenarioCache, scenario_key
+from smartrental.cashflows import HORIZONTE_ANALISIS_ANOS, TASA_DESCUENTO_OBJETIVO, build_cash_flows
+from smartrental.cities import CIUDADES_DISPONIBLES, nearest_city, resolve_city
+from smartrental.comparables import ComparablesIndex # Comparables cercanos por ciudad
+from smartrental.compiled import CompiledTreeEnsemble # Inferencia compilada
+from smartrental.features import TIPOS_ALOJAMIENTO, build_features
+from smartrental.irr import solve_irr # Para el cálculo de TIR
+from smartrental.jobs import JobPool, JobPoolFull # Cálculos en segundo plano
+from smartrental import metrics # Instrumentación opcional (SMARTRENTAL_METRICS=1)
+from smartrental.model import MODEL_PATH, ultima_carga
+from smartrental.portfolio import evaluate_portfolio, rank_results, write_ranking # Carteras desde CSV/Parquet
+from smartrental.pricing import predict_prices # Valoración por lotes
+from smartrental.monthly import (annual_summary, monthly_break_even_targets, monthly_cash_flows, # Modelo mensual detallado
+                                 monthly_returns)
+from smartrental.priors import load_priors # Ocupación y precios de referencia por ciudad
+from smartrental.recommender import recommend_amenities # Qué amenidades añadir
+from smartrental.registry import REGISTRY_PATH, ModelManager, ModelRegistry # Versiones del modelo
+from smartrental.sensitivity import break_even_price, break_even_targets, sensitivity_axes, sensitivity_grid
+from smartrental.simulation import simulate_monthly_returns, simulate_returns # Modo de riesgo Monte Carlo
+from smartrental.store import STORE_PATH, ScenarioStore, features_key # Escenarios guardados en SQLite
+
+# Desglose de tiempos de esta ejecución del script (no hace nada si las métricas están desactivadas)
+# Cierra como interrumpida la de una ejecución anterior que acabó con st.rerun() o st.stop()
+peticion_script = metrics.start_request("script", raiz=True, ejecucion=st.session_state.ejecuciones_script)
 
 costos_operacion_porcentaje = .5
 
 
-tasa_descuento_objetivo = .10
+tasa_descuento_objetivo = TASA_DESCUENTO_OBJETIVO
 
-horizonte_analisis_anos = 10
+horizonte_analisis_anos = HORIZONTE_ANALISIS_ANOS
 
 
 @st.cache_resource
-def load_model():
+def get_model_manager():
     """
-    Carga el modelo de ML una sola vez y lo mantiene en caché.
-    Se ejecuta solo la primera vez o cuando cambia el archivo del modelo.
+    Gestor del modelo del proceso: la versión activa del registro
+    (SMARTRENTAL_REGISTRY) o, si no hay registro, MODEL_PATH. Comprueba cada
+    pocos segundos si hay otra versión y la cambia en caliente, sin reiniciar
+    el servidor; si hay candidata, la evalúa en sombra.
+    """
+    return ModelManager(ModelRegistry(REGISTRY_PATH), MODEL_PATH)
+
+
+def get_active_model():
+    """
+    Versión activa del modelo. Solo la primera sesión del proceso espera a la
+    carga; las demás reciben el modelo ya cargado.
     """
-    filename = "price_model.pkl"
-    model_path = f"./{filename}"
-    
     try:
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
-        
-        print(f"✅ Modelo cargado: {model_path}")
-        return model
-    except FileNotFoundError:
-        st.error(f"❌ No se encontró el archivo del modelo: {model_path}")
+        return get_model_manager().active()
+    except FileNotFoundError as e:
+        st.error(f"❌ No se encontró el archivo del modelo: {e.filename or MODEL_PATH}")
         return None
     except Exception as e:
         st.error(f"❌ Error al cargar el modelo: {e}")
         return None
 
 
-def get_price(features_dict):
+# Precarga del modelo al abrir la aplicación, no al pulsar el botón de cálculo.
+# Toda la ejecución usa esta versión aunque entretanto se active otra.
+modelo_activo = get_active_model()
+version_modelo = modelo_activo.version if modelo_activo is not None else None
+gestor_modelos = get_model_manager()
+
+
+def load_model():
+    """Modelo de ML de esta ejecución del script."""
+    return modelo_activo.model if modelo_activo is not None else None
+
+
+def get_price(features_dict, model=None, feature_names=None):
     features_df = pd.DataFrame([features_dict])
-    model = load_model()
-    result = model.predict(features_df)
+    if model is None:
+        model = load_model()
+        feature_names = modelo_activo.feature_names
+    inicio = time.perf_counter()
+    with metrics.stage("get_price"):
+        result = predict_prices(model, features_df, feature_names)
+    # Una muestra de las peticiones se valora también con el modelo candidato, en otro hilo
+    gestor_modelos.shadow(features_df, result, time.perf_counter() - inicio)
 
     return result[0]
 
-# --- 2. Funciones de Cálculo de TIR (Tasa Interna de Retorno) ---
 
-def npv_function(tir_guess, flujos):
-    """
-    Función que representa el VAN (Valor Actual Neto) para el cálculo de TIR.
-    tir_guess: Es la tasa que estamos probando.
-    flujos: Una lista o array de los flujos de caja del proyecto.
-    """
-    npv = 0
-    for i, flujo in enumerate(flujos):
-        npv += flujo / (1 + tir_guess)**i
-    return npv
+# --- 2. Funciones de Cálculo de TIR (Tasa Interna de Retorno) ---
 
 def calculate_irr(cash_flows):
     """
     Función para calcular la TIR.
-    Utiliza el método de Newton para encontrar la raíz de la función VAN.
+    Usa la vía rápida de renta constante cuando los flujos tienen esa forma
+    (la habitual en esta aplicación) y Newton con bisección de respaldo si no.
+    Se ejecuta en el pool de trabajos, así que no escribe en la página: devuelve
+    ``None`` si no hay TIR y la sección de resultados lo explica.
     """
-    try:
-        # Intentamos un valor inicial para la TIR. Si hay un flujo negativo inicial,
-        # y luego positivos, la TIR debería ser computable.
-        irr = newton(lambda r: npv_function(r, cash_flows), 0.10)
-        return irr
-    except RuntimeError:
-        # En caso de que el método de Newton no converja
-        st.warning("No se pudo encontrar una TIR. Esto puede ocurrir si los flujos de caja son inconsistentes (ej. todos positivos o todos negativos después de la inversión).")
-        return None
-    except ZeroDivisionError:
-        # En caso de flujos de caja inconsistentes
-        st.warning("Error matemático al calcular la TIR. Verifique los flujos de caja.")
-        return None
-    except Exception as e:
-        st.error(f"Ocurrió un error inesperado al calcular la TIR: {e}")
+    with metrics.stage("calculate_irr"):
+        irr, converged = solve_irr(cash_flows)
+
+    if not converged[0]:
+        # En caso de que ningún método encuentre la raíz del VAN (ej. todos los
+        # flujos positivos o todos negativos después de la inversión)
         return None
+    return float(irr[0])
 
 
 # --- 3. Título y Descripción de la Aplicación ---
@@ -396,25 +205,11 @@ ciudad = st.multiselect(
     help="Seleccione la ciudad donde se encuentra el inmueble."
 )
 
-# CSS para reducir espacios
-st.markdown("""
-    <style>
-    /* Reducir espacios en el mapa */
-    .stApp > div[data-testid="stVerticalBlock"] > div[data-testid="stVerticalBlock"] {
-        gap: 0.5rem;
-    }
-    
-    /* Reducir margen del mapa */
-    iframe[title="streamlit_folium.st_folium"] {
-        margin-bottom: 0 !important;
-    }
-    
-    /* Reducir espacios entre elementos */
-    .element-container {
-        margin-bottom: 0.5rem !important;
-    }
-    </style>
-""", unsafe_allow_html=True)
+ciudad_resuelta = resolve_city(ciudad[0]) if ciudad else None
+city_label = ciudad_resuelta.city_label if ciudad_resuelta else None
+city_priors = load_priors()
+prior_ciudad = city_priors.get(city_label) if city_priors else None
+ocupacion_prior = prior_ciudad["ocupacion"] if prior_ciudad else None
 
 st.markdown("<h3 style='font-size:22px;'>📍 Ubicación del inmueble</h3>", unsafe_allow_html=True)
 
@@ -424,123 +219,225 @@ if 'latitude' not in st.session_state:
 if 'longitude' not in st.session_state:
     st.session_state.longitude = 2.1734
 
-# Opción de selección de ubicación
-ubicacion_metodo = st.radio(
-    "¿Cómo prefieres indicar la ubicación?",
-    ["🗺️ Seleccionar en el mapa", "📝 Introducir coordenadas manualmente"],
-    help="Elige la forma más cómoda para ti de indicar la ubicación"
-)
 
-if ubicacion_metodo == "🗺️ Seleccionar en el mapa":
-    st.info("💡 **Tip:** Haz clic en el mapa para seleccionar la ubicación exacta de tu propiedad")
-    
-    # Crear mapa con folium
-    m = folium.Map(
-        location=[st.session_state.latitude, st.session_state.longitude],
-        zoom_start=12,
-        width="100%",
-        height=400
-    )
-    
-    # Agregar marcador en la posición actual
+def actualizar_desde_mapa():
+    """
+    Callback del mapa: copia el punto clicado a las coordenadas antes de que
+    se vuelva a ejecutar el selector, así un clic cuesta una sola ejecución.
+    """
+    clic = (st.session_state.get("location_map") or {}).get("last_clicked")
+    if clic:
+        st.session_state.latitude = clic["lat"]
+        st.session_state.longitude = clic["lng"]
+        st.session_state.lat_input = clic["lat"]
+        st.session_state.lng_input = clic["lng"]
+
+
+def actualizar_desde_campos():
+    """Callback de los campos de coordenadas del modo mapa."""
+    st.session_state.latitude = st.session_state.lat_input
+    st.session_state.longitude = st.session_state.lng_input
+
+
+def marcador_propiedad(lat, lng, popup, color, tooltip=None):
+    """
+    Capa con el marcador de la propiedad. Se envía al mapa como capa dinámica,
+    de modo que al moverlo no se vuelve a generar ni serializar el mapa base.
+    """
+    grupo = folium.FeatureGroup(name="Propiedad")
     folium.Marker(
-        [st.session_state.latitude, st.session_state.longitude],
-        popup="📍 Tu propiedad",
-        tooltip="Ubicación seleccionada",
-        icon=folium.Icon(color='red', icon='home')
-    ).add_to(m)
-    
-    # Mostrar mapa y capturar clics
-    map_data = st_folium(
-        m,
-        key="location_map",
-        width=700,
-        height=400
-    )
-    
-    # Actualizar coordenadas si se hizo clic en el mapa
-    if map_data['last_clicked'] is not None:
-        st.session_state.latitude = map_data['last_clicked']['lat']
-        st.session_state.longitude = map_data['last_clicked']['lng']
-        st.rerun()  # Recargar para actualizar el mapa
-    
-    # Campos de coordenadas que se actualizan con el mapa
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        new_latitude = st.number_input(
-            "📍 Latitud",
-            value=st.session_state.latitude,
-            format="%.6f",
-            help="Coordenada de latitud (Norte-Sur). Cambia automáticamente al hacer clic en el mapa.",
-            key="lat_input"
-        )
-    
-    with col2:
-        new_longitude = st.number_input(
-            "📍 Longitud", 
-            value=st.session_state.longitude,
-            format="%.6f",
-            help="Coordenada de longitud (Este-Oeste). Cambia automáticamente al hacer clic en el mapa.",
-            key="lng_input"
-        )
-    
-    # Actualizar session_state si se cambiaron manualmente las coordenadas
-    if new_latitude != st.session_state.latitude or new_longitude != st.session_state.longitude:
-        st.session_state.latitude = new_latitude
-        st.session_state.longitude = new_longitude
-        st.rerun()  # Recargar para actualizar el mapa
-
-else:
-    # Opción manual con mejor UX
-    st.info("💡 **Tip:** Puedes obtener las coordenadas desde Google Maps: clic derecho → 'Ver coordenadas'")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        latitude = st.number_input(
-            "📍 Latitud",
-            min_value=-90.0,
-            max_value=90.0,
-            value=st.session_state.latitude,
-            format="%.6f",
-            help="Ejemplo: 41.385064 (para Barcelona). Rango válido: -90 a 90"
-        )
-    
-    with col2:
-        longitude = st.number_input(
-            "📍 Longitud",
-            min_value=-180.0, 
-            max_value=180.0,
-            value=st.session_state.longitude,
-            format="%.6f",
-            help="Ejemplo: 2.173404 (para Barcelona). Rango válido: -180 a 180"
-        )
-    
-    # Actualizar session_state
-    st.session_state.latitude = latitude
-    st.session_state.longitude = longitude
-    
-    # Mostrar ubicación seleccionada en mapa
-    if latitude and longitude:
-        preview_map = folium.Map(
-            location=[latitude, longitude],
-            zoom_start=15,
-            width=700,
-            height=300
-        )
-        
+        [lat, lng],
+        popup=popup,
+        tooltip=tooltip,
+        icon=folium.Icon(color=color, icon='home')
+    ).add_to(grupo)
+    return grupo
+
+
+@st.cache_resource
+def get_comparables_index():
+    """Índice de comparables compartido; cada ciudad se carga la primera vez que se consulta."""
+    return ComparablesIndex()
+
+
+def mostrar_comparables(ciudad_comparables, lat, lng):
+    """Anuncios más cercanos a la ubicación, agrupados en el mapa."""
+    indice = get_comparables_index()
+    if not ciudad_comparables or not indice.available(ciudad_comparables):
+        st.caption(f"No hay datos de comparables para {ciudad_comparables or 'esta ciudad'}.")
+        return
+
+    with metrics.stage("comparables"):
+        comparables = indice.nearest(ciudad_comparables, lat, lng)
+    if comparables.empty:
+        st.caption("No se encontraron anuncios cercanos.")
+        return
+
+    col_precio, col_ocupacion, col_distancia = st.columns(3)
+    col_precio.metric("Precio mediano", f"{comparables['price'].median():.0f} $")
+    col_ocupacion.metric("Ocupación mediana", f"{comparables['occupancy'].median():.0%}")
+    col_distancia.metric("Radio", f"{comparables['distancia_km'].max():.2f} km")
+
+    mapa = folium.Map(location=[lat, lng], zoom_start=15, width=700, height=350)
+    grupo = MarkerCluster(name="Comparables").add_to(mapa)
+    for fila in comparables.itertuples():
         folium.Marker(
-            [latitude, longitude],
-            popup="📍 Ubicación seleccionada",
-            icon=folium.Icon(color='blue', icon='home')
-        ).add_to(preview_map)
-        
-        st.caption("📍 Vista previa de la ubicación:")
-        st_folium(preview_map, width=700, height=300, key="preview_map")
+            [fila.latitude, fila.longitude],
+            tooltip=f"{fila.price:.0f} $ · {fila.occupancy:.0%} · {fila.distancia_km:.2f} km",
+            icon=folium.Icon(color="green", icon="bed", prefix="fa")
+        ).add_to(grupo)
+    marcador_propiedad(lat, lng, "📍 Tu propiedad", "red").add_to(mapa)
+    with metrics.stage("mapa"):
+        st_folium(mapa, width=700, height=350, key="comparables_map", returned_objects=[])
 
-# Mostrar coordenadas finales
-st.success(f"📍 **Coordenadas seleccionadas:** {st.session_state.latitude:.6f}, {st.session_state.longitude:.6f}")
+
+@st.fragment
+def selector_ubicacion():
+    """
+    Selector de ubicación. Al ser un fragmento, los clics en el mapa solo
+    re-ejecutan esta función y no el script completo.
+    """
+    st.session_state.ejecuciones_selector = st.session_state.get("ejecuciones_selector", 0) + 1
+    # Al re-ejecutarse solo el fragmento no hay una petición del script abierta
+    peticion_fragmento = None if metrics.current_request() else metrics.start_request("fragmento_ubicacion")
+
+    # Opción de selección de ubicación
+    ubicacion_metodo = st.radio(
+        "¿Cómo prefieres indicar la ubicación?",
+        ["🗺️ Seleccionar en el mapa", "📝 Introducir coordenadas manualmente"],
+        help="Elige la forma más cómoda para ti de indicar la ubicación"
+    )
+
+    if ubicacion_metodo == "🗺️ Seleccionar en el mapa":
+        st.info("💡 **Tip:** Haz clic en el mapa para seleccionar la ubicación exacta de tu propiedad")
+
+        # El mapa base se crea una vez por sesión; el centro y el marcador se
+        # actualizan dinámicamente sin volver a enviar el mapa al navegador
+        if "mapa_base" not in st.session_state:
+            st.session_state.mapa_base = folium.Map(
+                location=[st.session_state.latitude, st.session_state.longitude],
+                zoom_start=12,
+                width="100%",
+                height=400
+            )
+
+        # Mostrar mapa y capturar clics
+        with metrics.stage("mapa"):
+            st_folium(
+                st.session_state.mapa_base,
+                key="location_map",
+                width=700,
+                height=400,
+                center=(st.session_state.latitude, st.session_state.longitude),
+                feature_group_to_add=marcador_propiedad(
+                    st.session_state.latitude, st.session_state.longitude,
+                    "📍 Tu propiedad", "red", tooltip="Ubicación seleccionada"
+                ),
+                returned_objects=["last_clicked"],
+                on_change=actualizar_desde_mapa
+            )
+
+        # Los campos pueden haberse descartado si se usó el modo manual
+        if "lat_input" not in st.session_state:
+            st.session_state.lat_input = st.session_state.latitude
+        if "lng_input" not in st.session_state:
+            st.session_state.lng_input = st.session_state.longitude
+
+        # Campos de coordenadas que se actualizan con el mapa
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.number_input(
+                "📍 Latitud",
+                format="%.6f",
+                help="Coordenada de latitud (Norte-Sur). Cambia automáticamente al hacer clic en el mapa.",
+                key="lat_input",
+                on_change=actualizar_desde_campos
+            )
+
+        with col2:
+            st.number_input(
+                "📍 Longitud",
+                format="%.6f",
+                help="Coordenada de longitud (Este-Oeste). Cambia automáticamente al hacer clic en el mapa.",
+                key="lng_input",
+                on_change=actualizar_desde_campos
+            )
+
+    else:
+        # Opción manual con mejor UX
+        st.info("💡 **Tip:** Puedes obtener las coordenadas desde Google Maps: clic derecho → 'Ver coordenadas'")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            latitude = st.number_input(
+                "📍 Latitud",
+                min_value=-90.0,
+                max_value=90.0,
+                value=st.session_state.latitude,
+                format="%.6f",
+                help="Ejemplo: 41.385064 (para Barcelona). Rango válido: -90 a 90"
+            )
+
+        with col2:
+            longitude = st.number_input(
+                "📍 Longitud",
+                min_value=-180.0,
+                max_value=180.0,
+                value=st.session_state.longitude,
+                format="%.6f",
+                help="Ejemplo: 2.173404 (para Barcelona). Rango válido: -180 a 180"
+            )
+
+        # Actualizar session_state
+        st.session_state.latitude = latitude
+        st.session_state.longitude = longitude
+        st.session_state.pop("lat_input", None)
+        st.session_state.pop("lng_input", None)
+
+        # Mostrar ubicación seleccionada en mapa
+        if latitude and longitude:
+            if "mapa_preview" not in st.session_state:
+                st.session_state.mapa_preview = folium.Map(
+                    location=[latitude, longitude],
+                    zoom_start=15,
+                    width=700,
+                    height=300
+                )
+
+            st.caption("📍 Vista previa de la ubicación:")
+            with metrics.stage("mapa"):
+                st_folium(
+                    st.session_state.mapa_preview,
+                    width=700,
+                    height=300,
+                    key="preview_map",
+                    center=(latitude, longitude),
+                    feature_group_to_add=marcador_propiedad(latitude, longitude, "📍 Ubicación seleccionada", "blue"),
+                    returned_objects=[]
+                )
+
+    # Mostrar coordenadas finales
+    st.success(f"📍 **Coordenadas seleccionadas:** {st.session_state.latitude:.6f}, {st.session_state.longitude:.6f}")
+
+    # Aviso si el punto cae en otra ciudad soportada distinta de la elegida
+    ciudad_punto = nearest_city(st.session_state.latitude, st.session_state.longitude)
+    ciudad_elegida = st.session_state.get("ciudad_comparables")
+    if ciudad_punto and ciudad_elegida and ciudad_punto.nombre != ciudad_elegida:
+        st.warning(f"⚠️ La ubicación parece estar en **{ciudad_punto.nombre}** "
+                   f"(a {ciudad_punto.distancia_km:.0f} km del centro), no en {ciudad_elegida}. "
+                   "Revisa la ciudad seleccionada.")
+
+    # Dentro del fragmento para que se actualice con cada clic en el mapa
+    if st.checkbox("🏘️ Mostrar comparables cercanos", help="Anuncios más cercanos a la ubicación con su precio y ocupación"):
+        mostrar_comparables(st.session_state.get("ciudad_comparables"),
+                            st.session_state.latitude, st.session_state.longitude)
+    metrics.finish_request(peticion_fragmento)
+
+
+st.session_state.ciudad_comparables = ciudad[0] if ciudad else None
+selector_ubicacion()
 
 # Variables que puedes usar en el resto de tu código
 latitude = st.session_state.latitude
@@ -548,7 +445,7 @@ longitude = st.session_state.longitude
 
 room_type = st.selectbox(
     "Tipo de alojamiento:",
-    ["Piso entero", "Habitación privada"],
+    TIPOS_ALOJAMIENTO,
     help="Seleccione el tipo de alojamiento que desee."
 )
 
@@ -602,48 +499,6 @@ max_nights = st.number_input(
 # --- 5. Selección de amenidades ---
 st.markdown("<h2 style='font-size:28px;'>2. Selección de amenidades</h2>", unsafe_allow_html=True)
 
-# --- Diccionario: categorías y sus amenities (claves internas) ---
-amenities_por_categoria = {
-    "Tecnología y Entretenimiento": ["wifi", "tv", "sound_system", "streaming_services", "game_console"],
-    "Seguridad": ["security_guard", "security_system", "window_guards", "lockbox", "smoke_alarm", "carbon_monoxide_alarm", "first_aid_kit", "fire_extinguisher", "lock_on_bedroom_door"],
-    "Baño y Bienestar": ["spa_access", "bathtub", "body_soap", "shampoo", "conditioner", "shower_gel", "vegan_shampoo", "vegan_conditioner", "vegan_soap", "hair_dryer", "essentials"],
-    "Lavandería y Limpieza": ["washer", "dryer", "iron", "housekeeping"],
-    "Vistas y Espacios Exteriores": ["garden", "balcony", "waterfront", "shared_backyard", "mountain_view", "hammock"],
-    "Accesibilidad y Movilidad": ["parking", "free_parking", "elevator", "luggage_dropoff", "long_term_stays", "private_entrance"],
-    "Climatización y Confort": ["air_conditioning", "heating", "workspace", "hot_water_kettle", "pool", "hot_tub", "sauna"],
-    "Cocina y Comida": ["kitchen", "coffee_maker", "microwave", "refrigerator", "dishwasher", "oven", "toaster", "blender", "waiststaff", "bar", "breakfast_bar", "bread_maker", "gas_stove", "electric_stove", "induction_stove", "chef_service", "bbq_grill"],
-    "Deporte, Salud y Ocio": ["exercise_equipment", "ski_in_ski_out", "ski_in_out", "golf_course_view", "gym", "sports_court", "table_sports", "board_games", "bicycle"],
-    "Familia y Bebé": ["children_books_toys", "baby_bath", "baby_monitor", "crib", "baby_care"]
-}
-
-# --- Traducciones de amenities al español ---
-amenity_traducciones = {
-    "wifi": "WiFi", "tv": "Televisión", "sound_system": "Sistema de sonido", "streaming_services": "Servicios de streaming",
-    "game_console": "Consola de videojuegos", "security_guard": "Guardia de seguridad", "security_system": "Sistema de seguridad",
-    "window_guards": "Rejas en ventanas", "lockbox": "Caja de seguridad", "smoke_alarm": "Detector de humo",
-    "carbon_monoxide_alarm": "Detector de monóxido de carbono", "first_aid_kit": "Botiquín de primeros auxilios",
-    "fire_extinguisher": "Extintor", "lock_on_bedroom_door": "Cerradura en dormitorio", "spa_access": "Acceso a spa",
-    "bathtub": "Bañera", "body_soap": "Jabón corporal", "shampoo": "Champú", "conditioner": "Acondicionador",
-    "shower_gel": "Gel de ducha", "vegan_shampoo": "Champú vegano", "vegan_conditioner": "Acondicionador vegano",
-    "vegan_soap": "Jabón vegano", "hair_dryer": "Secador de pelo", "essentials": "Esenciales (toallas, sábanas)",
-    "washer": "Lavadora", "dryer": "Secadora", "iron": "Plancha", "housekeeping": "Servicio de limpieza",
-    "garden": "Jardín", "balcony": "Balcón", "waterfront": "Frente al mar", "shared_backyard": "Patio compartido",
-    "mountain_view": "Vista a la montaña", "hammock": "Hamaca", "parking": "Estacionamiento",
-    "free_parking": "Estacionamiento gratuito", "elevator": "Ascensor", "luggage_dropoff": "Depósito de equipaje",
-    "long_term_stays": "Estancias largas", "private_entrance": "Entrada privada", "air_conditioning": "Aire acondicionado",
-    "heating": "Calefacción", "workspace": "Zona de trabajo", "hot_water_kettle": "Hervidor de agua", "pool": "Piscina",
-    "hot_tub": "Jacuzzi", "sauna": "Sauna", "kitchen": "Cocina", "coffee_maker": "Cafetera", "microwave": "Microondas",
-    "refrigerator": "Refrigerador", "dishwasher": "Lavavajillas", "oven": "Horno", "toaster": "Tostadora", "blender": "Licuadora",
-    "waiststaff": "Personal de cocina", "bar": "Bar", "breakfast_bar": "Desayunador", "bread_maker": "Panificadora",
-    "gas_stove": "Cocina a gas", "electric_stove": "Cocina eléctrica", "induction_stove": "Cocina de inducción",
-    "chef_service": "Servicio de chef", "bbq_grill": "Parrilla", "exercise_equipment": "Equipo de ejercicio",
-    "ski_in_ski_out": "Acceso directo a pistas de esquí", "ski_in_out": "Acceso a esquí",
-    "golf_course_view": "Vista al campo de golf", "gym": "Gimnasio", "sports_court": "Cancha deportiva",
-    "table_sports": "Juegos de mesa", "board_games": "Juegos de tablero", "bicycle": "Bicicletas",
-    "children_books_toys": "Juguetes y libros infantiles", "baby_bath": "Bañera para bebé",
-    "baby_monitor": "Vigilabebés", "crib": "Cuna", "baby_care": "Cuidados para bebé"
-}
-
 # --- Selector tipo checkbox (como en la imagen que enviaste) ---
 st.markdown("<h3 style='font-size:22px;'>Tipo de amenidades</h3>", unsafe_allow_html=True)
 categorias_seleccionadas = []
@@ -665,7 +520,7 @@ for categoria in categorias_seleccionadas:
     )
     amenities_seleccionadas[categoria] = seleccionadas
 
-print(amenities_seleccionadas)
+metrics.annotate(amenities={categoria: len(lista) for categoria, lista in amenities_seleccionadas.items()})
 
 # --- 6. Costes de inversión (usuario) ---
 st.markdown("<h2 style='font-size:28px;'>3. Costes de inversión</h2>", unsafe_allow_html=True)
@@ -688,139 +543,814 @@ costos_operacion_anuales = st.number_input(
     help="Incluye gastos como notaría, impuestos, gestoría, etc."
 )
 
+modelo_mensual = st.checkbox(
+    "Modelo mensual detallado (hipoteca, impuestos, estacionalidad)",
+    help="Calcula la rentabilidad mes a mes con financiación, gastos variables, ocupación estacional, "
+         "revalorización, impuestos y costes de venta, en lugar del modelo anual simplificado."
+)
+
+parametros_mensuales = {}
+if modelo_mensual:
+    with st.expander("Parámetros del modelo mensual", expanded=True):
+        col_a, col_b = st.columns(2)
+        with col_a:
+            parametros_mensuales["costos_operacion_porcentaje"] = st.slider(
+                "Gastos variables (% de los ingresos):", 0, 80, int(costos_operacion_porcentaje * 100),
+                help="Comisiones de plataforma, limpieza, suministros y gestión."
+            ) / 100
+            parametros_mensuales["porcentaje_financiado"] = st.slider(
+                "Financiación (% del inmueble):", 0, 90, 0,
+                help="Parte del precio del inmueble pagada con hipoteca."
+            ) / 100
+            parametros_mensuales["tipo_hipoteca"] = st.number_input(
+                "Tipo de interés de la hipoteca (%):", min_value=0.0, max_value=20.0, value=3.5, step=0.1,
+                disabled=parametros_mensuales["porcentaje_financiado"] == 0
+            ) / 100
+            parametros_mensuales["plazo_hipoteca_anos"] = st.number_input(
+                "Plazo de la hipoteca (años):", min_value=1, max_value=40, value=25,
+                disabled=parametros_mensuales["porcentaje_financiado"] == 0
+            )
+        with col_b:
+            parametros_mensuales["actualizacion_anual"] = st.number_input(
+                "Subida anual de precios y costes (%):", min_value=-10.0, max_value=20.0, value=2.0, step=0.5
+            ) / 100
+            parametros_mensuales["revalorizacion_anual"] = st.number_input(
+                "Revalorización anual del inmueble (%):", min_value=-10.0, max_value=20.0, value=2.0, step=0.5
+            ) / 100
+            parametros_mensuales["tipo_impositivo"] = st.number_input(
+                "Impuesto sobre el rendimiento neto (%):", min_value=0.0, max_value=60.0, value=19.0, step=1.0,
+                help="Se aplica cada año sobre ingresos menos gastos, intereses y la amortización del inmueble."
+            ) / 100
+            parametros_mensuales["tipo_plusvalias"] = st.number_input(
+                "Impuesto sobre la plusvalía al vender (%):", min_value=0.0, max_value=60.0, value=21.0, step=1.0
+            ) / 100
+            parametros_mensuales["costes_salida_porcentaje"] = st.number_input(
+                "Costes de venta (% del precio de venta):", min_value=0.0, max_value=20.0, value=5.0, step=0.5
+            ) / 100
+        if prior_ciudad:
+            parametros_mensuales["estacionalidad"] = prior_ciudad["estacionalidad"]
+            st.caption(f"La ocupación se reparte por meses con la estacionalidad de {ciudad[0]}.")
+        else:
+            st.caption("Sin datos de estacionalidad para esta ciudad: la ocupación se reparte por igual entre los meses.")
+
 st.markdown("<h2 style='font-size:28px;'>4. Ocupación anual</h2>", unsafe_allow_html=True)
 
+# Al cambiar de ciudad se rellena la ocupación típica de la ciudad; el usuario puede ajustarla
+if "ocupacion_anual_porcentaje" not in st.session_state:
+    st.session_state.ocupacion_anual_porcentaje = 0.7
+if ocupacion_prior is not None and st.session_state.get("ocupacion_prior_ciudad") != city_label:
+    st.session_state.ocupacion_anual_porcentaje = round(ocupacion_prior, 2)
+    st.session_state.ocupacion_prior_ciudad = city_label
+
 ocupacion_anual_porcentaje = st.number_input(
     "Porcentaje de ocupación anual:",
-    min_value=0.0, max_value=1.0, value=0.7, step=0.1, format="%.2f",
-    help="Especifica el porcentaje de ocupación anual, este valor lo puedes consultar en el dashboard para la ciudad escogida"
+    min_value=0.0, max_value=1.0, step=0.1, format="%.2f",
+    key="ocupacion_anual_porcentaje",
+    help=(f"Se rellena con la ocupación mediana de {prior_ciudad['n_anuncios']:,} anuncios en {ciudad[0]}; puedes ajustarla."
+          if ocupacion_prior is not None else "Especifica el porcentaje de ocupación anual esperado para la ciudad escogida.")
 )
 
+st.markdown("<h2 style='font-size:28px;'>5. Análisis de riesgo</h2>", unsafe_allow_html=True)
+
+modo_riesgo = st.checkbox(
+    "Simular escenarios (Monte Carlo)",
+    help="Además de la TIR puntual, simula miles de escenarios de ocupación, precio, costes y valor de venta para estimar el rango de rentabilidad."
+)
+
+if modo_riesgo:
+    with st.expander("Parámetros de la simulación"):
+        n_trayectorias = st.select_slider(
+            "Número de escenarios:",
+            options=[10_000, 50_000, 100_000, 250_000, 500_000],
+            value=100_000
+        )
+        volatilidad_precio = st.slider("Variación del precio por noche (±%):", 0, 50, 15) / 100
+        volatilidad_ocupacion = st.slider("Variación de la ocupación (± puntos):", 0, 30, 10) / 100
+        volatilidad_costos = st.slider("Variación de los costes (±%):", 0, 50, 10) / 100
+        volatilidad_salida = st.slider("Variación del valor de venta (±%):", 0, 50, 20) / 100
+
+modo_sensibilidad = st.checkbox(
+    "Mapa de sensibilidad (ocupación × precio por noche × precio de compra)",
+    help="Muestra cómo cambia la TIR al variar la ocupación, el precio por noche y el precio de compra, con la frontera de rentabilidad."
+)
+
+modo_amenidades = st.checkbox(
+    "Recomendar amenidades",
+    help="Valora cada amenidad que todavía no tiene el inmueble y propone la combinación que más sube la TIR dentro de un presupuesto. El coste de las amenidades se suma a la inversión inicial."
+)
+
+if modo_amenidades:
+    presupuesto_amenidades = st.number_input(
+        "Presupuesto para amenidades nuevas ($):",
+        min_value=0.0, value=float(inversion_amueblar), step=500.0,
+        help="Gasto máximo en amenidades adicionales. Por defecto, la inversión en amueblar."
+    )
+
 
 st.markdown("---")
 
 
-# --- 6. Botón para Calcular ---
-st.markdown("""
-    <style>
-    div.stButton > button:first-child {
-        background-color: #4099c6;
-        color: white;
-        border: none;
-        padding: 0.6em 1.2em;
-        border-radius: 0.5em;
-        font-weight: bold;
-    }
-    div.stButton > button:first-child:hover {
-        background-color: #4099c6;
-        color: white;
-    }
-    </style>
-""", unsafe_allow_html=True)
+def simular_escenarios(trabajo, precio_promedio_noche):
+    """
+    Simula la rentabilidad alrededor de los valores introducidos (en el pool
+    de trabajos), con el modelo mensual si está activado. Devuelve solo los
+    resúmenes y el histograma, no las TIR de cada escenario, para que el
+    resultado guardado en la sesión sea pequeño.
+    """
+    trabajo.report(0.0, f"Simulando {n_trayectorias:,} escenarios...")
+    opciones = {"parametros_mensuales": parametros_mensuales} if modelo_mensual else {}
+    resultado = (simulate_monthly_returns if modelo_mensual else simulate_returns)(
+        precio_promedio_noche, ocupacion_anual_porcentaje, costos_operacion_anuales,
+        inversion_inmueble, inversion_amueblar,
+        horizonte=horizonte_analisis_anos, tasa_descuento=tasa_descuento_objetivo,
+        n_paths=n_trayectorias,
+        seed=0,  # misma semilla: la simulación no cambia al re-ejecutar el script
+        volatilidad_precio=volatilidad_precio,
+        volatilidad_ocupacion=volatilidad_ocupacion,
+        volatilidad_costos=volatilidad_costos,
+        volatilidad_salida=volatilidad_salida,
+        **opciones
+    )
+    tir = resultado.pop("tir")
+    resultado.pop("van")
+    tir_validas = tir[~np.isnan(tir)]
+    resultado["histograma"] = None
+    if tir_validas.size:
+        conteos, bordes = np.histogram(tir_validas, bins=40)
+        resultado["histograma"] = pd.DataFrame(
+            {"Escenarios": conteos},
+            index=pd.Index([f"{b:.1%}" for b in bordes[:-1]], name="TIR")
+        )
+    return resultado
+
+
+def mostrar_simulacion(precio_promedio_noche):
+    """Distribución de TIR y VAN de la simulación (calculada en segundo plano)."""
+    st.markdown("<h3 style='font-size:22px;'>Análisis de riesgo</h3>", unsafe_allow_html=True)
+    clave_simulacion = scenario_key(clave_resultado, n_trayectorias, volatilidad_precio, volatilidad_ocupacion,
+                                    volatilidad_costos, volatilidad_salida)
+    resultado = resultado_en_segundo_plano("simulacion", clave_simulacion, simular_escenarios, precio_promedio_noche)
+    if resultado is None:
+        return
+
+    # Percentiles sin TIR (flujos que nunca recuperan la inversión) se muestran como "—"
+    tir_p = {p: (f"{v:.2%}" if np.isfinite(v) else "—") for p, v in resultado["tir_percentiles"].items()}
+    col_p10, col_p50, col_p90 = st.columns(3)
+    col_p10.metric("TIR P10 (pesimista)", tir_p[10])
+    col_p50.metric("TIR P50 (mediana)", tir_p[50])
+    col_p90.metric("TIR P90 (optimista)", tir_p[90])
+
+    van_p = resultado["van_percentiles"]
+    col_v10, col_v50, col_v90 = st.columns(3)
+    col_v10.metric("VAN P10", f"{van_p[10]:,.0f} $")
+    col_v50.metric("VAN P50", f"{van_p[50]:,.0f} $")
+    col_v90.metric("VAN P90", f"{van_p[90]:,.0f} $")
+
+    st.info(f"📊 Probabilidad de superar la tasa objetivo ({tasa_descuento_objetivo:.2%}): "
+            f"**{resultado['prob_supera_objetivo']:.1%}** · Probabilidad de VAN negativo: "
+            f"**{resultado['prob_van_negativo']:.1%}**")
+
+    if resultado["histograma"] is not None:
+        st.bar_chart(resultado["histograma"])
+
+
+def recomendar_amenidades(trabajo, model):
+    """Ranking de amenidades y combinación dentro del presupuesto (en el pool de trabajos)."""
+    trabajo.report(0.0, "Valorando amenidades...")
+    return recommend_amenities(
+        model, data, amenities_seleccionadas, inversion_inmueble, inversion_amueblar,
+        costos_operacion_anuales, ocupacion_anual_porcentaje, horizonte_analisis_anos,
+        presupuesto=presupuesto_amenidades, feature_names=modelo_activo.feature_names
+    )
 
-if st.button("Calcular precio y rentabilidad 🚀", type="primary"):
-    st.markdown("<h2 style='font-size:28px;'>4. Resultados del Análisis</h2>", unsafe_allow_html=True)
-    city = normalize_city_name(ciudad[0])
+
+def mostrar_recomendaciones():
+    """Amenidades que más mejoran la rentabilidad (calculadas en segundo plano)."""
+    st.markdown("<h3 style='font-size:22px;'>Amenidades recomendadas</h3>", unsafe_allow_html=True)
+    if modelo_mensual:
+        st.caption("Estimación con el modelo anual simplificado: la TIR de partida y las mejoras no incluyen "
+                   "hipoteca, impuestos ni estacionalidad, y no coinciden con la TIR del modelo mensual.")
+    clave_recomendacion = scenario_key(clave_resultado, presupuesto_amenidades)
+    resultado = resultado_en_segundo_plano("amenidades", clave_recomendacion, recomendar_amenidades, load_model())
+    if resultado is None:
+        return
+
+    base, combinacion = resultado["base"], resultado["combinacion"]
+    if combinacion.empty:
+        st.info("Ninguna amenidad dentro del presupuesto mejora la TIR.")
+    else:
+        final = combinacion.iloc[-1]
+        st.success(f"Con **{final['coste_acumulado']:,.0f} $** en {len(combinacion)} amenidades, el precio por noche "
+                   f"pasa de {base['precio_noche']:,.2f} $ a **{final['precio_noche']:,.2f} $** y la TIR de "
+                   f"{base['tir']:.2%} a **{final['tir']:.2%}**.")
+        st.dataframe(
+            combinacion[["nombre", "coste", "coste_acumulado", "precio_noche", "tir"]].rename(columns={
+                "nombre": "Amenidad", "coste": "Coste ($)", "coste_acumulado": "Coste acumulado ($)",
+                "precio_noche": "Precio por noche ($)", "tir": "TIR",
+            }).style.format({"Coste ($)": "{:,.0f}", "Coste acumulado ($)": "{:,.0f}",
+                             "Precio por noche ($)": "{:,.2f}", "TIR": "{:.2%}"}),
+            hide_index=True, use_container_width=True
+        )
+
+    with st.expander("Todas las amenidades, una a una"):
+        individuales = resultado["individuales"][[
+            "nombre", "categoria", "coste", "coste_anual", "incremento_precio", "incremento_tir",
+            "incremento_tir_por_1000", "recuperacion_anos",
+        ]].rename(columns={
+            "nombre": "Amenidad", "categoria": "Categoría", "coste": "Coste ($)", "coste_anual": "Coste anual ($)",
+            "incremento_precio": "Precio por noche (+$)", "incremento_tir": "TIR (+)",
+            "incremento_tir_por_1000": "TIR por cada 1.000 $", "recuperacion_anos": "Recuperación (años)",
+        })
+        st.dataframe(
+            individuales.style.format({
+                "Coste ($)": "{:,.0f}", "Coste anual ($)": "{:,.0f}", "Precio por noche (+$)": "{:+,.2f}",
+                "TIR (+)": "{:+.2%}", "TIR por cada 1.000 $": "{:+.3%}", "Recuperación (años)": "{:,.1f}",
+            }, na_rep="—"),
+            hide_index=True, use_container_width=True
+        )
+
+
+def mostrar_equilibrio(precio_promedio_noche):
+    """
+    Precio, ocupación y precio de compra con los que la TIR iguala la tasa
+    objetivo, con el mismo modelo (anual o mensual) que la TIR mostrada.
+    """
+    if modelo_mensual:
+        objetivo = monthly_break_even_targets(
+            tasa_descuento_objetivo, precio_promedio_noche, ocupacion_anual_porcentaje, costos_operacion_anuales,
+            inversion_inmueble, inversion_amueblar, horizonte_analisis_anos, **parametros_mensuales
+        )
+    else:
+        objetivo = break_even_targets(
+            tasa_descuento_objetivo, precio_promedio_noche, ocupacion_anual_porcentaje, inversion_inmueble,
+            inversion_amueblar, costos_operacion_anuales, horizonte_analisis_anos
+        )
+    precio = float(objetivo["precio_equilibrio"])
+    ocupacion = float(objetivo["ocupacion_minima"])
+    compra = float(objetivo["compra_maxima"])
+    col_precio, col_ocupacion, col_compra = st.columns(3)
+    col_precio.metric(
+        "Precio por noche mínimo", f"{precio:,.2f} $" if np.isfinite(precio) else "—",
+        help="Precio por noche con el que la TIR iguala la tasa objetivo, con la ocupación y los costes actuales."
+    )
+    col_ocupacion.metric(
+        "Ocupación mínima", f"{ocupacion:.1%}" if np.isfinite(ocupacion) and ocupacion <= 1 else "No alcanzable",
+        help="Ocupación anual con la que la TIR iguala la tasa objetivo al precio por noche estimado."
+    )
+    col_compra.metric(
+        "Precio de compra máximo", f"{compra:,.0f} $" if np.isfinite(compra) else "No alcanzable",
+        help="Precio de compra del inmueble por encima del cual la TIR queda por debajo de la tasa objetivo."
+    )
+
+
+def mostrar_modelo_mensual(resultado):
+    """VAN, plazo de recuperación y flujos por año del modelo mensual."""
+    col_van, col_recuperacion = st.columns(2)
+    col_van.metric(f"VAN al {tasa_descuento_objetivo:.0%}", f"{resultado['van']:,.0f} $")
+    meses = resultado["recuperacion_meses"]
+    col_recuperacion.metric(
+        "Recuperación de la inversión",
+        f"{int(meses) // 12} años y {int(meses) % 12} meses" if np.isfinite(meses) else "—",
+        help="Primer mes en el que el flujo acumulado (incluida la venta) deja de ser negativo."
+    )
+
+    resumen = resultado["resumen_anual"].rename(columns={
+        "ingresos": "Ingresos", "costes": "Gastos", "hipoteca": "Hipoteca", "intereses": "Intereses",
+        "impuestos": "Impuestos", "venta_neta": "Venta neta", "flujo_neto": "Flujo neto",
+    })
+    resumen.index = pd.RangeIndex(1, len(resumen) + 1, name="Año")
+    st.bar_chart(resumen[["Flujo neto", "Venta neta"]])
+    with st.expander("Desglose anual"):
+        st.dataframe(resumen.style.format("{:,.0f} $"), use_container_width=True)
+    st.caption("Los valores de equilibrio y la simulación usan este modelo mensual; el mapa de sensibilidad "
+               "y las amenidades recomendadas, el modelo anual simplificado.")
+
+
+@st.cache_resource
+def get_scenario_cache():
+    """
+    Caché de escenarios compartida por todas las sesiones del servidor.
+    Si se define SMARTRENTAL_CACHE_DIR, se comparte también en disco entre procesos.
+    """
+    return ScenarioCache(cache_dir=os.environ.get("SMARTRENTAL_CACHE_DIR"))
+
+
+@st.cache_resource
+def get_job_pool():
+    """
+    Pool de trabajos compartido por todas las sesiones del servidor; limita
+    los cálculos pesados simultáneos (SMARTRENTAL_MAX_TRABAJOS).
+    """
+    return JobPool()
+
+
+@st.cache_resource
+def get_scenario_store():
+    """
+    Almacén SQLite de escenarios compartido por las sesiones del servidor.
+    Solo si se define SMARTRENTAL_STORE con la ruta del fichero.
+    """
+    return ScenarioStore(STORE_PATH) if STORE_PATH else None
+
+
+def _revalorar(trabajo, store, modelo):
+    return store.reprice(modelo.model, modelo.version, modelo.feature_names, trabajo=trabajo)
+
+
+@st.cache_resource
+def revalorar_escenarios(version_modelo, _modelo):
+    """
+    Revalora en el pool de trabajos, una vez por proceso y versión del modelo,
+    los escenarios guardados con un modelo anterior.
+    """
+    return get_job_pool().submit(("revalorar", version_modelo), _revalorar, get_scenario_store(), _modelo)
+
+
+trabajo_revalorar = None
+if get_scenario_store() is not None and modelo_activo is not None:
     try:
-        city_label = city_mapping[city]
-    except:
-        st.error("🚨🚨🚨🚨Ciudad no encontrada🚨🚨🚨🚨")
-        pass
-
-    amenitie_total = sum(len(amenities_seleccionadas.get(categoria, [])) for categoria in [
-        "Accesibilidad y Movilidad", "Baño y Bienestar", "Climatización y Confort", 
-        "Cocina y Comida", "Deporte, Salud y Ocio", "Familia y Bebé", 
-        "Lavandería y Limpieza", "Seguridad", "Tecnología y Entretenimiento", 
-        "Vistas y Espacios Exteriores"
-    ])
-
-    data = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "accommodates": numero_personas,
-        "bathrooms": bathrooms,
-        "bedrooms": bedrooms,
-        "beds": beds,
-        "minimum_nights": min_nights,
-        "maximum_nights": max_nights,
-        "accesibilidad_y_movilidad_count": len(amenities_seleccionadas.get("Accesibilidad y Movilidad", [])),
-        "baño_y_bienestar_count": len(amenities_seleccionadas.get("Baño y Bienestar", [])),
-        "climatización_y_confort_count": len(amenities_seleccionadas.get("Climatización y Confort", [])),
-        "cocina_y_comida_count": len(amenities_seleccionadas.get("Cocina y Comida", [])),
-        "deporte_salud_y_ocio_count": len(amenities_seleccionadas.get("Deporte, Salud y Ocio", [])),
-        "familia_y_bebé_count": len(amenities_seleccionadas.get("Familia y Bebé", [])),
-        "lavandería_y_limpieza_count": len(amenities_seleccionadas.get("Lavandería y Limpieza", [])),
-        "seguridad_count": len(amenities_seleccionadas.get("Seguridad", [])),
-        "tecnología_y_entretenimiento_count": len(amenities_seleccionadas.get("Tecnología y Entretenimiento", [])),
-        "vistas_y_espacios_exteriores_count": len(amenities_seleccionadas.get("Vistas y Espacios Exteriores", [])),
-        "total_amenities_count": amenitie_total,
-        "city_label": city_label,
-        "room_type_entire home/apt": 1 if room_type == "Piso entero" else 0,
-        "room_type_hotel room": 0,
-        "room_type_private room": 1 if room_type == "Habitación privada" else 0,
-        "room_type_shared room": 0
-    }
+        trabajo_revalorar = revalorar_escenarios(version_modelo, modelo_activo)
+    except JobPoolFull:
+        pass  # Se reintenta en la siguiente ejecución: la caché no guarda las excepciones
 
-    precio_promedio_noche = get_price(data)
-    st.markdown(f"""
-<h3 style='font-size:22px;'>
-    Precio promedio por noche estimado: 
-    <strong style='color:#386d79;'>{precio_promedio_noche:,.2f} $</strong>
-</h3>
-""", unsafe_allow_html=True)
 
-    # --- Cálculo de Rentabilidad (TIR) ---
+# Espera antes de mostrar el progreso: los cálculos rápidos se pintan en la misma ejecución
+ESPERA_INICIAL_SEGUNDOS = 0.3
+
+INTERVALO_SONDEO_SEGUNDOS = 0.5
+
+# Trabajos pedidos en esta ejecución; al final del script se cancelan los demás
+trabajos_vigentes = set()
+
+
+@st.fragment(run_every=INTERVALO_SONDEO_SEGUNDOS)
+def mostrar_progreso(trabajo):
+    """
+    Progreso de un trabajo en segundo plano. Es un fragmento que se re-ejecuta
+    solo; cuando el trabajo termina, vuelve a ejecutar la página para mostrar
+    el resultado.
+    """
+    if trabajo.done():
+        st.rerun()
+    st.progress(min(trabajo.fraccion, 1.0), text=trabajo.texto or "Calculando...")
+
+
+@st.fragment(run_every=INTERVALO_SONDEO_SEGUNDOS)
+def esperar_hueco():
+    """Reintenta cuando el pool del servidor vuelve a admitir trabajos."""
+    pool = get_job_pool()
+    if pool.stats()["pendientes"] < pool.max_pendientes:
+        st.rerun()
+    st.warning("⏳ El servidor está ocupado con otros cálculos; se reintentará en unos segundos.")
+
+
+def resultado_en_segundo_plano(nombre, clave, funcion, *args):
+    """
+    Resultado de ``funcion(trabajo, *args)`` ejecutada en el pool de trabajos.
+
+    La primera vez envía el trabajo y espera un momento; si no ha terminado
+    muestra el progreso y devuelve ``None`` (la página se vuelve a ejecutar al
+    terminar). El resultado se guarda en la sesión con su clave; si la clave
+    cambia, el trabajo anterior se cancela.
+    """
+    trabajos_vigentes.add(nombre)
+    resultados = st.session_state.setdefault("resultados_trabajos", {})
+    if nombre in resultados and resultados[nombre][0] == clave:
+        return resultados[nombre][1]
+
+    trabajos = st.session_state.setdefault("trabajos", {})
+    trabajo = trabajos.get(nombre)
+    if trabajo is not None and trabajo.clave != clave:
+        trabajo.cancel()
+        trabajo = None
+    if trabajo is None:
+        try:
+            trabajo = trabajos[nombre] = get_job_pool().submit(clave, funcion, *args)
+        except JobPoolFull:
+            esperar_hueco()
+            return None
+
+    if not trabajo.wait(ESPERA_INICIAL_SEGUNDOS):
+        mostrar_progreso(trabajo)
+        return None
+    del trabajos[nombre]
+    try:
+        resultado = trabajo.result()
+    except Exception as e:
+        st.error(f"Ocurrió un error inesperado en el cálculo: {e}")
+        resultado = None
+    resultados[nombre] = (clave, resultado)
+    return resultado
+
+
+def evaluar_escenario(trabajo, modelo, clave, data, entradas, store=None):
+    """
+    Calcula precio, flujos de caja y TIR del escenario en el pool de trabajos
+    y lo guarda en la caché compartida, para no repetirlo mientras no cambien
+    las variables, los datos financieros y la versión del modelo. Con el
+    almacén de escenarios, el precio se reutiliza si solo han cambiado los
+    datos financieros y el resultado queda guardado.
+    """
+    clave_variables = features_key(data)
+    precio = store.get_price(clave_variables, modelo.version) if store is not None else None
+    if precio is None:
+        precio = float(get_price(data, modelo.model, modelo.feature_names))
+        if store is not None:
+            store.put_price(clave_variables, modelo.version, precio)
+    trabajo.report(0.5, f"Precio estimado: {precio:,.2f} $ · calculando la rentabilidad...")
+    trabajo.check_cancelled()
+    resultado = {"precio_noche": precio, "flujos_caja": None, "tir": None}
+    if precio > 0 and modelo_mensual:
+        flujos_caja, componentes = monthly_cash_flows(
+            precio, ocupacion_anual_porcentaje, costos_operacion_anuales,
+            inversion_inmueble, inversion_amueblar, horizonte_analisis_anos,
+            desglose=True, **parametros_mensuales
+        )
+        with metrics.stage("calculate_irr"):
+            rendimientos = monthly_returns(flujos_caja, tasa_descuento_objetivo)
+        resultado.update({
+            "flujos_caja": flujos_caja[0].tolist(),
+            "tir": float(rendimientos["tir"][0]) if np.isfinite(rendimientos["tir"][0]) else None,
+            "van": float(rendimientos["van"][0]),
+            "recuperacion_meses": float(rendimientos["recuperacion_meses"][0]),
+            "resumen_anual": pd.DataFrame(annual_summary(flujos_caja, componentes)),
+        })
+    elif precio > 0:
+        # Modelo anual simplificado: se recupera el precio de compra al final
+        # del horizonte, sin revalorización (el modelo mensual sí la incluye)
+        flujos_caja = build_cash_flows(
+            precio, ocupacion_anual_porcentaje, costos_operacion_anuales,
+            inversion_inmueble, inversion_amueblar, horizonte_analisis_anos
+        )
+        resultado.update({"flujos_caja": flujos_caja, "tir": calculate_irr(flujos_caja)})
+    get_scenario_cache().set(clave, resultado)
+    if store is not None:
+        store.save(scenario_key(data, entradas), entradas, data, modelo.version, precio, resultado["flujos_caja"], resultado["tir"],
+                   nombre=f"{ciudad[0]} · {room_type} · {numero_personas} personas")
+    return resultado
+
+
+data = build_features(
+    latitude, longitude, city_label, room_type, numero_personas, bathrooms,
+    bedrooms, beds, min_nights, max_nights, amenities_seleccionadas,
+    columnas_amenidades=uses_amenity_columns(gestor_modelos.required_features())
+)
+
+# Datos financieros: si solo cambian estos, el precio del modelo se reutiliza
+entradas_escenario = {
+    "inversion_inmueble": inversion_inmueble,
+    "inversion_amueblar": inversion_amueblar,
+    "costos_operacion_anuales": costos_operacion_anuales,
+    "ocupacion_anual_porcentaje": ocupacion_anual_porcentaje,
+    "tasa_descuento_objetivo": tasa_descuento_objetivo,
+    "horizonte_analisis_anos": horizonte_analisis_anos,
+    "parametros_mensuales": parametros_mensuales if modelo_mensual else None,
+}
+
+clave_escenario = scenario_key(data, entradas_escenario)
 
-    if precio_promedio_noche > 0:
-        ingresos_brutos_diarios = precio_promedio_noche
-        dias_ocupados_anuales = 365 * ocupacion_anual_porcentaje
-        ingresos_brutos_anuales = ingresos_brutos_diarios * dias_ocupados_anuales
+# Los resultados dependen además del modelo: al cambiarlo en caliente se recalculan
+clave_resultado = scenario_key(clave_escenario, version_modelo)
 
-        flujo_caja_anual_neto = ingresos_brutos_anuales - costos_operacion_anuales
+@st.fragment
+def mostrar_sensibilidad(precio_promedio_noche):
+    """
+    Mapa de calor de la TIR por ocupación y precio por noche, para el precio
+    de compra elegido, con la curva de rentabilidad en la tasa objetivo.
+    Es un fragmento: mover el deslizador solo recalcula esta sección.
+    """
+    ejes = sensitivity_axes(precio_promedio_noche, inversion_inmueble)
+    tir = sensitivity_grid(
+        ejes["ocupacion"], ejes["precio_noche"], ejes["inversion_inmueble"],
+        inversion_amueblar, costos_operacion_anuales, horizonte_analisis_anos
+    )
 
-        # Crear flujos de caja para la TIR
-        # El primer flujo es la inversión inicial (negativa)
-        inversion_total_inicial = inversion_inmueble + inversion_amueblar
-        flujos_caja = [-inversion_total_inicial]
+    st.markdown("<h3 style='font-size:22px;'>Análisis de sensibilidad</h3>", unsafe_allow_html=True)
+    if modelo_mensual:
+        st.caption("Estimación con el modelo anual simplificado (sin hipoteca, impuestos ni estacionalidad): "
+                   "las TIR del mapa no coinciden con la del modelo mensual.")
 
-        # Luego, los flujos de caja anuales netos para el horizonte de análisis
-        for _ in range(horizonte_analisis_anos - 1):
-            flujos_caja.append(flujo_caja_anual_neto)
+    indice_compra = st.select_slider(
+        "Precio de compra del inmueble:",
+        options=list(range(len(ejes["inversion_inmueble"]))),
+        value=len(ejes["inversion_inmueble"]) // 2,
+        format_func=lambda i: f"{ejes['inversion_inmueble'][i]:,.0f} $"
+    )
+    compra = ejes["inversion_inmueble"][indice_compra]
+
+    # Celdas del mapa de calor con sus bordes para ejes cuantitativos
+    paso_ocupacion = np.diff(ejes["ocupacion"]).mean()
+    paso_precio = np.diff(ejes["precio_noche"]).mean()
+    ocupacion, precio = np.meshgrid(ejes["ocupacion"], ejes["precio_noche"], indexing="ij")
+    celdas = pd.DataFrame({
+        "ocupacion": ocupacion.ravel() - paso_ocupacion / 2,
+        "ocupacion_fin": ocupacion.ravel() + paso_ocupacion / 2,
+        "precio": precio.ravel() - paso_precio / 2,
+        "precio_fin": precio.ravel() + paso_precio / 2,
+        "tir": tir[:, :, indice_compra].ravel(),
+    })
+
+    frontera = pd.DataFrame({
+        "ocupacion": ejes["ocupacion"],
+        "precio": break_even_price(
+            tasa_descuento_objetivo, ejes["ocupacion"], compra,
+            inversion_amueblar, costos_operacion_anuales, horizonte_analisis_anos
+        ),
+    })
+    frontera = frontera[frontera["precio"].between(celdas["precio"].min(), celdas["precio_fin"].max())]
+
+    mapa_calor = alt.Chart(celdas).mark_rect().encode(
+        x=alt.X("precio:Q", title="Precio por noche ($)"),
+        x2="precio_fin:Q",
+        y=alt.Y("ocupacion:Q", title="Ocupación anual", axis=alt.Axis(format="%")),
+        y2="ocupacion_fin:Q",
+        color=alt.Color("tir:Q", title="TIR", legend=alt.Legend(format="%"),
+                        scale=alt.Scale(scheme="redyellowgreen", domainMid=tasa_descuento_objetivo)),
+        tooltip=[alt.Tooltip("tir:Q", format=".2%", title="TIR")]
+    )
+    curva = alt.Chart(frontera).mark_line(color="black", strokeDash=[6, 4]).encode(
+        x="precio:Q", y="ocupacion:Q", order="ocupacion:Q"
+    )
+    punto_actual = alt.Chart(pd.DataFrame({
+        "precio": [precio_promedio_noche], "ocupacion": [ocupacion_anual_porcentaje]
+    })).mark_point(color="black", size=80, filled=True).encode(x="precio:Q", y="ocupacion:Q")
 
-        flujos_caja.append(inversion_inmueble)
+    st.altair_chart(mapa_calor + curva + punto_actual, use_container_width=True)
+    st.caption(f"La línea discontinua marca las combinaciones con TIR igual a la tasa objetivo "
+               f"({tasa_descuento_objetivo:.2%}); el punto negro es el escenario actual.")
 
-        # Opcional: Valor de rescate/venta del inmueble al final del período
-        # Para un análisis más completo, se podría añadir un valor de venta estimado
-        # del inmueble al final del horizonte. Por ahora, lo omitimos para simplicidad.
-        # Por ejemplo: flujos_caja[-1] += valor_venta_final_estimado
 
-        tir = calculate_irr(flujos_caja)
+# --- 6. Botón para Calcular ---
+calcular = st.button("Calcular precio y rentabilidad 🚀", type="primary")
+
+if calcular and city_label is None:
+    st.error("🚨🚨🚨🚨Ciudad no encontrada🚨🚨🚨🚨")
+elif calcular or st.session_state.get("escenario_calculado") == clave_escenario:
+    # El resultado se mantiene mientras no cambien los datos, aunque se toquen otros widgets
+    st.session_state.escenario_calculado = clave_escenario
+    st.markdown("<h2 style='font-size:28px;'>4. Resultados del Análisis</h2>", unsafe_allow_html=True)
+
+    resultado = get_scenario_cache().get(clave_resultado)
+    if resultado is None:
+        resultado = resultado_en_segundo_plano("analisis", clave_resultado, evaluar_escenario,
+                                               modelo_activo, clave_resultado, data, entradas_escenario,
+                                               get_scenario_store())
+
+    if resultado is not None:
+        precio_promedio_noche = resultado["precio_noche"]
+        st.markdown(f"""
+<h3 style='font-size:22px;'>
+    Precio promedio por noche estimado: 
+    <strong style='color:#386d79;'>{precio_promedio_noche:,.2f} $</strong>
+</h3>
+""", unsafe_allow_html=True)
+        if prior_ciudad:
+            st.caption(f"Precio por noche en {ciudad[0]}: P10 {prior_ciudad['precio_p10']:,.0f} $ · "
+                       f"mediana {prior_ciudad['precio_p50']:,.0f} $ · P90 {prior_ciudad['precio_p90']:,.0f} $")
 
-        if tir is not None:
-            # Seleccionar color en función de la TIR
-            color_tir = "#2E8B57" if tir >= tasa_descuento_objetivo else "#D9534F"
+        # --- Cálculo de Rentabilidad (TIR) ---
 
-            st.markdown(f"""
+        if precio_promedio_noche > 0:
+            flujos_caja = resultado["flujos_caja"]
+            tir = resultado["tir"]
+
+            if tir is not None:
+                # Seleccionar color en función de la TIR
+                color_tir = "#2E8B57" if tir >= tasa_descuento_objetivo else "#D9534F"
+
+                st.markdown(f"""
             <h3 style='font-size:22px;'>
                 TIR estimada: 
                 <strong style='color:{color_tir};'>{tir:.2%}</strong>
             </h3>
             """, unsafe_allow_html=True)
 
-            if tir > tasa_descuento_objetivo:
-                st.markdown("<h1 style='text-align: center;'>💰💰💸 ¡Rentabilidad! 💸💰💰</h1>", unsafe_allow_html=True)
-                st.success(f"💸 *¡Excelente!* La TIR ({tir:.2%}) es mayor que tu tasa de descuento objetivo ({tasa_descuento_objetivo:.2%}). "
-               "Este proyecto parece ser una *buena inversión* bajo tus criterios de rentabilidad.")
-
+                if tir > tasa_descuento_objetivo:
+                    st.markdown("<h1 style='text-align: center;'>💰💰💸 ¡Rentabilidad! 💸💰💰</h1>", unsafe_allow_html=True)
+                    st.success(f"💸 *¡Excelente!* La TIR ({tir:.2%}) es mayor que tu tasa de descuento objetivo ({tasa_descuento_objetivo:.2%}). "
+                   "Este proyecto parece ser una *buena inversión* bajo tus criterios de rentabilidad.")
+
+                else:
+                    st.warning(f"⚠️ *Atención:* La TIR ({tir:.2%}) es menor que tu tasa de descuento objetivo ({tasa_descuento_objetivo:.2%}). "
+                               "Considera revisar los inputs o si esta inversión cumple con tus expectativas de rentabilidad. Podría no ser tan atractiva.")
+                mostrar_equilibrio(precio_promedio_noche)
+                if modelo_mensual:
+                    mostrar_modelo_mensual(resultado)
+                if modo_riesgo:
+                    mostrar_simulacion(precio_promedio_noche)
+                if modo_sensibilidad:
+                    mostrar_sensibilidad(precio_promedio_noche)
+                if modo_amenidades:
+                    mostrar_recomendaciones()
             else:
-                st.warning(f"⚠️ *Atención:* La TIR ({tir:.2%}) es menor que tu tasa de descuento objetivo ({tasa_descuento_objetivo:.2%}). "
-                           "Considera revisar los inputs o si esta inversión cumple con tus expectativas de rentabilidad. Podría no ser tan atractiva.")
+                st.error("No se pudo calcular la TIR con los flujos de caja proporcionados. Asegúrate de que haya una inversión inicial negativa seguida de flujos positivos.")
+                st.info(f"Flujos de Caja generados: {flujos_caja}")  # Ayuda para depurar
+
         else:
-            st.error("No se pudo calcular la TIR con los flujos de caja proporcionados. Asegúrate de que haya una inversión inicial negativa seguida de flujos positivos.")
-            st.info(f"Flujos de Caja generados: {flujos_caja}")  # Ayuda para depurar
+            st.warning("No se puede calcular la rentabilidad si el precio por noche es cero o negativo.")
+
+# --- 6. Análisis de cartera ---
+def evaluar_cartera(trabajo, modelo, fichero, valores_formulario):
+    """
+    Evalúa la cartera bloque a bloque en el pool de trabajos, publicando el
+    progreso y comprobando la cancelación entre bloques.
+    """
+    formato = "parquet" if fichero.name.lower().endswith(".parquet") else "csv"
+    # Cursor propio sobre el mismo buffer del fichero subido (BytesIO no lo
+    # copia): un trabajo anterior aún sin cancelar no mueve la posición de este
+    fuente = io.BytesIO(fichero.getvalue())
+    partes = []
+    with metrics.stage("cartera"):
+        for resultado, procesadas, fraccion in evaluate_portfolio(
+            modelo.model, fuente, formato, valores_por_defecto=valores_formulario,
+            tasa_descuento=tasa_descuento_objetivo, horizonte=horizonte_analisis_anos,
+            feature_names=modelo.feature_names
+        ):
+            partes.append(resultado)
+            trabajo.report(fraccion or 0.0, f"{procesadas:,} inmuebles evaluados")
+            trabajo.check_cancelled()
+        cartera = rank_results(partes)
+        del partes
+    # El CSV se genera una vez, por bloques: en carteras grandes es más caro que re-ejecutar el script
+    csv_cartera = io.BytesIO()
+    write_ranking(cartera, csv_cartera, "csv")
+    return cartera.head(100), csv_cartera, {
+        "total": len(cartera),
+        "supera_objetivo": int(cartera["supera_objetivo"].sum()),
+        "errores": int(cartera["error"].notna().sum()),
+    }
 
+
+st.markdown("<h2 style='font-size:28px;'>6. Análisis de cartera</h2>", unsafe_allow_html=True)
+
+with st.expander("📂 Evaluar una cartera de inmuebles (CSV o Parquet)"):
+    st.caption("Una fila por inmueble con las columnas `ciudad`, `latitude`, `longitude`, `room_type`, "
+               "`bedrooms`, `bathrooms`, `amenities` (separadas por comas), `inversion_inmueble`, "
+               "`costos_operacion_anuales`, `ocupacion_anual_porcentaje`... Las columnas que falten "
+               "toman los valores del formulario, salvo la ocupación, que toma la de referencia de la "
+               "ciudad de cada fila cuando existe.")
+    fichero_cartera = st.file_uploader("Fichero de la cartera", type=["csv", "parquet"])
+
+    if fichero_cartera is not None and st.button("Evaluar cartera 📊"):
+        valores_formulario = {
+            "ciudad": ciudad[0] if ciudad else "",
+            "room_type": room_type,
+            "accommodates": numero_personas,
+            "bathrooms": bathrooms,
+            "bedrooms": bedrooms,
+            "beds": beds,
+            "minimum_nights": min_nights,
+            "maximum_nights": max_nights,
+            "inversion_inmueble": inversion_inmueble,
+            "inversion_amueblar": inversion_amueblar,
+            "costos_operacion_anuales": costos_operacion_anuales,
+            "ocupacion_anual_porcentaje": ocupacion_anual_porcentaje,
+        }
+        # Los valores del formulario se fijan al pulsar el botón
+        st.session_state.cartera_solicitada = (fichero_cartera.file_id, valores_formulario)
+
+    solicitud = st.session_state.get("cartera_solicitada")
+    if fichero_cartera is not None and solicitud and solicitud[0] == fichero_cartera.file_id:
+        cartera_evaluada = resultado_en_segundo_plano(
+            "cartera", scenario_key(*solicitud, version_modelo), evaluar_cartera,
+            modelo_activo, fichero_cartera, solicitud[1]
+        )
     else:
-        st.warning("No se puede calcular la rentabilidad si el precio por noche es cero o negativo.")
+        cartera_evaluada = None
+
+    if cartera_evaluada is not None:
+        mejores, csv_cartera, resumen = cartera_evaluada
+        col_total, col_objetivo, col_errores = st.columns(3)
+        col_total.metric("Inmuebles", f"{resumen['total']:,}")
+        col_objetivo.metric("Superan el objetivo", f"{resumen['supera_objetivo']:,}")
+        col_errores.metric("Con errores", f"{resumen['errores']:,}")
+        st.dataframe(mejores, hide_index=True, use_container_width=True)
+        st.download_button("Descargar ranking completo (CSV)", csv_cartera,
+                           file_name="ranking_cartera.csv", mime="text/csv")
+
+store_escenarios = get_scenario_store()
+if store_escenarios is not None:
+    with st.expander("💾 Escenarios guardados"):
+        guardados = store_escenarios.list(20)
+        if guardados.empty:
+            st.caption("Los escenarios que calcules se guardarán aquí.")
+        else:
+            guardados["actualizado"] = pd.to_datetime(guardados["actualizado"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+            guardados["modelo actual"] = guardados["version_modelo"] == version_modelo
+            columnas = ["nombre", "actualizado", "precio_noche", "tir", "modelo actual"]
+            st.dataframe(
+                guardados[columnas + (["error"] if guardados["error"].notna().any() else [])],
+                column_config={"precio_noche": st.column_config.NumberColumn("Precio por noche", format="%.2f $"),
+                               "tir": st.column_config.NumberColumn("TIR", format="percent")},
+                hide_index=True, use_container_width=True,
+            )
+        pendientes = store_escenarios.count_stale(version_modelo)
+        fallo_revalorar = None
+        if trabajo_revalorar is not None and trabajo_revalorar.done():
+            try:
+                trabajo_revalorar.result()
+            except Exception as e:
+                fallo_revalorar = e
+        if fallo_revalorar is not None:
+            st.error(f"No se pudieron revalorar los escenarios con el modelo actual: {fallo_revalorar}")
+        elif pendientes:
+            st.caption(f"🔄 Revalorando {pendientes:,} escenarios con el modelo actual...")
+        sin_revalorar = store_escenarios.count_failed(version_modelo)
+        if sin_revalorar:
+            st.caption(f"⚠️ {sin_revalorar:,} escenarios no tienen todas las variables que usa el modelo actual "
+                       "y se han quedado sin precio.")
+
+
+def es_administrador():
+    """
+    Los paneles de depuración y de tiempos requieren ``?debug=1`` y, si está
+    definida la variable SMARTRENTAL_ADMIN_TOKEN, además ``?admin=<token>``.
+    """
+    if st.query_params.get("debug") != "1":
+        return False
+    token = os.environ.get("SMARTRENTAL_ADMIN_TOKEN")
+    return not token or hmac.compare_digest(st.query_params.get("admin", ""), token)
+
+
+if es_administrador():
+    if store_escenarios is not None:
+        with st.sidebar.expander("🛠️ Depuración: escenarios guardados", expanded=True):
+            estadisticas_store = store_escenarios.stats()
+            col_reutilizados, col_calculados = st.columns(2)
+            col_reutilizados.metric("Precios reutilizados", estadisticas_store["precios_reutilizados"])
+            col_calculados.metric("Precios calculados", estadisticas_store["precios_calculados"])
+            st.caption(f"Escenarios: {estadisticas_store['escenarios']:,} · "
+                       f"Precios guardados: {estadisticas_store['predicciones']:,} · {store_escenarios.path}")
+
+    with st.sidebar.expander("🛠️ Depuración: caché de escenarios", expanded=True):
+        estadisticas = get_scenario_cache().stats()
+        col_hits, col_misses = st.columns(2)
+        col_hits.metric("Aciertos", estadisticas["aciertos"] + estadisticas["aciertos_disco"])
+        col_misses.metric("Fallos", estadisticas["fallos"])
+        st.caption(f"Tasa de aciertos: {estadisticas['tasa_aciertos']:.1%} · "
+                   f"En memoria: {estadisticas['tamano']} · Expulsados: {estadisticas['expulsados']} · "
+                   f"Desde disco: {estadisticas['aciertos_disco']}")
+        st.code(clave_escenario[:16], language=None)
+
+    with st.sidebar.expander("🛠️ Depuración: trabajos en segundo plano", expanded=True):
+        estadisticas_pool = get_job_pool().stats()
+        col_pendientes, col_rechazados = st.columns(2)
+        col_pendientes.metric("Pendientes", estadisticas_pool["pendientes"])
+        col_rechazados.metric("Rechazados", estadisticas_pool["rechazados"])
+        st.caption(f"Máximo simultáneos: {estadisticas_pool['max_trabajos']} · "
+                   f"Enviados: {estadisticas_pool['enviados']}")
+
+    with st.sidebar.expander("🛠️ Depuración: ejecuciones", expanded=True):
+        col_script, col_selector = st.columns(2)
+        col_script.metric("Script completo", st.session_state.ejecuciones_script)
+        col_selector.metric("Selector de ubicación", st.session_state.ejecuciones_selector)
+
+    if ultima_carga:
+        with st.sidebar.expander("🛠️ Depuración: modelo", expanded=True):
+            st.caption(f"Artefacto: {ultima_carga['ruta']} · Carga: {ultima_carga['segundos'] * 1000:.0f} ms · "
+                       f"RSS del proceso: {ultima_carga['rss_mb']:.0f} MB · PID {ultima_carga['pid']}")
+            compilado = isinstance(load_model(), CompiledTreeEnsemble)
+            st.caption(f"Inferencia: {'compilada' if compilado else 'scikit-learn'}")
+            estado_modelos = gestor_modelos.stats()
+            st.caption(f"Versión: {estado_modelos['version']} · "
+                       f"Registro: {estado_modelos['registro'] or 'sin registro, ' + MODEL_PATH} · "
+                       f"Cambios en caliente: {estado_modelos['cambios']}")
+            for version_fallida, error in estado_modelos["fallidas"].items():
+                st.caption(f"❌ {version_fallida}: {error}")
+            sombra = estado_modelos["sombra"]
+            if sombra is not None:
+                st.caption(f"Candidata en sombra: {estado_modelos['candidata']} · "
+                           f"{sombra['peticiones']} peticiones · {sombra['descartadas']} descartadas · "
+                           f"{sombra['errores']} errores")
+                if sombra["peticiones"]:
+                    col_diferencia, col_latencia = st.columns(2)
+                    col_diferencia.metric("Diferencia media", f"{sombra['diferencia_media']:+,.2f} $")
+                    col_latencia.metric("p50 candidata", f"{sombra['ms_candidato_p50']:.1f} ms",
+                                        f"{sombra['ms_candidato_p50'] - sombra['ms_activo_p50']:+.1f} ms",
+                                        delta_color="inverse")
+
+
+if metrics.is_enabled() and es_administrador():
+    with st.sidebar.expander("⏱️ Tiempos por etapa", expanded=True):
+        peticiones = metrics.recent_requests(20)
+        if peticiones:
+            filas = []
+            for peticion in peticiones:
+                fila = {"hora": pd.Timestamp(peticion["inicio"], unit="s").strftime("%H:%M:%S"),
+                        "tipo": peticion["tipo"], "total_ms": peticion["total_ms"]}
+                for etapa, ms in peticion["etapas"]:
+                    fila[etapa] = fila.get(etapa, 0.0) + ms
+                filas.append(fila)
+            st.dataframe(pd.DataFrame(filas).round(1), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Aún no hay peticiones registradas.")
+        st.download_button("Descargar métricas (Prometheus)", metrics.prometheus_text(),
+                           file_name="smartrental_metrics.txt", mime="text/plain")
+
+# Los trabajos que esta ejecución ya no ha pedido (cambiaron los datos o se
+# quitó el fichero) se cancelan para no ocupar el pool del servidor
+for nombre_trabajo in set(st.session_state.get("trabajos", {})) - trabajos_vigentes:
+    st.session_state.trabajos.pop(nombre_trabajo).cancel()
 
 # --- 7. Pie de Página ---
 st.markdown("---")
@@ -834,3 +1364,5 @@ with col_text_footer:
     st.markdown("<p style='font-size:14px; margin-top: 12px;'>Desarrollado por Latam&Spain Digital Solutions</p>", unsafe_allow_html=True)
 
 st.caption("Disclaimer: Esta herramienta proporciona estimaciones generales para una toma de decisión inicial.")
+
+metrics.finish_request(peticion_script)
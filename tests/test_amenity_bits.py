@@ -0,0 +1,63 @@
+"""
+Conteos por categoría a partir del bitset de amenidades.
+"""
+import numpy as np
+
+from smartrental.amenities import amenities_por_categoria, amenity_traducciones
+from smartrental.amenity_bits import (BYTES_AMENIDADES, category_counts, decode_amenities, encode_amenities,
+                                      encode_amenity_matrix, parse_amenity_lists, total_counts)
+
+
+def _selecciones(n, seed):
+    """Selecciones aleatorias con la forma de ``amenities_seleccionadas``."""
+    rng = np.random.default_rng(seed)
+    selecciones = []
+    for _ in range(n):
+        seleccion = {}
+        for categoria, amenidades in amenities_por_categoria.items():
+            elegidas = [a for a in amenidades if rng.random() < 0.3]
+            if elegidas or rng.random() < 0.5:
+                seleccion[categoria] = elegidas
+        selecciones.append(seleccion)
+    # Sin amenidades y con todas
+    selecciones.append({})
+    selecciones.append({categoria: list(amenidades) for categoria, amenidades in amenities_por_categoria.items()})
+    return selecciones
+
+
+def _nombre(amenidad):
+    traduccion = amenity_traducciones.get(amenidad, amenidad)
+    return amenidad if any(c in traduccion for c in ",;|") else traduccion
+
+
+def test_category_counts_match_list_lengths():
+    selecciones = _selecciones(300, seed=0)
+    bits = encode_amenity_matrix(selecciones)
+    assert bits.shape == (len(selecciones), BYTES_AMENIDADES)
+    conteos = category_counts(bits)
+    for categoria in amenities_por_categoria:
+        # Conteo anterior: número de amenidades elegidas en la categoría
+        esperado = [len(seleccion.get(categoria, [])) for seleccion in selecciones]
+        np.testing.assert_array_equal(conteos[categoria], esperado, err_msg=categoria)
+    np.testing.assert_array_equal(total_counts(bits),
+                                  [sum(map(len, seleccion.values())) for seleccion in selecciones])
+
+
+def test_single_row_round_trip():
+    for seleccion in _selecciones(50, seed=1):
+        decodificada = decode_amenities(encode_amenities(seleccion))
+        for categoria, amenidades in amenities_por_categoria.items():
+            assert decodificada[categoria] == [a for a in amenidades if a in seleccion.get(categoria, [])]
+
+
+def test_parsed_lists_match_encoded_selection():
+    selecciones = _selecciones(100, seed=2)
+    textos = []
+    for i, seleccion in enumerate(selecciones):
+        elegidas = [a for amenidades in seleccion.values() for a in amenidades]
+        # Claves y nombres en español (salvo los que contienen un separador), con distintos separadores
+        nombres = [_nombre(a) if j % 2 else a for j, a in enumerate(elegidas)]
+        textos.append((";" if i % 2 else ", ").join(nombres))
+    textos.append(None)
+    esperado = np.vstack([encode_amenity_matrix(selecciones), np.zeros((1, BYTES_AMENIDADES), np.uint8)])
+    np.testing.assert_array_equal(parse_amenity_lists(textos), esperado)
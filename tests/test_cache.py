@@ -0,0 +1,29 @@
+"""
+Clave canónica de los escenarios de la caché.
+"""
+import numpy as np
+
+from smartrental.cache import scenario_key
+
+
+def test_key_ignores_dict_order():
+    assert scenario_key({"a": 1, "b": {"x": 2, "y": 3}}) == scenario_key({"b": {"y": 3, "x": 2}, "a": 1})
+
+
+def test_key_ignores_numpy_scalar_types():
+    assert scenario_key({"precio": np.float64(120.5), "camas": np.int64(3)}) == \
+        scenario_key({"precio": 120.5, "camas": 3})
+    assert scenario_key(np.float32(0.5)) == scenario_key(0.5)
+
+
+def test_key_accepts_numpy_arrays():
+    estacionalidad = np.linspace(0.8, 1.2, 12)
+    assert scenario_key(estacionalidad) == scenario_key(estacionalidad.tolist())
+    assert scenario_key({"estacionalidad": estacionalidad}) == scenario_key({"estacionalidad": tuple(estacionalidad)})
+    assert scenario_key(np.array([[1, 2], [3, 4]])) == scenario_key([[1, 2], [3, 4]])
+    assert scenario_key(np.array([1, 2])) != scenario_key(np.array([2, 1]))
+
+
+def test_key_distinguishes_values():
+    assert scenario_key({"precio": 120.0}) != scenario_key({"precio": 121.0})
+    assert scenario_key({"precio": 120.0}, 0.7) != scenario_key({"precio": 120.0}, 0.8)
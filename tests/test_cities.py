@@ -0,0 +1,50 @@
+"""
+Resolución de nombres de ciudad escritos libremente.
+"""
+import pytest
+
+from smartrental.cities import city_mapping, resolve_city
+
+
+@pytest.mark.parametrize("nombre", ["Barcelona", "barcelona", "  BARCELONA "])
+def test_exact_name(nombre):
+    coincidencia = resolve_city(nombre)
+    assert coincidencia.slug == "barcelona"
+    assert coincidencia.city_label == city_mapping["barcelona"]
+    assert coincidencia.metodo == "exacto"
+    assert coincidencia.similitud == 1.0
+
+
+@pytest.mark.parametrize("nombre, slug", [
+    ("NYC", "new-york-city"), ("Nueva York", "new-york-city"), ("Londres", "london"),
+    ("DC", "washington-dc"), ("CDMX", "mexico-city"),
+])
+def test_alias(nombre, slug):
+    coincidencia = resolve_city(nombre)
+    assert coincidencia.slug == slug
+    assert coincidencia.metodo == "alias"
+
+
+@pytest.mark.parametrize("nombre, slug", [("Málaga", "malaga"), ("Múnich", "munich"), ("Zürich", "zurich")])
+def test_accents_are_folded(nombre, slug):
+    assert resolve_city(nombre).slug == slug
+
+
+@pytest.mark.parametrize("nombre, slug", [("Barcelonna", "barcelona"), ("Sevila", "sevilla"),
+                                          ("Lisbom", "lisbon")])
+def test_typos_resolve_approximately(nombre, slug):
+    coincidencia = resolve_city(nombre)
+    assert coincidencia.slug == slug
+    assert coincidencia.metodo == "aproximado"
+    assert 0.75 <= coincidencia.similitud < 1.0
+
+
+@pytest.mark.parametrize("nombre, slug", [("Barcelona, Spain", "barcelona"), ("Tokyo, Japan", "tokyo"),
+                                          ("Nueva York, EE. UU.", "new-york-city")])
+def test_country_suffix_is_ignored(nombre, slug):
+    assert resolve_city(nombre).slug == slug
+
+
+@pytest.mark.parametrize("nombre", ["", None, "   ", "Xyzzy", "Springfield", "1234"])
+def test_non_cities_are_rejected(nombre):
+    assert resolve_city(nombre) is None
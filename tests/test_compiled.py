@@ -0,0 +1,109 @@
+"""
+Paridad del evaluador compilado con ``model.predict`` de scikit-learn.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+
+from smartrental.compiled import FILAS_MAXIMAS, CompiledTreeEnsemble, compile_model, optimize_model
+
+N_VARIABLES = 6
+
+COLUMNAS = [f"x{i}" for i in range(N_VARIABLES)]
+
+
+def _datos(n, seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, N_VARIABLES)) * [1, 10, 100, 0.01, 1e4, 3], columns=COLUMNAS)
+    y = X["x0"] * 3 + np.sin(X["x1"]) * 20 + (X["x2"] > 0) * 50 + rng.normal(0, 1, n)
+    return X, y
+
+
+@pytest.fixture(scope="module", params=[
+    lambda: RandomForestRegressor(n_estimators=20, max_depth=10, random_state=0, n_jobs=1),
+    lambda: ExtraTreesRegressor(n_estimators=20, max_depth=10, random_state=0, n_jobs=1),
+    lambda: GradientBoostingRegressor(n_estimators=30, max_depth=4, random_state=0),
+], ids=["random_forest", "extra_trees", "gradient_boosting"])
+def modelos(request):
+    X, y = _datos(3000, seed=0)
+    model = request.param().fit(X, y)
+    compiled = compile_model(model)
+    assert isinstance(compiled, CompiledTreeEnsemble)
+    return model, compiled
+
+
+def _umbrales(compiled):
+    internos = compiled.left != np.arange(len(compiled.left))
+    return compiled.feature[internos], compiled.threshold[internos]
+
+
+@pytest.mark.parametrize("n_filas", [1, 7, FILAS_MAXIMAS - 1, FILAS_MAXIMAS, FILAS_MAXIMAS + 1, 5000])
+def test_predict_matches_sklearn_on_both_sides_of_delegation(modelos, n_filas):
+    model, compiled = modelos
+    X, _ = _datos(n_filas, seed=n_filas)
+    esperado = model.predict(X)
+    np.testing.assert_allclose(compiled.predict(X), esperado, rtol=0, atol=1e-9)
+    # El recorrido compilado también coincide en los lotes que predict delega
+    np.testing.assert_allclose(compiled.predict_compiled(X), esperado, rtol=0, atol=1e-9)
+
+
+def test_large_batches_are_delegated(modelos, monkeypatch):
+    model, compiled = modelos
+
+    def falla(X):
+        raise AssertionError("No debería usarse el recorrido compilado")
+
+    monkeypatch.setattr(compiled, "predict_compiled", falla)
+    X, _ = _datos(FILAS_MAXIMAS + 1, seed=1)
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    with pytest.raises(AssertionError):
+        compiled.predict(X.iloc[:FILAS_MAXIMAS])
+
+
+def test_threshold_edges_in_float32(modelos):
+    """
+    scikit-learn compara las variables convertidas a float32 con umbrales en
+    float64: los valores exactos en el umbral, los float32 contiguos y los
+    float64 que redondean al umbral deben ir a la misma rama.
+    """
+    model, compiled = modelos
+    features, umbrales = _umbrales(compiled)
+    rng = np.random.default_rng(2)
+    seleccion = rng.choice(len(umbrales), min(len(umbrales), 300), replace=False)
+    base, _ = _datos(1, seed=3)
+
+    filas = []
+    for i in seleccion:
+        umbral = umbrales[i]
+        umbral32 = np.float32(umbral)
+        for valor in (
+            float(umbral32),
+            float(np.nextafter(umbral32, np.float32(np.inf))),
+            float(np.nextafter(umbral32, np.float32(-np.inf))),
+            umbral + abs(umbral) * 1e-12,
+            umbral - abs(umbral) * 1e-12,
+            umbral,
+        ):
+            fila = base.iloc[0].to_numpy(dtype=np.float64).copy()
+            fila[features[i]] = valor
+            filas.append(fila)
+    X = pd.DataFrame(np.array(filas), columns=COLUMNAS)
+
+    for inicio in range(0, len(X), FILAS_MAXIMAS):
+        bloque = X.iloc[inicio:inicio + FILAS_MAXIMAS]
+        np.testing.assert_allclose(compiled.predict(bloque), model.predict(bloque), rtol=0, atol=1e-9)
+
+
+def test_optimize_model_returns_compiled_version(modelos):
+    model, _ = modelos
+    assert isinstance(optimize_model(model), CompiledTreeEnsemble)
+
+
+def test_unsupported_models_are_returned_unchanged():
+    from sklearn.linear_model import LinearRegression
+
+    X, y = _datos(100, seed=4)
+    model = LinearRegression().fit(X, y)
+    assert compile_model(model) is None
+    assert optimize_model(model) is model
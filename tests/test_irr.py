@@ -0,0 +1,153 @@
+"""
+TIR vectorizada, vía rápida de renta constante y valores de equilibrio.
+"""
+import numpy as np
+import pytest
+from scipy.optimize import brentq
+
+from smartrental.cashflows import annual_net_cash_flow, build_cash_flows
+from smartrental.irr import (irr_batch, level_annuity_breakeven_flow, level_annuity_npv, npv_function,
+                             solve_irr, solve_level_annuity_irr)
+from smartrental.monthly import monthly_break_even_targets, monthly_cash_flows, monthly_npv
+from smartrental.sensitivity import break_even_targets
+
+TASA = 0.10
+
+
+def _raiz(flujos):
+    """TIR de referencia: raíz de ``npv_function`` acotada con Brent."""
+    return brentq(npv_function, -0.9, 10.0, args=(list(flujos),), xtol=1e-14)
+
+
+def _carteras(n, horizonte, seed):
+    rng = np.random.default_rng(seed)
+    precio = rng.uniform(40, 300, n)
+    ocupacion = rng.uniform(0.2, 0.95, n)
+    costos = rng.uniform(1000, 15000, n)
+    compra = rng.uniform(60_000, 600_000, n)
+    amueblar = rng.uniform(0, 40_000, n)
+    flujos = np.array([build_cash_flows(*fila, horizonte) for fila in zip(precio, ocupacion, costos, compra,
+                                                                           amueblar)])
+    return precio, ocupacion, costos, compra, amueblar, flujos
+
+
+@pytest.mark.parametrize("resolver", [irr_batch, solve_irr], ids=["irr_batch", "solve_irr"])
+def test_irr_matches_npv_roots(resolver):
+    *_, flujos = _carteras(200, 10, seed=0)
+    # Filas que no son de renta constante para que solve_irr use también la vía general
+    irregulares = flujos[:50].copy()
+    irregulares[:, 3] *= 0.5
+    flujos = np.vstack([flujos, irregulares])
+
+    tir, converged = resolver(flujos)
+    assert converged.all()
+    esperado = np.array([_raiz(fila) for fila in flujos])
+    np.testing.assert_allclose(tir, esperado, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("resolver", [irr_batch, solve_irr], ids=["irr_batch", "solve_irr"])
+def test_rows_without_root_are_nan_and_not_converged(resolver):
+    flujos = np.array([
+        [100.0, 50.0, 50.0, 50.0],    # Todos positivos: VAN > 0 a cualquier tasa
+        [-100.0, -10.0, -10.0, -10.0],  # Todos negativos
+        [-100.0, 30.0, 30.0, 110.0],  # Con raíz, en el mismo lote
+    ])
+    tir, converged = resolver(flujos)
+    np.testing.assert_array_equal(converged, [False, False, True])
+    assert np.isnan(tir[:2]).all()
+    assert tir[2] == pytest.approx(_raiz(flujos[2]), abs=1e-9)
+
+
+def test_level_annuity_fast_path_matches_general_solver():
+    _, _, _, compra, amueblar, flujos = _carteras(500, 10, seed=1)
+    tir, converged = solve_level_annuity_irr(compra + amueblar, flujos[:, 1], compra, 10)
+    esperado, esperado_ok = irr_batch(flujos)
+    np.testing.assert_array_equal(converged, esperado_ok)
+    np.testing.assert_allclose(tir, esperado, rtol=0, atol=1e-9)
+
+
+def test_negative_annual_flow_falls_back_to_general_solver():
+    tir, converged = solve_level_annuity_irr(200_000.0, -1_000.0, 230_000.0, 10)
+    assert converged
+    assert float(tir) == pytest.approx(_raiz([-200_000.0] + [-1_000.0] * 9 + [230_000.0]), abs=1e-9)
+
+
+def test_horizon_of_one_year():
+    # Solo desembolso y valor terminal: no hay flujos anuales
+    tir, converged = solve_level_annuity_irr(100.0, 0.0, 110.0, 1)
+    assert converged
+    assert float(tir) == pytest.approx(0.10, abs=1e-12)
+    tir, converged = solve_irr([[-100.0, 110.0]])
+    assert converged[0] and tir[0] == pytest.approx(0.10, abs=1e-12)
+
+    assert np.isnan(level_annuity_breakeven_flow(TASA, 170_000.0, 150_000.0, 1))
+    assert np.isnan(level_annuity_breakeven_flow(TASA, np.full(3, 170_000.0), 150_000.0, 1)).all()
+    objetivos = break_even_targets(TASA, 120.0, 0.7, 150_000.0, 20_000.0, 5_000.0, 1)
+    assert np.isnan(objetivos["precio_equilibrio"])
+    assert np.isnan(objetivos["ocupacion_minima"])
+
+
+def test_break_even_targets_give_zero_npv_at_target_rate():
+    horizonte = 10
+    precio, ocupacion, costos, compra, amueblar, _ = _carteras(300, horizonte, seed=2)
+    objetivos = break_even_targets(TASA, precio, ocupacion, compra, amueblar, costos, horizonte)
+    escala = compra + amueblar
+
+    flujo = annual_net_cash_flow(objetivos["precio_equilibrio"], ocupacion, costos)
+    van = level_annuity_npv(TASA, compra + amueblar, flujo, compra, horizonte)
+    np.testing.assert_allclose(van / escala, 0, atol=1e-9)
+
+    flujo = annual_net_cash_flow(precio, objetivos["ocupacion_minima"], costos)
+    van = level_annuity_npv(TASA, compra + amueblar, flujo, compra, horizonte)
+    np.testing.assert_allclose(van / escala, 0, atol=1e-9)
+
+    flujo = annual_net_cash_flow(precio, ocupacion, costos)
+    alcanzable = np.isfinite(objetivos["compra_maxima"])
+    assert alcanzable.any()
+    maxima = objetivos["compra_maxima"][alcanzable]
+    van = level_annuity_npv(TASA, maxima + amueblar[alcanzable], flujo[alcanzable], maxima, horizonte)
+    np.testing.assert_allclose(van / (maxima + amueblar[alcanzable]), 0, atol=1e-9)
+
+    # La TIR en el precio de equilibrio es exactamente la tasa objetivo
+    flujo = annual_net_cash_flow(objetivos["precio_equilibrio"], ocupacion, costos)
+    tir, converged = solve_level_annuity_irr(compra + amueblar, flujo, compra, horizonte)
+    assert converged.all()
+    np.testing.assert_allclose(tir, TASA, atol=1e-9)
+
+
+def test_monthly_break_even_targets_give_zero_npv_at_target_rate():
+    horizonte = 10
+    precio = np.array([90.0, 150.0, 220.0])
+    ocupacion = np.array([0.6, 0.75, 0.5])
+    costos = np.array([4_000.0, 8_000.0, 6_000.0])
+    compra = np.array([150_000.0, 250_000.0, 300_000.0])
+    amueblar = 20_000.0
+    parametros = dict(
+        costos_operacion_porcentaje=0.1, estacionalidad=np.linspace(0.7, 1.3, 12),
+        actualizacion_anual=0.02, revalorizacion_anual=0.01, porcentaje_financiado=0.6, tipo_hipoteca=0.035,
+        tipo_impositivo=0.2, tipo_plusvalias=0.19, costes_salida_porcentaje=0.03,
+    )
+    objetivos = monthly_break_even_targets(TASA, precio, ocupacion, costos, compra, amueblar, horizonte,
+                                           **parametros)
+    casos = {
+        "precio_equilibrio": (objetivos["precio_equilibrio"], ocupacion, compra),
+        "ocupacion_minima": (precio, objetivos["ocupacion_minima"], compra),
+        "compra_maxima": (precio, ocupacion, objetivos["compra_maxima"]),
+    }
+    for nombre, (p, o, c) in casos.items():
+        # Un mínimo de cero significa que el objetivo se supera incluso sin ingresos
+        alcanzable = np.isfinite(p) & np.isfinite(o) & np.isfinite(c) & (p > 0) & (o > 0)
+        assert alcanzable.any(), nombre
+        flujos = monthly_cash_flows(p, o, costos, c, amueblar, horizonte, **parametros)
+        van = monthly_npv(flujos, TASA)[alcanzable]
+        np.testing.assert_allclose(van / (c + amueblar)[alcanzable], 0, atol=1e-6, err_msg=nombre)
+
+
+def test_monthly_model_without_extras_matches_annual_revenue():
+    precio, ocupacion, costos, compra, amueblar, _ = _carteras(20, 10, seed=3)
+    _, componentes = monthly_cash_flows(precio, ocupacion, costos, compra, amueblar, 10, desglose=True)
+    ingresos_anuales = componentes["ingresos"].reshape(20, 10, 12).sum(axis=2)
+    costes_anuales = componentes["costes"].reshape(20, 10, 12).sum(axis=2)
+    esperado = annual_net_cash_flow(precio, ocupacion, costos)
+    np.testing.assert_allclose(ingresos_anuales - costes_anuales, np.repeat(esperado[:, None], 10, axis=1),
+                               rtol=1e-12, atol=1e-6)